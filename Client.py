@@ -2,6 +2,8 @@
 from socket import *
 import receive
 import send
+import checksums
+import compression
 
 
 class Client:
@@ -11,6 +13,8 @@ class Client:
         self.client_socket = socket(AF_INET, SOCK_DGRAM)
         self.error_type = 1
         self.error_rate = 0
+        self.checksum_method = checksums.CHECKSUM_METHOD
+        self.compression_method = compression.COMPRESSION_METHOD
 
     def error_selection(self):
         while True:
@@ -36,6 +40,33 @@ class Client:
         else:
             self.error_rate = 0
 
+    def checksum_selection(self):
+        options = list(checksums.CHECKSUM_ENGINES.keys())
+        while True:
+            choice = input(f"Choose checksum ({', '.join(options)}) or press enter for {self.checksum_method}: ").strip().lower()
+            if choice == '':
+                break
+            elif choice in options:
+                self.checksum_method = choice
+                break
+            else:
+                print(f"Invalid checksum. Please enter one of: {', '.join(options)}.")
+
+    def compression_selection(self):
+        options = ["none"] + list(compression.CODECS.keys())
+        while True:
+            choice = input(f"Choose compression ({', '.join(options)}, optionally with :level) "
+                           f"or press enter for {self.compression_method or 'none'}: ").strip().lower()
+            if choice == '':
+                break
+            try:
+                compression.parse_method(choice)
+            except ValueError as e:
+                print(f"{e}. Please enter one of: {', '.join(options)}.")
+                continue
+            self.compression_method = None if choice == "none" else choice
+            break
+
     def say_hello(self):
         message = 'HELLO'
         self.client_socket.sendto(message.encode(), (self.server_name, self.server_port))
@@ -54,9 +85,11 @@ class Client:
             else:
                 print("Invalid protocol choice. Please enter 1, 2, or 3.")
         protocol = "sw" if protocol_choice == "1" else ("gbn" if protocol_choice == "2" else "sr")
-        message = str([self.error_type, self.error_rate, protocol])
+        self.checksum_selection()
+        self.compression_selection()
+        message = str([self.error_type, self.error_rate, protocol, self.checksum_method, self.compression_method])
         self.client_socket.sendto(message.encode(), (self.server_name, self.server_port))
-        r = receive.receive()
+        r = receive.receive(self.checksum_method)  # Compressed packets say so, nothing to configure
         r.udp_receive_protocol(self.client_socket, False, self.error_type, self.error_rate, protocol)
 
     def push_file(self):
@@ -72,10 +105,12 @@ class Client:
             else:
                 print("Invalid protocol choice. Please enter 1, 2, or 3.")
         protocol = "sw" if protocol_choice == "1" else ("gbn" if protocol_choice == "2" else "sr")
-        message = str([self.error_type, self.error_rate, protocol])
+        self.checksum_selection()
+        self.compression_selection()
+        message = str([self.error_type, self.error_rate, protocol, self.checksum_method, self.compression_method])
         self.client_socket.sendto(message.encode(), (self.server_name, self.server_port))
         file_loc = input("If you want a custom file, input file path now else press enter: ").strip()
-        s = send.send()
+        s = send.send(self.checksum_method, self.compression_method)
         # For protocols that use windowing, gather additional parameters.
         if protocol in ["gbn", "sr"]:
             while True:
@@ -52,7 +52,7 @@ class Client:
                     time_taken = end_time - start_time
 
                     # Calculate throughput (bytes/s)
-                    total_bytes = total_packets * 4096  # Packet size 4096 bytes
+                    total_bytes = s.metrics.get("file_bytes", 0)  # Packet size changes during the transfer
                     throughput = total_bytes / time_taken if time_taken > 0 else 0
 
                     # Write the error type, error rate, time taken, and throughput to the CSV file
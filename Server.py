@@ -1,74 +1,250 @@
+import socket as socket_module
 from socket import *
-import receive
-import send
+import argparse
+import asyncio
+import multiprocessing
+import queue
+import time
+import async_transfer
+import compression
 import ast  # To safely convert string representation of a list back to a list
 
 
+class server_protocol(asyncio.DatagramProtocol):
+    """
+    Demultiplexes the server socket by client address. Each client gets its own transfer session, so a
+    HELLO or a second client's GET is answered while other transfers are still running.
+    """
+
+    SESSION_LINGER = 2.0  # Seconds a finished session still answers repeated FIN/announcement packets
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.sessions = {}  # {client address: sender_session or receiver_session}
+        self.pending = {}  # {client address: 'GET' or 'PUSH'} waiting for the parameter list
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, clientAddress):
+        session = self.sessions.get(clientAddress)
+        if session is not None and not session.done.done():
+            session.datagram_received(data, clientAddress)  # Bulk transfer packets never reach the parser
+            return
+
+        if clientAddress in self.pending:
+            self.start_session(self.pending.pop(clientAddress), data, clientAddress)
+            return
+
+        try:
+            message = data.decode()
+        except UnicodeDecodeError:
+            message = None
+        if message not in ("HELLO", "GET", "PUSH", "END"):
+            if session is not None:
+                session.datagram_received(data, clientAddress)  # e.g. a repeated FIN whose FINOK was lost
+            return
+        print(f"Received message: {message} from {clientAddress}")  # Debugging message
+
+        if message == "HELLO":
+            print("Responding to 'HELLO' from client...")
+            self.transport.sendto("Hello from server!".encode(), clientAddress)  # Respond with a custom message
+
+        elif message in ('GET', 'PUSH'):
+            print(f"Received '{message}' request from client.")
+            self.pending[clientAddress] = message  # The next datagram from this client holds the parameters
+
+        elif message == 'END':
+            active = sum(1 for s in self.sessions.values() if not s.done.done())
+            print(f"Ending communication, closing server ({active} transfers still active).")
+            self.server.stop()
+
+    def start_session(self, command, data, clientAddress):
+        try:
+            received_list = ast.literal_eval(data.decode())  # Safely parse the list
+            error_type = received_list[0]
+            error_rate = received_list[1]
+            protocol = received_list[2] if len(received_list) > 2 else "gbn"  # Default protocol
+            checksum_method = received_list[3] if len(received_list) > 3 else None  # Default checksum
+            compression_method = received_list[4] if len(received_list) > 4 else None  # Older clients: none
+            compression.parse_method(compression_method)  # Refuse codecs this server does not have
+            print(f"Received error_type: {error_type}, error_rate: {error_rate}, protocol: {protocol}, "
+                  f"checksum: {checksum_method}, compression: {compression_method}")
+            if command == 'GET':
+                session = async_transfer.sender_session(
+                    self.transport, clientAddress, protocol=protocol, window_size=10, timeout_interval=0.05,
+                    error_type=error_type, error_rate=error_rate, checksum_method=checksum_method,
+                    compression_method=compression_method)
+            else:
+                session = async_transfer.receiver_session(
+                    self.transport, protocol, window_size=10, error_type=error_type, error_rate=error_rate,
+                    checksum_method=checksum_method, output_path=self.output_path(protocol, clientAddress),
+                    checkpoint_name=self.requested_name(protocol))
+        except Exception as e:
+            print(f"Error while handling '{command}' request: {e}")
+            return
+
+        self.sessions[clientAddress] = session
+        session.done.add_done_callback(lambda done: self.session_finished(command, clientAddress, session, done))
+        session.start()
+
+    def requested_name(self, protocol):
+        """File a PUSH is saved as; its checkpoint keeps this name for a retry (see output_path)."""
+        return "server_image_sr.bmp" if protocol.lower() == "sr" else "server_image.bmp"
+
+    def output_path(self, protocol, clientAddress):
+        """Same file names as before; a second concurrent PUSH gets the client port appended."""
+        path = self.requested_name(protocol)
+        in_use = {s.output_path for s in self.sessions.values()
+                  if isinstance(s, async_transfer.receiver_session) and not s.done.done()}
+        return path if path not in in_use else f"{path[:-len('.bmp')]}_{clientAddress[1]}.bmp"
+
+    def session_finished(self, command, clientAddress, session, done):
+        if done.exception() is not None:
+            print(f"Error while handling '{command}' request from {clientAddress}: {done.exception()}")
+            self.server.record(command, None)
+        else:
+            print(f"'{command}' transfer with {clientAddress} finished.")
+            self.server.record(command, done.result())
+        session.close()
+        asyncio.get_running_loop().call_later(self.SESSION_LINGER, self.forget, clientAddress, session)
+
+    def forget(self, clientAddress, session):
+        if self.sessions.get(clientAddress) is session:
+            del self.sessions[clientAddress]
+
+    def error_received(self, exc):
+        print(f"Socket error: {exc}")
+
+
 class Server:
-    def main(self):
-        serverPort = 12000
-        serverSocket = socket(AF_INET, SOCK_DGRAM)
+    def __init__(self, stats_queue=None, worker=None):
+        self.stats = {"GET": 0, "PUSH": 0, "failed": 0, "packets_sent": 0, "retransmissions": 0}
+        self.stopped = None
+        self.stats_queue = stats_queue  # Worker processes report each finished transfer to the supervisor
+        self.worker = worker
+
+    def record(self, command, result):
+        """Adds a finished transfer to the server statistics."""
+        if self.stats_queue is not None:
+            self.stats_queue.put((self.worker, command, result))
+        if result is None:
+            self.stats["failed"] += 1
+            return
+        self.stats[command] += 1
+        if command == 'GET':
+            self.stats["packets_sent"] += result[0]
+            self.stats["retransmissions"] += result[1]
 
+    def stop(self):
+        if self.stopped is not None and not self.stopped.done():
+            self.stopped.set_result(True)
+
+    async def serve(self, serverSocket=None, serverPort=12000):
+        """Runs the server until an 'END' command arrives. serverSocket may be an already bound UDP socket."""
+        if serverSocket is None:
+            serverSocket = socket(AF_INET, SOCK_DGRAM)
+            serverSocket.bind(('', serverPort))
+        print(f"Server is listening on port {serverSocket.getsockname()[1]}")
+
+        loop = asyncio.get_running_loop()
+        self.stopped = loop.create_future()
+        transport, protocol = await loop.create_datagram_endpoint(lambda: server_protocol(self), sock=serverSocket)
+        try:
+            await self.stopped
+        finally:
+            for session in protocol.sessions.values():
+                session.close()
+            transport.close()
+        print(f"Server statistics: {self.stats}")
+
+    def main(self, workers=1, serverPort=12000):
         print(f"Starting server...")  # Debugging print
-        serverSocket.bind(('', serverPort))
-        print(f"Server is listening on port {serverPort}")
-
-        while True:
-            serverSocket.settimeout(50)  # Timeout after 50 seconds
-            print("Waiting for client messages...")
-            try:
-                message, clientAddress = serverSocket.recvfrom(2048)
-                message = message.decode()
-                print(f"Received message: {message} from {clientAddress}")  # Debugging message
-            except timeout:
-                print("No message received, continuing...")
-                continue  # Go back to waiting for a new message
-
-            if message == "HELLO":
-                print("Responding to 'HELLO' from client...")
-                serverSocket.sendto("Hello from server!".encode(), clientAddress)  # Respond with a custom message
-
-            elif message == 'GET':
-                print("Received 'GET' request from client.")
-                # Waiting for error type and error rate (assuming this is part of the GET request)
-                try:
-                    error_message, clientAddress = serverSocket.recvfrom(1024)  # Buffer size of 1024 bytes
-                    decoded_message = error_message.decode()
-                    received_list = ast.literal_eval(decoded_message)  # Safely parse the list
-                    error_type = received_list[0]
-                    error_rate = received_list[1]
-                    protocol = received_list[2] if len(received_list) > 2 else "gbn"  # Default protocol
-                    print(f"Received error_type: {error_type}, error_rate: {error_rate}, protocol: {protocol}")
-                    s = send.send()
-                    s.udp_send_protocol(serverSocket, clientAddress, error_type, error_rate,
-                                        protocol=protocol, window_size=10, timeout_interval=0.05)
-                except Exception as e:
-                    print(f"Error while handling 'GET' request: {e}")
-
-
-            elif message == 'PUSH':
-                print("Received 'PUSH' request from client.")
-                try:
-                    error_message, clientAddress = serverSocket.recvfrom(1024)  # Buffer size of 1024 bytes
-                    decoded_message = error_message.decode()
-                    received_list = ast.literal_eval(decoded_message)  # Safely parse the list
-                    error_type = received_list[0]
-                    error_rate = received_list[1]
-                    protocol = received_list[2] if len(received_list) > 2 else "gbn"
-                    print(f"Received error_type: {error_type}, error_rate: {error_rate}, protocol: {protocol}")
-                    r = receive.receive()
-                    r.udp_receive_protocol(serverSocket, True, error_type, error_rate, protocol, window_size=10)
-                except Exception as e:
-
-                    print(f"Error while handling 'PUSH' request: {e}")
-
-
-            elif message == 'END':
-                print("Ending communication, closing server.")
-                serverSocket.close()
-                break
+        if workers > 1 and hasattr(socket_module, "SO_REUSEPORT"):
+            server_supervisor(workers, serverPort).run()
+            return
+        if workers > 1:
+            print("SO_REUSEPORT is not available on this platform, running a single server process.")
+        asyncio.run(self.serve(serverPort=serverPort))
+
+
+def worker_main(index, serverPort, stats_queue):
+    """Entry point of a worker process: its own socket on the shared port and its own event loop."""
+    serverSocket = socket(AF_INET, SOCK_DGRAM)
+    serverSocket.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+    serverSocket.bind(('', serverPort))
+    print(f"Worker {index} started (pid {multiprocessing.current_process().pid})")
+    asyncio.run(Server(stats_queue, index).serve(serverSocket))
+
+
+class server_supervisor:
+    """
+    Runs N server processes bound to the same port with SO_REUSEPORT. The kernel hashes each client's
+    address to one of the sockets, so all datagrams of a flow reach the same worker and its session.
+    Crashed workers are restarted (the hash is recomputed when the set of sockets changes, so transfers in
+    flight on other workers may move and have to be retried). An END reaches one worker, which exits
+    cleanly; the supervisor then stops the others.
+    """
+
+    def __init__(self, workers, serverPort=12000):
+        self.workers = workers
+        self.serverPort = serverPort
+        self.stats_queue = multiprocessing.Queue()
+        self.processes = {}
+        self.totals = Server()  # Aggregated statistics of every worker
+        self.per_worker = {index: 0 for index in range(workers)}
+        self.restarts = 0
+
+    def start_worker(self, index):
+        process = multiprocessing.Process(target=worker_main, args=(index, self.serverPort, self.stats_queue),
+                                          daemon=True)
+        process.start()
+        self.processes[index] = process
+
+    def collect(self, wait):
+        try:
+            index, command, result = self.stats_queue.get(timeout=wait)
+        except queue.Empty:
+            return
+        self.totals.record(command, result)
+        self.per_worker[index] += 1
+
+    def run(self):
+        print(f"Starting {self.workers} worker processes on port {self.serverPort} (SO_REUSEPORT)")
+        for index in range(self.workers):
+            self.start_worker(index)
+        try:
+            while True:
+                self.collect(0.5)
+                finished = [index for index, process in self.processes.items() if process.exitcode is not None]
+                if any(self.processes[index].exitcode == 0 for index in finished):
+                    print("A worker received 'END', stopping all workers.")
+                    break
+                for index in finished:
+                    print(f"Worker {index} exited with code {self.processes[index].exitcode}, restarting it.")
+                    self.restarts += 1
+                    self.start_worker(index)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for process in self.processes.values():
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            deadline = time.time() + 0.5
+            while time.time() < deadline:
+                self.collect(0.05)  # Reports sent just before the shutdown
+        print(f"Aggregated server statistics: {self.totals.stats}")
+        print(f"Transfers per worker: {self.per_worker}, restarts: {self.restarts}")
+        return self.totals.stats
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Image transfer server.")
+    parser.add_argument("--port", type=int, default=12000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes sharing the port with SO_REUSEPORT")
+    args = parser.parse_args()
     c = Server()
-    c.main()
+    c.main(args.workers, args.port)
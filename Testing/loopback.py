@@ -0,0 +1,113 @@
+import contextlib
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from socket import *
+import checkpoint
+import send
+import send_threaded
+
+# Harness shared by the transfer tests: a random file in a temporary directory, a bound receiver socket and
+# a sender socket on loopback, and both sides of a transfer run in daemon threads with their prints silenced.
+
+
+class dropping:
+    """Sender mixin that loses the first transmission of the given packets, as a lossy link would."""
+
+    def __init__(self, dropped, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dropped = set(dropped)
+
+    def transmit_from(self, port, dest, source, sequence_number, error_type: int = 1, error_rate: float = 0):
+        if sequence_number in self.dropped:
+            self.dropped.discard(sequence_number)
+            return False
+        return super().transmit_from(port, dest, source, sequence_number, error_type, error_rate)
+
+
+class drop_first(dropping, send.send):
+    pass
+
+
+class drop_first_threaded(dropping, send_threaded.send_threaded):
+    pass
+
+
+class loopback_case(unittest.TestCase):
+    DATA_SIZE = 200000
+    IMAGE_NAME = "sent.bin"
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.image = os.path.join(self.directory, self.IMAGE_NAME)
+        self.output = os.path.join(self.directory, "received.bin")
+        self.data = self.make_data()
+        os.makedirs(os.path.dirname(self.image), exist_ok=True)
+        with open(self.image, 'wb') as f:
+            f.write(self.data)
+        self.receiver_socket = socket(AF_INET, SOCK_DGRAM)
+        self.receiver_socket.bind(('127.0.0.1', 0))
+        self.sender_socket = socket(AF_INET, SOCK_DGRAM)
+
+    def make_data(self):
+        """Contents of the sent file; random, so no two transfers or offsets look alike."""
+        return os.urandom(self.DATA_SIZE)
+
+    def tearDown(self):
+        self.receiver_socket.close()
+        self.sender_socket.close()
+        shutil.rmtree(self.directory)
+
+    def hold(self, ranges, data=None):
+        """
+        Leaves a suspended checkpoint for self.output as if an earlier attempt had received the byte ranges
+        [(start, end), ...] of data (the sent file by default) before it was interrupted.
+        """
+        data = self.data if data is None else data
+        held = checkpoint.receive_checkpoint(self.output, len(self.data), checkpoint.transfer_id(self.image),
+                                             hashlib.blake2b(self.data, digest_size=16).digest())
+        for start, end in ranges:
+            held.buffer[start:end] = data[start:end]
+            held.add(start, end - start)
+        with contextlib.redirect_stdout(io.StringIO()):
+            held.suspend()
+
+    def send_partially(self, port, dest, packets, packet_size=None):
+        """Announces the file and sends only its first packets, as a sender killed partway would."""
+        sender = send.send()
+        source = sender.open_source(self.image, packet_size)
+        sender.announce(port, dest, source)
+        for seq in range(packets):
+            sender.transmit_from(port, dest, source, seq)
+            time.sleep(0.001)  # Without ACKs to clock it, a burst could overflow the receiver's socket buffer
+        source.close()
+
+    def checkpoint_files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith((".part", ".resume")))
+
+    def run_threads(self, *targets, timeout: float = 30):
+        """Runs the targets in daemon threads at the same time and returns their results in order."""
+        results = [None] * len(targets)
+
+        def run(index, target):
+            results[index] = target()
+
+        threads = [threading.Thread(target=run, args=(index, target), daemon=True)
+                   for index, target in enumerate(targets)]
+        deadline = time.time() + timeout
+        with contextlib.redirect_stdout(io.StringIO()):  # The protocols print per packet
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(max(0.0, deadline - time.time()))
+        self.assertFalse(any(thread.is_alive() for thread in threads), "transfer did not finish")
+        return results
+
+    def assert_received(self, path=None):
+        with open(path or self.output, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
@@ -0,0 +1,65 @@
+import asyncio
+import contextlib
+import io
+import os
+import unittest
+import async_transfer
+import checkpoint
+import receive
+from loopback import loopback_case, drop_first
+
+
+class TestAsyncTransfer(loopback_case):
+
+    def run_async(self, protocol, **sender_options):
+        """Runs an asyncio sender and an asyncio receiver on one event loop; returns both results."""
+        async def both():
+            receiving = asyncio.ensure_future(async_transfer.transfer(
+                "receive", sock=self.receiver_socket, protocol=protocol, window_size=8, output_path=self.output))
+            sending = async_transfer.transfer("send", sock=self.sender_socket, dest=self.receiver_socket.getsockname(),
+                                              image=self.image, protocol=protocol, window_size=8, **sender_options)
+            return await asyncio.wait_for(asyncio.gather(sending, receiving, return_exceptions=True), 30)
+
+        with contextlib.redirect_stdout(io.StringIO()):  # The protocols print per packet
+            return asyncio.run(both())
+
+    def test_sr_round_trip(self):
+        sent, received = self.run_async("sr")
+        self.assertGreater(received, 0)
+        self.assert_received()
+
+    def test_gbn_with_loss(self):
+        """Test that the session timers recover data packets dropped by the error simulation."""
+        sent, received = self.run_async("gbn", error_type=5, error_rate=0.1)
+        self.assertNotIsInstance(sent, Exception)
+        self.assert_received()
+
+    def test_async_sender_to_blocking_receiver(self):
+        r = receive.receive()
+        self.run_threads(
+            lambda: r.udp_receive_protocol(self.receiver_socket, True, 1, 0, "gbn", window_size=8,
+                                           output_path=self.output),
+            lambda: asyncio.run(asyncio.wait_for(async_transfer.transfer(
+                "send", sock=self.sender_socket, dest=self.receiver_socket.getsockname(), image=self.image,
+                protocol="gbn", window_size=8), 30)))
+        self.assert_received()
+
+    def test_blocking_sender_with_loss_to_async_receiver(self):
+        self.run_threads(
+            lambda: drop_first([0, 5, 6]).udp_send_protocol(self.sender_socket, self.receiver_socket.getsockname(),
+                                                            1, 0, "sr", self.image, window_size=8),
+            lambda: asyncio.run(asyncio.wait_for(async_transfer.transfer(
+                "receive", sock=self.receiver_socket, protocol="sr", window_size=8, output_path=self.output), 30)))
+        self.assert_received()
+
+    def test_mismatched_resume_fails_the_session(self):
+        """Test that a resumed file that fails the content hash check is reported and not saved."""
+        self.hold([(0, checkpoint.CHUNK_SIZE)], bytes(len(self.data)))  # Claims a chunk of zeros
+        sent, received = self.run_async("sr")
+        self.assertNotIsInstance(sent, Exception)
+        self.assertIsInstance(received, ValueError)
+        self.assertEqual(os.listdir(self.directory), ["sent.bin"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+from socket import *
+import batch_io
+
+
+class TestBatchIO(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = socket(AF_INET, SOCK_DGRAM)
+        self.receiver.bind(('127.0.0.1', 0))
+        self.receiver.settimeout(1.0)
+        self.sender = socket(AF_INET, SOCK_DGRAM)
+        self.sender.bind(('127.0.0.1', 0))
+
+    def tearDown(self):
+        self.receiver.close()
+        self.sender.close()
+
+    def receive_all(self, count, mode="auto"):
+        incoming = batch_io.batch_receiver(self.receiver, mode=mode)
+        buffer = bytearray(65535)
+        packets = []
+        for _ in range(count):
+            nbytes, address = incoming.recvfrom_into(buffer)
+            packets.append(bytes(buffer[:nbytes]))
+            self.assertEqual(address, self.sender.getsockname())
+        return packets
+
+    def test_every_mode_delivers_packets_in_order(self):
+        """Test that header + payload + trailer packets arrive whole and in order, the short last one too."""
+        expected = [bytes([i]) * 4 + b'x' * 100 + (b'cs' if i < 19 else b'') for i in range(20)]
+        for mode in ["plain", "mmsg", "gso"]:
+            with self.subTest(mode=mode):
+                batch = batch_io.batch_sender(self.sender, 106, capacity=8, mode=mode)
+                for i in range(20):
+                    batch.add(self.receiver.getsockname(), bytes([i]) * 4, memoryview(b'x' * 100),
+                              b'cs' if i < 19 else b'')
+                batch.flush()
+                self.assertEqual(batch.packets, 20)
+                self.assertEqual(self.receive_all(20, mode="plain" if mode == "plain" else "auto"), expected)
+
+    @unittest.skipIf(batch_io.libc is None, "needs recvmmsg")
+    def test_one_recvmmsg_per_burst(self):
+        """Test that queued datagrams are all taken by one call and handed out as views of their slots."""
+        for i in range(10):
+            self.sender.sendto(bytes([i]) * 50, self.receiver.getsockname())
+        time.sleep(0.05)
+        incoming = batch_io.batch_receiver(self.receiver)
+        for i in range(10):
+            datagram, address = incoming.recvfrom()
+            self.assertIsInstance(datagram, memoryview)
+            self.assertEqual((bytes(datagram), address), (bytes([i]) * 50, self.sender.getsockname()))
+        self.assertEqual((incoming.syscalls, incoming.packets), (1, 10))
+
+    @unittest.skipIf(batch_io.libc is None, "needs recvmmsg")
+    def test_waits_for_the_socket_timeout(self):
+        """Test that recvmmsg waits for a late datagram, and gives up after the socket timeout like recvfrom."""
+        incoming = batch_io.batch_receiver(self.receiver)
+        for timeout_value in (1.0, None):
+            with self.subTest(timeout=timeout_value):
+                self.receiver.settimeout(timeout_value)
+                late = threading.Timer(0.1, self.sender.sendto, (b"late", self.receiver.getsockname()))
+                late.start()
+                self.assertEqual(bytes(incoming.recvfrom()[0]), b"late")
+                late.join()
+        self.receiver.settimeout(0.2)
+        started = time.monotonic()
+        with self.assertRaises(timeout):
+            incoming.recvfrom()
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_falls_back_without_a_socket(self):
+        """Test that objects with only sendto (e.g. asyncio transports) get one sendto per packet."""
+        class transport:
+            def __init__(self):
+                self.sent = []
+
+            def sendto(self, data, address):
+                self.sent.append((bytes(data), address))
+
+        port = transport()
+        batch = batch_io.batch_sender(port, 16)
+        self.assertEqual(batch.mode, "plain")
+        batch.add(('127.0.0.1', 9), b'ab', b'cd')
+        batch.add(('127.0.0.1', 9), b'ef')
+        batch.flush()
+        self.assertEqual(port.sent, [(b'abcd', ('127.0.0.1', 9)), (b'ef', ('127.0.0.1', 9))])
+
+
+if __name__ == '__main__':
+    unittest.main()
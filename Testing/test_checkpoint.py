@@ -0,0 +1,113 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import checkpoint
+import packet_format as pf
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, "received.bin")
+        self.data = os.urandom(5 * 1000 + 300)  # Five full chunks of 1000 bytes and a short one
+        self.key = (0x1234, hashlib.blake2b(self.data, digest_size=16).digest())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open(self):
+        return checkpoint.receive_checkpoint(self.output, len(self.data), *self.key, chunk_size=1000)
+
+    def place(self, ckpt, start, end):
+        ckpt.buffer[start:end] = self.data[start:end]
+        ckpt.add(start, end - start)
+
+    def test_interrupted_transfer_resumes_with_the_missing_chunks(self):
+        """Test that a suspended checkpoint is offered back, and the sender is left with only what is missing."""
+        ckpt = self.open()
+        self.assertEqual(ckpt.reply(), pf.ANNOUNCE_REPLY)
+        self.place(ckpt, 0, 1500)  # Chunk 0, half of chunk 1
+        self.place(ckpt, 1500, 2100)  # Straddles chunks 1 and 2
+        self.place(ckpt, 4000, 5000)  # Out of order: chunk 4
+        ckpt.suspend()
+
+        ckpt = self.open()
+        self.assertEqual(ckpt.resumed_bytes, 3000)  # Chunk 2 is incomplete and is sent again
+        self.assertEqual(checkpoint.missing_ranges(ckpt.reply(), len(self.data)), [(2000, 4000), (5000, 5300)])
+        self.place(ckpt, 2000, 4000)
+        self.place(ckpt, 5000, 5300)
+        self.assertTrue(ckpt.complete())
+        with open(self.output, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.listdir(self.directory), ["received.bin"])
+
+    def test_changed_file_starts_over(self):
+        """Test that a checkpoint of another content hash is removed instead of resumed."""
+        ckpt = self.open()
+        self.place(ckpt, 0, 3000)
+        ckpt.suspend()
+        self.key = (0x1234, bytes(16 * [7]))
+        ckpt = self.open()
+        self.assertEqual(ckpt.resumed_bytes, 0)
+        ckpt.close()
+        self.assertEqual(len(os.listdir(self.directory)), 1)  # Only the new partial file
+
+    def test_mismatched_file_is_discarded(self):
+        """Test that a resumed file that does not match the content hash never replaces the output."""
+        with open(self.output, 'wb') as f:
+            f.write(b"previous")
+        ckpt = self.open()
+        self.place(ckpt, 0, 3000)
+        ckpt.suspend()
+        ckpt = self.open()
+        self.data = bytes(len(self.data))  # The rest arrives from another version of the file
+        self.place(ckpt, 3000, 5300)
+        self.assertFalse(ckpt.complete())
+        with open(self.output, 'rb') as f:
+            self.assertEqual(f.read(), b"previous")
+        self.assertEqual(os.listdir(self.directory), ["received.bin"])  # Nothing left to resume from
+
+    def test_outputs_have_their_own_checkpoints(self):
+        """Test that two receivers of the same file into different outputs neither share nor prune a checkpoint."""
+        first = self.open()
+        self.output = os.path.join(self.directory, "received_2.bin")
+        self.key = (0x1234, bytes(16))  # Even another version of the file
+        second = self.open()
+        self.assertNotEqual(first.part_path, second.part_path)
+        self.assertTrue(os.path.exists(first.part_path))
+        self.place(first, 0, 1000)
+        self.assertEqual(second.held_bytes, 0)
+        first.close()
+        second.close()
+
+    def test_retry_under_another_output_resumes(self):
+        """Test that the checkpoint follows the requested name, and one still open is never shared."""
+        first = checkpoint.receive_checkpoint(self.output, len(self.data), *self.key, chunk_size=1000, name="asked.bin")
+        self.place(first, 0, 3000)
+        concurrent = checkpoint.receive_checkpoint(os.path.join(self.directory, "received_2.bin"), len(self.data),
+                                                   *self.key, chunk_size=1000, name="asked.bin")
+        self.assertEqual(concurrent.resumed_bytes, 0)
+        self.assertNotEqual(concurrent.part_path, first.part_path)
+        concurrent.close()
+        first.suspend()
+
+        retry = checkpoint.receive_checkpoint(os.path.join(self.directory, "received_3.bin"), len(self.data),
+                                              *self.key, chunk_size=1000, name="asked.bin")
+        self.assertEqual(retry.resumed_bytes, 3000)
+        self.place(retry, 3000, len(self.data))
+        self.assertTrue(retry.complete())
+        with open(os.path.join(self.directory, "received_3.bin"), 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_bad_resume_reply(self):
+        with self.assertRaises(ValueError):
+            checkpoint.missing_ranges(pf.pack_resume(1000, 3, b"not zlib"), 2500)
+        with self.assertRaises(ValueError):
+            checkpoint.missing_ranges(pf.pack_resume(1000, 7, b""), 2500)  # Another file size
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import random
+import zlib
+import checksums
+
+
+class TestChecksums(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(5)  # Fix seed for reproducibility
+        self.test_data = bytes(random.getrandbits(8) for _ in range(4097))
+
+    def test_crc16_table_matches_bitwise(self):
+        """Test that the table driven CRC-16 gives the same result as the bit-by-bit version."""
+        for length in [0, 1, 2, 3, 57, 4096, 4097]:
+            data = self.test_data[:length]
+            self.assertEqual(checksums.compute_crc16(data), checksums.compute_crc16_bitwise(data))
+
+    def test_crc16_accepts_memoryview(self):
+        """Test that the CRC-16 can be computed over a memoryview without copying first."""
+        view = memoryview(self.test_data)[10:1010]
+        self.assertEqual(checksums.compute_crc16(view), checksums.compute_crc16_bitwise(self.test_data[10:1010]))
+
+    def test_registry_lookup(self):
+        """Test that engines are found by name, by legacy integer, and report their trailer size."""
+        self.assertEqual(checksums.get_engine("crc32").size, 4)
+        self.assertEqual(checksums.get_engine("adler32").size, 4)
+        self.assertEqual(checksums.get_engine(1).name, "crc16")
+        self.assertEqual(checksums.get_engine(0).name, "xor")
+        self.assertEqual(checksums.get_engine("crc32").compute(self.test_data), zlib.crc32(self.test_data))
+        with self.assertRaises(ValueError):
+            checksums.get_engine("md5")
+
+    def test_batch_matches_per_packet(self):
+        """Test that the batch API gives one checksum per packet, equal to checksumming each chunk."""
+        packet_size = 100
+        for name in checksums.CHECKSUM_ENGINES:
+            batch = checksums.compute_checksums(self.test_data, packet_size, name)
+            expected = [checksums.compute_checksum(self.test_data[start:start + packet_size], name)
+                        for start in range(0, len(self.test_data), packet_size)]
+            self.assertEqual([int(value) for value in batch], expected)
+
+    def test_internet_checksum_odd_length(self):
+        """Test that an odd length packet is padded with a zero byte for the 16-bit sum."""
+        self.assertEqual(checksums.compute_internet_checksum(b"\x12\x34\x56"),
+                         checksums.compute_internet_checksum(b"\x12\x34\x56\x00"))
+        self.assertEqual(checksums.compute_internet_checksum(b"\x00\x01"), 0xFFFE)
+
+    def test_pack_round_trip(self):
+        """Test that a checksum packed into its trailer can be unpacked again."""
+        for name in checksums.CHECKSUM_ENGINES:
+            engine = checksums.get_engine(name)
+            value = engine.compute(self.test_data)
+            trailer = engine.pack(value)
+            self.assertEqual(len(trailer), engine.size)
+            self.assertEqual(engine.unpack(trailer), value)
+
+
+if __name__ == '__main__':
+    unittest.main()
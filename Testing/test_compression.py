@@ -0,0 +1,85 @@
+import os
+import unittest
+import compression
+import packet_format as pf
+import receive
+from loopback import loopback_case, drop_first
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.payload = bytes(range(64)) * 64  # 4 KB that compresses well
+
+    def test_round_trip(self):
+        """Test that every registered codec round-trips a payload through the code carried in the flags."""
+        for name in compression.CODECS:
+            with self.subTest(codec=name):
+                compressor = compression.make_compressor(name)
+                compressed = compressor.compress(self.payload)
+                self.assertLess(len(compressed), len(self.payload))
+                code = pf.compression_code(compressor.flags | pf.FLAG_REPAIR)
+                self.assertEqual(compression.decompress(code, compressed), self.payload)
+
+    def test_incompressible_payload_goes_out_as_is(self):
+        self.assertIsNone(compression.make_compressor("zlib:1").compress(os.urandom(4096)))
+
+    def test_bad_payloads(self):
+        with self.assertRaises(ValueError):
+            compression.decompress(1, b"not zlib")
+        with self.assertRaises(ValueError):
+            compression.decompress(1, compression.CODECS["zlib"].compress(bytes(compression.MAX_PAYLOAD + 1), 1))
+        with self.assertRaises(ValueError):
+            compression.decompress(0, b"")  # No codec has code 0
+
+    def test_turns_off_when_it_does_not_save_time(self):
+        """Test that the mode moving fewer file bytes per second is switched off, and back on when it wins."""
+        compressor = compression.make_compressor("zlib:9")
+
+        def epoch(seconds):
+            mode = compressor.enabled
+            for i in range(compressor.EPOCH):
+                compressor.count(4096, 1024 if mode else 4096, now=seconds * i / (compressor.EPOCH - 1))
+            return mode
+
+        self.assertTrue(epoch(0.002))  # Compressed epoch first
+        self.assertFalse(epoch(0.001))  # Then without: twice as fast, as on loopback
+        self.assertFalse(compressor.chosen)
+        compressor.epochs_since_retry = compressor.RETRY_EPOCHS - 1
+        self.assertFalse(epoch(0.001))
+        self.assertTrue(compressor.enabled)  # The retry epoch, now on a slower link
+        epoch(0.0005)
+        self.assertTrue(compressor.chosen)
+        self.assertEqual([enabled for _, enabled in compressor.history], [True, False, True])
+
+    def test_parse_method(self):
+        self.assertIsNone(compression.make_compressor(None))
+        self.assertEqual(compression.make_compressor("zlib:3").name, "zlib:3")
+        with self.assertRaises(ValueError):
+            compression.parse_method("brotli")
+        with self.assertRaises(ValueError):
+            compression.parse_method("zlib:max")
+
+
+class TestCompressedTransfer(loopback_case):
+
+    def make_data(self):
+        return b"".join(b"row %d: %s\n" % (i, os.urandom(8).hex().encode()) for i in range(self.DATA_SIZE // 30))
+
+    def test_zlib_round_trip(self):
+        """Test that compressed packets are inflated and placed at their uncompressed offsets by every protocol."""
+        for protocol in ("sw", "gbn", "sr"):
+            with self.subTest(protocol=protocol):
+                sender = drop_first([2], compression_method="zlib")  # A retransmission is compressed as well
+                self.run_threads(
+                    lambda: receive.receive().udp_receive_protocol(self.receiver_socket, True, 1, 0, protocol,
+                                                                   window_size=8, output_path=self.output),
+                    lambda: sender.udp_send_protocol(self.sender_socket, self.receiver_socket.getsockname(), 1, 0,
+                                                     protocol, self.image, window_size=8))
+                self.assert_received()
+                self.assertGreater(sender.metrics["compressed_packets"], 0)
+                os.remove(self.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import congestion
+
+
+class TestCongestion(unittest.TestCase):
+
+    def test_reno_slow_start_and_decrease(self):
+        """Test that Reno doubles per window in slow start, halves on loss and restarts at one on timeout."""
+        controller = congestion.reno(max_window=64)
+        controller.on_ack(1)
+        controller.on_ack(2)
+        self.assertEqual(controller.window, 4)
+        controller.on_ack(28)
+        self.assertEqual(controller.window, 32)
+        controller.on_loss()
+        self.assertEqual(controller.window, 16)
+        controller.on_timeout()
+        self.assertEqual(controller.window, 1)
+        self.assertEqual(controller.ssthresh, 8)
+
+    def test_window_is_capped(self):
+        """Test that the window never exceeds max_window."""
+        controller = congestion.reno(max_window=10)
+        controller.on_ack(100)
+        self.assertEqual(controller.window, 10)
+
+    def test_cubic_returns_to_previous_maximum(self):
+        """Test that CUBIC decreases by BETA and grows back to the window where the loss happened."""
+        controller = congestion.cubic(max_window=1000, initial_window=100, ssthresh=50)
+        controller.on_loss()
+        self.assertAlmostEqual(controller.cwnd, 70)
+        for _ in range(20):
+            controller.on_ack(int(controller.cwnd))  # One window of ACKs per round trip
+        self.assertGreaterEqual(controller.window, 100)
+        self.assertEqual(int(controller.history[-1][1]), int(controller.cwnd))
+
+    def test_history_grows_with_window_changes_only(self):
+        """Test that ACKs leaving the whole-packet window and ssthresh unchanged add no history entry."""
+        controller = congestion.reno(max_window=10, initial_window=4, ssthresh=4)
+        for _ in range(1000):
+            controller.on_ack(1)  # Congestion avoidance up to the cap: six window steps
+        self.assertEqual([int(cwnd) for _, cwnd in controller.history], [4, 5, 6, 7, 8, 9, 10])
+        controller.on_loss()
+        controller.on_loss()
+        self.assertEqual([int(cwnd) for _, cwnd in controller.history[-2:]], [5, 2])
+
+    def test_make_controller(self):
+        """Test that fixed windows need no controller and unknown names are rejected."""
+        self.assertIsNone(congestion.make_controller(None, 10))
+        self.assertIsNone(congestion.make_controller("fixed", 10))
+        self.assertEqual(congestion.make_controller("CUBIC", 10).name, "cubic")
+        with self.assertRaises(ValueError):
+            congestion.make_controller("vegas", 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
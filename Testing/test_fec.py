@@ -0,0 +1,116 @@
+import os
+import random
+import unittest
+import fec
+import receive
+import send
+from loopback import loopback_case, drop_first
+
+
+class TestFec(unittest.TestCase):
+
+    def setUp(self):
+        self.payloads = [os.urandom(size) for size in (1024, 1024, 900, 1024, 700, 1024, 1024, 333)]
+        self.lengths = [len(payload) for payload in self.payloads]
+
+    def test_xor_rebuilds_one_loss(self):
+        """Test that repair packet 0 is the XOR of the block and rebuilds any single missing packet."""
+        parity = fec.encode(self.payloads, 0)
+        for lost in range(len(self.payloads)):
+            received = {i: payload for i, payload in enumerate(self.payloads) if i != lost}
+            self.assertEqual(fec.decode(self.lengths, received, {0: parity}), {lost: self.payloads[lost]})
+
+    def test_reed_solomon_rebuilds_several_losses(self):
+        """Test that m repair packets rebuild any m missing packets of different lengths."""
+        repairs = {j: fec.encode(self.payloads, j) for j in range(3)}
+        for lost in ([0, 1], [2, 4, 7], [5]):
+            received = {i: payload for i, payload in enumerate(self.payloads) if i not in lost}
+            self.assertEqual(fec.decode(self.lengths, received, repairs), {i: self.payloads[i] for i in lost})
+
+    def test_too_many_losses(self):
+        received = {i: payload for i, payload in enumerate(self.payloads) if i > 2}
+        self.assertIsNone(fec.decode(self.lengths, received, {0: fec.encode(self.payloads, 0)}))
+
+    def test_redundancy_adapts(self):
+        """Test that a retransmission adds a repair packet once per block, and clean blocks take it away."""
+        encoder = fec.make_encoder("rs", window_size=8)
+        self.assertEqual(encoder.block, 8)
+        encoder.on_loss(0)
+        encoder.on_loss(1)
+        self.assertEqual(encoder.repair, 2)
+        encoder.block_start = 8
+        encoder.on_loss(7)  # Sent before the first raise took effect
+        self.assertEqual(encoder.repair, 2)
+        encoder.on_loss(9)
+        self.assertEqual(encoder.repair, 3)
+        for _ in range(encoder.CLEAN_BLOCKS):
+            encoder.clean += 1
+        encoder.set_repair(encoder.repair - 1, 24)
+        self.assertEqual(encoder.history[-1], (24, 2))
+        self.assertEqual(fec.make_encoder("xor").max_repair, 1)
+        self.assertIsNone(fec.make_encoder(None))
+        with self.assertRaises(ValueError):
+            fec.make_encoder("ldpc")
+
+    def test_protected_blocks_are_found_and_forgotten(self):
+        """Test that blocks not starting at multiples of the block length are found, and dropped once acknowledged."""
+        payloads = self.payloads
+
+        class source:
+            @staticmethod
+            def payload(seq):
+                return payloads[seq % len(payloads)]
+
+            @staticmethod
+            def offset_of(seq):
+                return seq * 1024
+
+        encoder = fec.fec_encoder("xor", block=4)
+        encoder.block_start = 2
+        encoder.repairs(source, 6)
+        encoder.repairs(source, 10)
+        self.assertFalse(encoder.awaiting_repair(1, 5, 3))  # Before any protected block
+        self.assertTrue(encoder.awaiting_repair(5, 7, 3))
+        self.assertFalse(encoder.awaiting_repair(5, 8, 3))  # Three packets after the block were acknowledged
+        self.assertTrue(encoder.awaiting_repair(6, 8, 3))
+        encoder.forget(6)
+        self.assertEqual(encoder.protected, {6: 10})
+        encoder.forget(10)
+        self.assertEqual(encoder.protected, {})
+        self.assertFalse(encoder.awaiting_repair(7, 8, 3))
+
+
+class TestFecTransfer(loopback_case):
+
+    def transfer(self, sender, window_size=10, error_type=1, error_rate=0, fec_method="xor"):
+        """Sends the file over loopback with Selective Repeat; returns the receiver."""
+        r = receive.receive()
+        self.run_threads(
+            lambda: r.udp_receive_protocol(self.receiver_socket, True, 1, 0, "sr", window_size=window_size,
+                                           output_path=self.output),
+            lambda: sender.udp_send_protocol(self.sender_socket, self.receiver_socket.getsockname(), error_type,
+                                             error_rate, "sr", self.image, window_size=window_size, fec_method=fec_method))
+        self.assert_received()
+        return r
+
+    def test_resumed_transfer_rebuilds_at_the_right_offsets(self):
+        """Test that no FEC block spans the gap a resumed transfer skips, so rebuilt packets land where they belong."""
+        self.hold([(65536, 131072)])  # Packets 0-15 come from the first missing range, 16 on from the second
+        sender = drop_first([17])  # In the block of packets 10-19 if blocks did not end at the gap
+        sender.ADAPT_PACKET_SIZE = False
+        r = self.transfer(sender)
+        self.assertEqual(sender.metrics["resumed_bytes"], 65536)
+        self.assertGreater(r.recovered_packets, 0)
+
+    def test_random_loss_is_repaired(self):
+        """Test that packets dropped by the error type 5 simulation are rebuilt from the repair packets."""
+        for method in ("xor", "rs"):
+            with self.subTest(method=method):
+                random.seed(5)  # The simulated drops come from the random module
+                r = self.transfer(send.send(), error_type=5, error_rate=0.05, fec_method=method)
+                self.assertGreater(r.recovered_packets, 0)
+                os.remove(self.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
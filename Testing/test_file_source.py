@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from file_source import file_source
+
+
+class TestFileSource(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        self.data = os.urandom(10000)
+        with os.fdopen(handle, 'wb') as f:
+            f.write(self.data)
+        self.source = file_source(self.path, 1000, "crc32", block_packets=4)
+
+    def tearDown(self):
+        self.source.close()
+        os.remove(self.path)
+
+    def test_resized_packets_cover_the_file(self):
+        """Test that payloads laid out at their offsets rebuild the file after two size changes."""
+        source = self.source
+        for seq in range(3):
+            source.payload(seq)
+        source.set_packet_size(2500, 3)
+        self.assertEqual(source.total_packets, 3 + 3)  # 7000 bytes left in packets of 2500
+        source.payload(3)
+        source.set_packet_size(600, 5)  # Packet 4 was never asked for, it keeps 2500 bytes
+        rebuilt = bytearray(len(source))
+        seq = 0
+        while seq < source.total_packets:
+            payload = source.payload(seq)
+            rebuilt[source.offset_of(seq):source.offset_of(seq) + len(payload)] = payload
+            self.assertEqual(source.checksum_of(seq), source.checksum.compute(payload))
+            seq += 1
+        self.assertEqual(bytes(rebuilt), self.data)
+        self.assertEqual(len(source.payload(4)), 2500)
+        self.assertEqual(source.total_packets, 5 + 4)  # 2000 bytes left after packet 4, in packets of 600
+
+    def test_unresized_packets_use_the_initial_size(self):
+        """Test the fixed layout used until the size changes."""
+        self.assertEqual(self.source.total_packets, 10)
+        self.assertEqual(self.source.offset_of(7), 7000)
+        self.assertEqual(bytes(self.source.payload(9)), self.data[9000:])
+
+    def test_skipped_ranges(self):
+        """Test that after skip() packets come only from the ranges, cut at the packet size within each."""
+        source = self.source
+        source.skip([(0, 1500), (4000, 6000)])
+        self.assertEqual(source.skipped_bytes, 6500)
+        self.assertEqual(source.total_packets, 2 + 2)
+        layout = [(source.offset_of(seq), bytes(source.payload(seq))) for seq in range(source.total_packets)]
+        self.assertEqual([(offset, len(payload)) for offset, payload in layout],
+                         [(0, 1000), (1000, 500), (4000, 1000), (5000, 1000)])
+        self.assertTrue(all(payload == self.data[offset:offset + len(payload)] for offset, payload in layout))
+        self.assertEqual([source.ends_range(seq) for seq in range(4)], [False, True, False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+from socket import *
+import flow_control
+
+
+class TestFlowControl(unittest.TestCase):
+
+    def test_buffer_grows_to_twice_the_bdp(self):
+        """Test that 1 MB delivered in one 10 ms round trip asks for a 2 MB buffer, and that it never shrinks."""
+        sizer = flow_control.buffer_sizer(object())  # No setsockopt, so the requested size is kept as is
+        self.assertEqual(sizer.size, sizer.MIN_BUFFER)
+        sizer.on_bytes(0, 0.01, now=0.0)
+        sizer.on_bytes(1 << 20, 0.01, now=0.01)
+        self.assertEqual(sizer.size, 2 << 20)
+        sizer.on_bytes(1000, 0.01, now=0.02)
+        self.assertEqual(sizer.size, 2 << 20)
+
+    def test_advertised_window(self):
+        """Test that rwnd counts packets that fit in the buffer, minus queued ones, within [1, limit]."""
+        class backlog:
+            pending = 0
+
+        window = flow_control.receive_window(object(), limit=10, backlog=backlog)
+        window.on_packet(8192, 1, now=0.0)
+        self.assertEqual(window.advertise(), 8)  # 64 KB of 8 KB packets
+        backlog.pending = 5
+        self.assertEqual(window.advertise(), 3)
+        self.assertEqual(window.advertise(queued=100), 1)
+        window.on_packet(1024, 2, now=0.001)
+        self.assertEqual(window.advertise(queued=0), 10)
+
+    def test_real_socket_buffer(self):
+        """Test that the granted size is read back from the socket."""
+        port = socket(AF_INET, SOCK_DGRAM)
+        try:
+            sizer = flow_control.buffer_sizer(port, SO_RCVBUF)
+            self.assertGreater(sizer.size, 0)
+        finally:
+            port.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
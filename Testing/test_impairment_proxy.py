@@ -0,0 +1,116 @@
+import contextlib
+import io
+import time
+import unittest
+from unittest import mock
+from socket import *
+import impairment_proxy
+
+
+class TestImpairmentProxy(unittest.TestCase):
+    NOW = 100.0
+
+    def setUp(self):
+        self.proxies = []
+        self.clock = mock.patch.object(impairment_proxy, "time", mock.Mock(monotonic=lambda: self.now))
+        self.clock.start()
+        self.now = self.NOW
+
+    def tearDown(self):
+        self.clock.stop()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for proxy in self.proxies:
+                proxy.stop()
+
+    def proxy(self, **impairments):
+        """A proxy on a free port whose impair() is called directly; nothing is started or forwarded."""
+        proxy = impairment_proxy.impairment_proxy(0, seed=7, **impairments)
+        self.proxies.append(proxy)
+        return proxy
+
+    def impair(self, proxy, count, size=1000, direction="up"):
+        """Passes count datagrams through proxy at the current time; returns the scheduled deliveries."""
+        for i in range(count):
+            proxy.impair(direction, i.to_bytes(4, "big") + bytes(size - 4), "socket", "destination")
+        return sorted((deliver_at, data) for deliver_at, _, _, data, _ in proxy.schedule)
+
+    def test_delay_and_jitter(self):
+        """Test that every datagram is delayed by delay +/- jitter, and the same seed gives the same schedule."""
+        schedule = self.impair(self.proxy(delay=0.1, jitter=0.02), 200)
+        self.assertEqual(len(schedule), 200)
+        for deliver_at, _ in schedule:
+            self.assertGreaterEqual(deliver_at, self.NOW + 0.08)
+            self.assertLessEqual(deliver_at, self.NOW + 0.12)
+        self.assertNotEqual([data for _, data in schedule], sorted(data for _, data in schedule))  # Jitter reorders
+        self.assertEqual(self.impair(self.proxy(delay=0.1, jitter=0.02), 200), schedule)
+
+    def test_loss(self):
+        proxy = self.proxy(loss=0.3)
+        schedule = self.impair(proxy, 1000)
+        self.assertEqual(proxy.stats["up"]["dropped"] + len(schedule), 1000)
+        self.assertTrue(200 < proxy.stats["up"]["dropped"] < 400)
+        again = self.proxy(loss=0.3)
+        self.assertEqual(self.impair(again, 1000), schedule)
+        self.assertEqual(again.stats, proxy.stats)
+
+    def test_duplication(self):
+        """Test that a duplicated datagram is scheduled exactly twice."""
+        proxy = self.proxy(delay=0.05, duplicate=0.5)
+        schedule = self.impair(proxy, 100)
+        duplicated = proxy.stats["up"]["duplicated"]
+        self.assertTrue(0 < duplicated < 100)
+        self.assertEqual(len(schedule), 100 + duplicated)
+        copies = {}
+        for deliver_at, data in schedule:
+            copies.setdefault(data, []).append(deliver_at)
+        self.assertEqual(sum(len(times) - 1 for times in copies.values()), duplicated)
+        self.assertTrue(all(len(times) <= 2 for times in copies.values()))
+
+    def test_queue_limit(self):
+        """Test that a capped link drops what does not fit its queue, and takes datagrams again once it drains."""
+        proxy = self.proxy(bandwidth_mbps=8, queue_bytes=3500)  # 1 ms per 1000 byte datagram, 3 fit
+        schedule = self.impair(proxy, 10)
+        self.assertEqual(len(schedule), 3)
+        self.assertEqual(proxy.stats["up"]["overflowed"], 7)
+        self.assertEqual([round(deliver_at - self.NOW, 6) for deliver_at, _ in schedule], [0.001, 0.002, 0.003])
+
+        self.now += 0.002  # Two datagrams serialized since
+        self.assertEqual(len(self.impair(proxy, 10)), 5)
+        self.assertEqual(proxy.stats["up"]["overflowed"], 15)
+
+    def test_only_one_direction(self):
+        proxy = self.proxy(loss=1.0, directions=("up",))
+        self.impair(proxy, 10, direction="up")
+        self.assertEqual(self.impair(proxy, 10, direction="down"), [(self.NOW, i.to_bytes(4, "big") + bytes(996))
+                                                                    for i in range(10)])
+        self.assertEqual(proxy.stats["up"]["dropped"], 10)
+
+
+class TestImpairmentProxyForwarding(unittest.TestCase):
+
+    def test_round_trip(self):
+        """Test that datagrams reach the server through the proxy, and its replies reach the client, delayed."""
+        server = socket(AF_INET, SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        client = socket(AF_INET, SOCK_DGRAM)
+        server.settimeout(5)
+        client.settimeout(5)
+        with contextlib.redirect_stdout(io.StringIO()):
+            proxy = impairment_proxy.impairment_proxy(0, server.getsockname(), delay=0.05).start()
+            try:
+                started = time.monotonic()
+                client.sendto(b"ping", ('127.0.0.1', proxy.listen_port))
+                data, address = server.recvfrom(1024)
+                server.sendto(b"pong", address)
+                self.assertEqual((data, client.recvfrom(1024)[0]), (b"ping", b"pong"))
+                self.assertGreaterEqual(time.monotonic() - started, 0.1)
+            finally:
+                proxy.stop()
+                server.close()
+                client.close()
+        self.assertEqual(proxy.stats["up"]["forwarded"], 1)
+        self.assertEqual(proxy.stats["down"]["forwarded"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
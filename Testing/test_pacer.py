@@ -0,0 +1,37 @@
+import time
+import unittest
+import pacer
+
+
+class TestPacer(unittest.TestCase):
+
+    def test_fixed_rate_spreads_packets(self):
+        """Test that 20 packets of 1000 bytes at 8 Mbit/s (1 MB/s) take about 20 ms instead of leaving at once."""
+        bucket = pacer.pacer(8)
+        start = time.perf_counter()
+        for _ in range(20):
+            bucket.wait(1000)
+        elapsed = time.perf_counter() - start
+        self.assertGreaterEqual(elapsed, 0.019)
+        self.assertLess(elapsed, 0.2)
+        self.assertEqual(bucket.packets, 20)
+
+    def test_rate_from_window(self):
+        """Test that the cwnd/SRTT rate waits for the first RTT sample and is scaled by the gain."""
+        bucket = pacer.make_pacer("auto")
+        bucket.update(10, 1000, None)
+        self.assertIsNone(bucket.rate)
+        bucket.update(10, 1000, 0.01)
+        self.assertAlmostEqual(bucket.rate, pacer.pacer.GAIN * 1e6)
+        bucket.update(10, 1000, 0.01, slow_start=True)
+        self.assertAlmostEqual(bucket.rate, pacer.pacer.SLOW_START_GAIN * 1e6)
+
+    def test_make_pacer(self):
+        self.assertIsNone(pacer.make_pacer(None))
+        self.assertEqual(pacer.make_pacer("25").rate, 25 * 125000)
+        with self.assertRaises(ValueError):
+            pacer.make_pacer("fast")
+
+
+if __name__ == '__main__':
+    unittest.main()
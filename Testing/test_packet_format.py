@@ -0,0 +1,61 @@
+import unittest
+import packet_format as pf
+import checksums
+
+
+class TestPacketFormat(unittest.TestCase):
+
+    def test_seq_diff_across_wraparound(self):
+        """Test that serial number distance is correct when the counter wraps."""
+        self.assertEqual(pf.seq_diff(2, 0xFFFFFFFE), 4)
+        self.assertEqual(pf.seq_diff(0xFFFFFFFE, 2), -4)
+        self.assertTrue(pf.seq_lt(0xFFFFFFFF, 0))
+        self.assertFalse(pf.seq_lt(0, 0xFFFFFFFF))
+
+    def test_unwrap_seq(self):
+        """Test that wire values are mapped back to the absolute sequence number nearest the reference."""
+        absolute = (1 << 32) + 5
+        self.assertEqual(pf.unwrap_seq(pf.wire_seq(absolute), absolute - 10), absolute)
+        self.assertEqual(pf.unwrap_seq(pf.wire_seq(absolute - 3), absolute), absolute - 3)
+
+    def test_small_sequence_space(self):
+        """Test the arithmetic with a 16-bit sequence space, where wraparound is easy to reach."""
+        self.assertEqual(pf.unwrap_seq(pf.wire_seq(70000, bits=16), 69990, bits=16), 70000)
+        self.assertTrue(pf.seq_lt(65535, 3, bits=16))
+
+    def test_announcement_round_trip(self):
+        """Test that file sizes beyond the old 65,535 packet limit survive the announcement."""
+        packet = pf.pack_announcement(1 << 20, (1 << 20) * 4096, 4096)
+        self.assertEqual(len(packet), pf.ANNOUNCE_SIZE)
+        self.assertEqual(pf.unpack_announcement(packet), (1 << 20, (1 << 20) * 4096, 4096))
+        packet = pf.pack_announcement(3, 9000, 4096, 0xFEDCBA9876543210, bytes(range(16)))
+        self.assertEqual(pf.announcement_key(packet), (0xFEDCBA9876543210, bytes(range(16))))
+
+    def test_sack_ack_round_trip(self):
+        """Test that the cumulative ACK, SACK bitmap and rwnd survive packing, including 'nothing yet' (-1)."""
+        packet = pf.pack_ack(-1, 0b101, 24)
+        self.assertEqual(len(packet), pf.ACK_HEADER_SIZE)
+        self.assertEqual(pf.unpack_ack(packet, 0), (-1, 0b101, 24))
+        self.assertEqual(list(pf.sack_sequences(-1, 0b101)), [0, 2])
+        self.assertEqual(list(pf.sack_sequences(9, 1 << 63)), [73])
+
+
+    def test_data_header_round_trip(self):
+        """Test that the sequence number and a payload offset beyond 4 GiB survive the data header."""
+        header = bytearray(pf.DATA_HEADER_SIZE)
+        pf.pack_data_header(header, (1 << 32) + 7, 5 << 32, pf.FLAG_REPAIR)
+        self.assertEqual(pf.unpack_data_header(header, 1 << 32), ((1 << 32) + 7, 5 << 32, pf.FLAG_REPAIR))
+
+    def test_header_checksum_covers_the_header(self):
+        """Test that changing the offset changes the trailer even when the payload checksum is the same."""
+        engine = checksums.get_engine("crc32")
+        first, second = bytearray(pf.DATA_HEADER_SIZE), bytearray(pf.DATA_HEADER_SIZE)
+        pf.pack_data_header(first, 3, 4096)
+        pf.pack_data_header(second, 3, 8192)
+        payload_checksum = engine.compute(b"payload")
+        self.assertNotEqual(pf.header_checksum(engine, payload_checksum, first),
+                            pf.header_checksum(engine, payload_checksum, second))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import unittest
+import receive
+import send
+from loopback import loopback_case, drop_first
+
+
+class TestReceive(loopback_case):
+
+    def transfer(self, protocol, sender, window_size=4):
+        r = receive.receive()
+        self.run_threads(
+            lambda: r.udp_receive_protocol(self.receiver_socket, True, 1, 0, protocol, window_size=window_size,
+                                           output_path=self.output),
+            lambda: sender.udp_send_protocol(self.sender_socket, self.receiver_socket.getsockname(), 1, 0, protocol,
+                                             self.image, window_size=window_size),
+            timeout=25)
+        self.assert_received()
+
+    def test_gbn_first_packet_lost(self):
+        """Test that a lost packet 0 is not taken as acknowledged by the out-of-order ACKs that follow it."""
+        self.transfer("gbn", drop_first([0]))
+
+    def test_stop_and_wait_first_packet_lost(self):
+        self.transfer("sw", drop_first([0]))
+
+    def test_gbn_lost_packet_is_fast_retransmitted(self):
+        """Test that the duplicate ACKs for a lost packet resend the window before the timer expires."""
+        sender = drop_first([5])
+        self.transfer("gbn", sender, window_size=8)
+        self.assertGreater(sender.metrics["fast_retransmits"], 0)
+
+    def test_idle_sender_is_given_up_and_resumed(self):
+        """Test that a receiver whose sender went silent suspends its checkpoint, and the retry resumes from it."""
+        r = receive.receive()
+        r.IDLE_TIMEOUT = 0.3
+        self.run_threads(
+            lambda: r.udp_receive_protocol(self.receiver_socket, True, 1, 0, "sr", window_size=32,
+                                           output_path=self.output),
+            lambda: self.send_partially(self.sender_socket, self.receiver_socket.getsockname(), 24))
+        self.assertFalse(os.path.exists(self.output))
+        self.assertEqual(len(self.checkpoint_files()), 2)
+
+        sender = send.send()
+        self.run_threads(
+            lambda: receive.receive().udp_receive_protocol(self.receiver_socket, True, 1, 0, "sr",
+                                                           output_path=self.output),
+            lambda: sender.udp_send_protocol(self.sender_socket, self.receiver_socket.getsockname(), 1, 0, "sr",
+                                             self.image))
+        self.assert_received()
+        self.assertGreater(sender.metrics["resumed_bytes"], 0)
+        self.assertEqual(self.checkpoint_files(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import receive_pipelined
+import send
+import send_threaded
+from loopback import loopback_case, drop_first
+
+
+class TestReceivePipelined(loopback_case):
+
+    def transfer(self, protocol, send_file):
+        """
+        Receives the file with the pipelined receiver while send_file(port, dest) sends it over loopback;
+        returns the pipeline statistics.
+        """
+        r = receive_pipelined.receive_pipelined()
+        stats = self.run_threads(
+            lambda: r.udp_receive_pipelined(self.receiver_socket, True, 1, 0, protocol, window_size=8,
+                                            output_path=self.output),
+            lambda: send_file(self.sender_socket, self.receiver_socket.getsockname()))[0]
+        self.assert_received()
+        return stats
+
+    def test_gbn_round_trip(self):
+        stats = self.transfer("gbn", lambda port, dest: send.send().udp_send_protocol(
+            port, dest, 1, 0, "gbn", self.image, window_size=8))
+        self.assertEqual([stage["queue"] for stage in stats["stages"]],
+                         ["packets (drain -> worker)", "acks (worker -> response)"])
+
+    def test_sr_with_loss(self):
+        """Test that lost packets are acknowledged selectively and placed when their retransmission arrives."""
+        self.transfer("sr", lambda port, dest: drop_first([0, 5, 6]).udp_send_protocol(
+            port, dest, 1, 0, "sr", self.image, window_size=8))
+
+    def test_threaded_sender(self):
+        self.transfer("sr", lambda port, dest: send_threaded.send_threaded().udp_send_threaded(
+            port, dest, 1, 0, "sr", self.image, window_size=8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from rtt_estimator import rtt_estimator
+
+
+class TestRttEstimator(unittest.TestCase):
+
+    def test_first_sample(self):
+        """Test that the first sample sets SRTT = R, RTTVAR = R/2 and RTO = SRTT + 4 * RTTVAR."""
+        estimator = rtt_estimator(0.05)
+        estimator.sample(0.1)
+        self.assertAlmostEqual(estimator.srtt, 0.1)
+        self.assertAlmostEqual(estimator.rttvar, 0.05)
+        self.assertAlmostEqual(estimator.timeout, 0.3)
+
+    def test_backoff_until_next_sample(self):
+        """Test that timeouts double the RTO and a new sample removes the backoff."""
+        estimator = rtt_estimator(0.05)
+        estimator.on_timeout()
+        estimator.on_timeout()
+        self.assertAlmostEqual(estimator.timeout, 0.2)
+        estimator.sample(0.01)
+        self.assertEqual(estimator.backoff, 1)
+        self.assertAlmostEqual(estimator.timeout, 0.03)
+
+    def test_bounds(self):
+        """Test that the RTO stays between MIN_RTO and MAX_RTO."""
+        estimator = rtt_estimator(0.05)
+        estimator.sample(0.0001)
+        self.assertEqual(estimator.timeout, rtt_estimator.MIN_RTO)
+        estimator.sample(0.5)
+        for _ in range(20):
+            estimator.on_timeout()
+        self.assertEqual(estimator.timeout, rtt_estimator.MAX_RTO)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import checkpoint
+import receive
+import send_threaded
+from loopback import loopback_case, drop_first_threaded
+
+
+class TestSendThreaded(loopback_case):
+
+    def transfer(self, protocol, sender):
+        """Sends the file with sender to a blocking receiver over loopback; returns the sender's results."""
+        r = receive.receive()
+        results = self.run_threads(
+            lambda: r.udp_receive_protocol(self.receiver_socket, True, 1, 0, protocol, window_size=8,
+                                           output_path=self.output),
+            lambda: sender.udp_send_threaded(self.sender_socket, self.receiver_socket.getsockname(), 1, 0, protocol,
+                                             self.image, window_size=8))
+        self.assert_received()
+        return results[1]
+
+    def test_gbn_round_trip(self):
+        self.transfer("gbn", send_threaded.send_threaded())
+
+    def test_gbn_with_loss(self):
+        """Test that the transmit thread resends lost packets while the listener thread handles the ACKs."""
+        self.assertGreater(self.transfer("gbn", drop_first_threaded([0, 5, 6]))[1], 0)
+
+    def test_gbn_lost_packet_is_fast_retransmitted(self):
+        sender = drop_first_threaded([5])
+        self.transfer("gbn", sender)
+        self.assertGreater(sender.metrics["fast_retransmits"], 0)
+
+    def test_sr_with_loss(self):
+        self.assertGreater(self.transfer("sr", drop_first_threaded([0, 5, 6]))[1], 0)
+
+    def test_resume_with_fixed_packet_size(self):
+        """Test that a resumed transfer only sends the missing chunks, also when the packet size never changes."""
+        self.hold([(0, 2 * checkpoint.CHUNK_SIZE)])
+        sender = send_threaded.send_threaded()
+        sender.ADAPT_PACKET_SIZE = False
+        total_packets = self.transfer("sr", sender)[0]
+        self.assertEqual(sender.metrics["resumed_bytes"], 2 * checkpoint.CHUNK_SIZE)
+        self.assertEqual(total_packets, -(-(len(self.data) - 2 * checkpoint.CHUNK_SIZE) // sender.PACKET_SIZE))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import asyncio
+import contextlib
+import io
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+from socket import *
+import async_transfer
+import receive
+import send
+import packet_format as pf
+import Server
+from loopback import loopback_case, drop_first
+
+
+class TestServer(loopback_case):
+    IMAGE_NAME = os.path.join("image", "OIP.bmp")  # What the server sends for a GET
+
+    def setUp(self):
+        super().setUp()
+        # The server reads image/OIP.bmp and writes server_image*.bmp in the working directory
+        self.previous_directory = os.getcwd()
+        os.chdir(self.directory)
+        self.server = Server.Server()
+        self.address = self.receiver_socket.getsockname()
+        self.serving = threading.Thread(target=lambda: asyncio.run(self.server.serve(self.receiver_socket)),
+                                        daemon=True)
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        os.chdir(self.previous_directory)
+        super().tearDown()
+
+    def client(self):
+        client_socket = socket(AF_INET, SOCK_DGRAM)
+        client_socket.settimeout(5)
+        self.clients.append(client_socket)
+        return client_socket
+
+    def request(self, client_socket, command, protocol):
+        client_socket.sendto(command.encode(), self.address)
+        client_socket.sendto(str([1, 0, protocol, None, None]).encode(), self.address)
+
+    def push(self, client_socket, protocol, sender):
+        self.request(client_socket, "PUSH", protocol)
+        self.send_file(client_socket, protocol, sender)
+
+    def send_file(self, client_socket, protocol, sender):
+        sender.udp_send_protocol(client_socket, self.address, 1, 0, protocol, self.image, window_size=10)
+
+    def get(self, client_socket, protocol, output_path):
+        self.request(client_socket, "GET", protocol)
+        receive.receive().udp_receive_protocol(client_socket, False, 1, 0, protocol, window_size=10,
+                                               output_path=output_path)
+
+    def run_clients(self, *targets):
+        """Runs each client in its own thread at the same time, then stops the server with END."""
+        with contextlib.redirect_stdout(io.StringIO()):  # The server prints per request
+            self.serving.start()
+            self.run_threads(*targets)
+            self.client().sendto(b"END", self.address)
+            self.serving.join(5)
+        self.assertFalse(self.serving.is_alive(), "server did not stop")
+
+    def test_hello_during_transfers(self):
+        """Test that a HELLO is answered while a GET and a lossy PUSH from other clients are running."""
+        replies = []
+
+        def hello():
+            client_socket = self.client()
+            client_socket.sendto(b"HELLO", self.address)
+            replies.append(client_socket.recvfrom(1024)[0])
+
+        self.run_clients(lambda: self.get(self.client(), "gbn", "client_image.bmp"),
+                         lambda: self.push(self.client(), "sr", drop_first([0, 5, 6])),
+                         hello)
+        self.assertEqual(replies, [b"Hello from server!"])
+        self.assert_received("client_image.bmp")
+        self.assert_received("server_image_sr.bmp")
+        self.assertEqual({key: self.server.stats[key] for key in ("GET", "PUSH", "failed")},
+                         {"GET": 1, "PUSH": 1, "failed": 0})
+
+    @mock.patch.object(async_transfer.receiver_session, "IDLE_TIMEOUT", 0.3)
+    def test_interrupted_push_resumes_from_another_port(self):
+        """Test that a PUSH whose client died is given up, and the client's retry from a new port resumes it."""
+        sender = send.send()
+
+        def interrupted_then_retried():
+            first = self.client()
+            self.request(first, "PUSH", "sr")
+            self.send_partially(first, self.address, 10, packet_size=8192)  # Within the server's window
+            time.sleep(0.6)  # The server gives the first session up
+            self.push(self.client(), "sr", sender)
+
+        self.run_clients(interrupted_then_retried)
+        self.assert_received("server_image_sr.bmp")
+        self.assertGreater(sender.metrics["resumed_bytes"], 0)
+        self.assertEqual(sorted(name for name in os.listdir(".") if name != "image"), ["server_image_sr.bmp"])
+        self.assertEqual({key: self.server.stats[key] for key in ("PUSH", "failed")}, {"PUSH": 1, "failed": 1})
+
+    @mock.patch.object(async_transfer.sender_session, "IDLE_TIMEOUT", 0.3)
+    def test_vanished_client_is_expired_and_served_again(self):
+        """Test that a GET whose client stopped acknowledging is given up, so the same address can GET again."""
+        client_socket = self.client()
+
+        def vanished_then_retried():
+            self.request(client_socket, "GET", "gbn")
+            while not pf.is_announcement(client_socket.recvfrom(65535)[0]):
+                pass
+            client_socket.sendto(pf.ANNOUNCE_REPLY, self.address)  # Then never acknowledges any data
+            time.sleep(0.6)  # The server gives the session up
+            client_socket.settimeout(0.2)
+            with contextlib.suppress(timeout):
+                while True:  # Drop the retransmissions of the abandoned session
+                    client_socket.recvfrom(65535)
+            client_socket.settimeout(5)
+            self.get(client_socket, "gbn", "client_image.bmp")
+
+        self.run_clients(vanished_then_retried)
+        self.assert_received("client_image.bmp")
+        self.assertEqual({key: self.server.stats[key] for key in ("GET", "failed")}, {"GET": 1, "failed": 1})
+
+    @unittest.skipUnless(hasattr(Server.socket_module, "SO_REUSEPORT"), "needs SO_REUSEPORT")
+    def test_supervisor_restarts_workers_and_aggregates_stats(self):
+        """Test that a killed worker process is restarted and the transfers of every worker are counted."""
+        with socket(AF_INET, SOCK_DGRAM) as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        self.address = ('127.0.0.1', port)
+        supervisor = Server.server_supervisor(2, port)
+        results = []
+
+        def wait_for(condition):
+            deadline = time.time() + 10
+            while not condition():
+                self.assertLess(time.time(), deadline, "supervisor did not get there")
+                time.sleep(0.05)
+
+        def workers_alive():
+            return len(supervisor.processes) == 2 and all(p.is_alive() for p in supervisor.processes.values())
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            running = threading.Thread(target=lambda: results.append(supervisor.run()), daemon=True)
+            running.start()
+            wait_for(workers_alive)
+            killed = supervisor.processes[0]
+            killed.kill()
+            wait_for(lambda: supervisor.restarts == 1 and supervisor.processes[0] is not killed and workers_alive())
+            time.sleep(0.5)  # The restarted worker binds its socket before the transfers start
+            self.run_threads(lambda: self.get(self.client(), "gbn", "first.bmp"),
+                             lambda: self.get(self.client(), "sr", "second.bmp"))
+            self.client().sendto(b"END", self.address)
+            running.join(10)
+        self.assertFalse(running.is_alive(), "supervisor did not stop")
+        self.assert_received("first.bmp")
+        self.assert_received("second.bmp")
+        self.assertEqual(supervisor.restarts, 1)
+        self.assertEqual(sum(supervisor.per_worker.values()), 2)
+        self.assertEqual((results[0]["GET"], results[0]["failed"]), (2, 0))
+        self.assertGreater(results[0]["packets_sent"], 0)
+
+    def test_concurrent_pushes_get_their_own_files(self):
+        """Test that two clients pushing at once are demultiplexed into separate sessions and output files."""
+        first, second = self.client(), self.client()
+        # Both requests are queued before either announcement, so both sessions are running at once
+        self.request(first, "PUSH", "gbn")
+        self.request(second, "PUSH", "gbn")
+        self.run_clients(lambda: self.send_file(first, "gbn", send.send()),
+                         lambda: self.send_file(second, "gbn", drop_first([3])))
+        outputs = sorted(name for name in os.listdir(".") if name.startswith("server_image"))
+        self.assertEqual(len(outputs), 2)
+        for name in outputs:
+            self.assert_received(name)
+        self.assertEqual(self.server.stats["PUSH"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from timers import timer_heap
+
+
+class TestTimers(unittest.TestCase):
+
+    def test_expiry_order_and_cancel(self):
+        """Test that expired timers come out earliest first and cancelled ones never fire."""
+        timers = timer_heap()
+        timers.schedule(1, 3.0)
+        timers.schedule(2, 1.0)
+        timers.schedule(3, 2.0)
+        timers.cancel(3)
+        self.assertEqual(timers.next_deadline(), 1.0)
+        self.assertEqual(timers.pop_expired(2.5), [2])
+        self.assertEqual(timers.pop_expired(5.0), [1])
+        self.assertIsNone(timers.next_deadline())
+
+    def test_reschedule_replaces_deadline(self):
+        """Test that restarting a timer discards its old deadline."""
+        timers = timer_heap()
+        timers.schedule(7, 1.0)
+        timers.schedule(7, 4.0)
+        self.assertEqual(timers.pop_expired(2.0), [])
+        self.assertEqual(len(timers), 1)
+        self.assertEqual(timers.pop_expired(4.0), [7])
+
+    def test_heap_stays_small(self):
+        """Test that cancelled entries are compacted away on long transfers."""
+        timers = timer_heap()
+        for seq in range(10000):
+            timers.schedule(seq, float(seq))
+            timers.cancel(seq)
+        self.assertLess(len(timers.heap), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
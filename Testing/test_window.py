@@ -0,0 +1,45 @@
+import unittest
+from window import ring_window
+
+
+class TestRingWindow(unittest.TestCase):
+
+    def test_slide_over_marked_packets(self):
+        """Test that the window slides over consecutive marked packets only."""
+        window = ring_window(4)
+        self.assertTrue(window.mark(1))
+        self.assertEqual(window.slide(), 0)
+        self.assertTrue(window.mark(0))
+        self.assertFalse(window.mark(0))
+        self.assertEqual(window.slide(), 2)
+        self.assertEqual(window.base, 2)
+        self.assertTrue(window.is_marked(1))
+        self.assertFalse(window.is_marked(2))
+
+    def test_slots_are_reused(self):
+        """Test that a slot left by the slide starts clean for the sequence number that reuses it."""
+        window = ring_window(4)
+        for seq in range(4):
+            window.open(seq, float(seq))
+            window.mark(seq)
+        window.retransmit(3, 9.0)
+        window.slide()
+        self.assertIn(5, window)
+        self.assertNotIn(8, window)
+        self.assertFalse(window.is_marked(4))
+        window.open(7, 7.0)
+        self.assertEqual(window.sent_at(7), 7.0)
+        self.assertEqual(window.retransmit_count(7), 0)
+
+    def test_sack_bitmap(self):
+        """Test that bit i of the SACK bitmap stands for packet base + i (cumulative ACK base - 1, plus 1 + i)."""
+        window = ring_window(8, base=10)
+        self.assertEqual(window.sack_bitmap(), 0)
+        window.mark(12)
+        window.mark(17)
+        self.assertEqual(window.sack_bitmap(), (1 << 2) | (1 << 7))
+        self.assertEqual(window.sack_bitmap(bits=4), 1 << 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
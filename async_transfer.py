@@ -0,0 +1,577 @@
+import asyncio
+import time
+import packet_format as pf
+import congestion
+from rtt_estimator import rtt_estimator
+from window import ring_window
+import send
+import receive
+import fec
+
+# Stop-and-Wait, Go-Back-N and Selective Repeat as asyncio state machines. Each session is driven only by
+# datagram_received and loop timers (call_later), so one event loop can run many transfers at once without
+# a thread or a blocking recvfrom per transfer. The wire format is the same as send.py / receive.py, so an
+# async peer can talk to a blocking one.
+
+
+class idle_timer:
+    """
+    Calls expire once nothing was heard for timeout seconds. touch() on every datagram only stores the time;
+    the loop timer is rescheduled when it fires, not per datagram.
+    """
+
+    def __init__(self, loop, timeout, expire):
+        self.loop = loop
+        self.timeout = timeout
+        self.expire = expire
+        self.last_heard = loop.time()
+        self.handle = loop.call_later(timeout, self.check)
+
+    def touch(self):
+        self.last_heard = self.loop.time()
+
+    def check(self):
+        deadline = self.last_heard + self.timeout
+        if self.loop.time() >= deadline:
+            self.handle = None
+            self.expire()
+        else:
+            self.handle = self.loop.call_at(deadline, self.check)
+
+    def cancel(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+
+class sender_session:
+    """
+    Sending side of one transfer: announcing -> data -> finishing -> done.
+    Stop-and-Wait is Go-Back-N with a window of one packet.
+    """
+
+    IDLE_TIMEOUT = receive.receive.IDLE_TIMEOUT  # Seconds without an ACK before the receiver is given up
+
+    def __init__(self, transport, dest, image: str = 'image/OIP.bmp', protocol: str = "gbn", window_size: int = 10,
+                 timeout_interval: float = 0.05, error_type: int = 1, error_rate: float = 0,
+                 checksum_method=None, packet_size: int = None, update_ui_callback=None,
+                 congestion_control: str = None, compression_method=None):
+        self.loop = asyncio.get_running_loop()
+        self.transport = transport
+        self.dest = dest
+        # Packet building, compression, error simulation and ACK parsing
+        self.sender = send.send(checksum_method, compression_method)
+        self.source = self.sender.open_source(image, packet_size, window_size)
+        self.sizer = self.sender.packet_sizer(self.source)  # Live packet size, see send.packet_sizer
+        self.total_packets = self.source.total_packets
+        self.protocol = protocol.lower()
+        self.selective = self.protocol == "sr"
+        self.window_size = 1 if self.protocol == "sw" else window_size
+        self.controller = congestion.make_controller(congestion_control, self.window_size)
+        self.rwnd = self.window_size  # Receiver's advertised window, known from the first ACK
+        self.send_buffer = self.sender.send_buffer(transport.get_extra_info("socket") or transport)
+        self.recovery_seq = 0  # Losses of packets sent before the last decrease (or fast retransmit) are one event
+        self.dup_count = 0  # Go-Back-N: duplicate ACKs of base - 1 in a row
+        self.fast_retransmits = 0
+        self.rtt = rtt_estimator(timeout_interval)  # timeout_interval is only the initial RTO
+        self.send_times = {}  # {seq: first transmission time}, only for packets not retransmitted (Karn)
+        self.last_backoff = 0.0
+        self.error_type = error_type
+        self.error_rate = error_rate
+        self.update_ui_callback = update_ui_callback
+
+        self.state = "announcing"
+        self.hashing = None  # Content hash of the announcement, computed off the event loop
+        self.announcement = None
+        self.closed = False
+        self.control_attempts = 0
+        self.control_timer = None
+        self.idle = None  # Only the data phase; announcing and finishing have their own retry limits
+        self.base = 0
+        self.next_seq = 0
+        self.acked = set()  # Selective Repeat: sequence numbers acknowledged above base
+        self.timers = {}  # Selective Repeat: {seq: TimerHandle}
+        self.highest_acked = -1  # Selective Repeat: highest packet acknowledged, for SACK loss detection
+        self.repaired = set()  # Selective Repeat: unacknowledged packets already retransmitted once
+        self.timer = None  # Go-Back-N: single timer for the oldest unacknowledged packet
+        self.start_time = None
+
+        self.retransmissions = 0
+        self.duplicate_acks = 0
+        self.total_acks_received = 0
+        self.unique_acks_received = set()
+        self.done = self.loop.create_future()
+
+    def start(self):
+        print(f"Sending {self.total_packets} packets using {self.protocol.upper()} (asyncio) "
+              f"with window size {self.window_size}...")
+        self.start_time = time.time()
+        # Hashing the whole file would stall every other session on the loop, so it runs in a worker thread
+        self.hashing = self.loop.run_in_executor(None, self.source.content_hash)
+        self.hashing.add_done_callback(self.hashed)
+
+    def hashed(self, hashing):
+        if self.closed or self.done.done() or hashing.cancelled():
+            return
+        if hashing.exception() is not None:
+            self.fail(hashing.exception())
+            return
+        self.announcement = self.sender.announcement(self.source)  # Built once, repeated as is on retries
+        self.send_control()
+
+    def send_control(self):
+        """Sends (or repeats) the announcement or the end of transfer marker until it is answered."""
+        self.control_timer = None
+        if self.control_attempts >= send.send.CONTROL_RETRIES:
+            if self.state == "announcing":
+                self.fail(TimeoutError("Receiver did not acknowledge the transfer announcement."))
+            else:
+                print("Receiver did not confirm the end of transfer.")
+                self.complete()
+            return
+        if self.state == "announcing":
+            message = self.announcement
+        else:
+            message = pf.FIN
+        self.transport.sendto(message, self.dest)
+        self.control_attempts += 1
+        self.control_timer = self.loop.call_later(send.send.CONTROL_TIMEOUT, self.send_control)
+
+    def datagram_received(self, data, address):
+        if self.done.done():
+            return
+        if self.idle is not None:
+            self.idle.touch()
+        if self.state == "announcing":
+            if data == pf.ANNOUNCE_REPLY or pf.is_resume(data):
+                print(f"Sent total_packets info: {self.total_packets} ({len(self.source)} bytes)")
+                self.sender.resume(self.source, data)
+                self.total_packets = self.source.total_packets  # Fewer if the receiver resumes
+                self.control_timer.cancel()
+                self.state = "data"
+                self.idle = idle_timer(self.loop, self.IDLE_TIMEOUT, self.expire)
+                self.fill_window()
+                self.check_finished()
+        elif self.state == "data":
+            self.handle_ack(data)
+        elif data == pf.FIN_REPLY:
+            self.control_timer.cancel()
+            self.complete()
+
+    def handle_ack(self, data):
+        ack = self.sender.parse_ack(data, self.base)
+        if ack is None:
+            if data != pf.ANNOUNCE_REPLY and not pf.is_resume(data):  # Repeated replies are harmless
+                print("ACK checksum error! Discarding ACK.")
+            return
+        ack_num, sack_bitmap, self.rwnd = ack
+        self.total_acks_received += 1
+        if ack_num in self.unique_acks_received:
+            self.duplicate_acks += 1
+        else:
+            self.unique_acks_received.add(ack_num)
+
+        if self.selective:
+            self.handle_sack(ack_num, sack_bitmap)
+        elif not pf.seq_lt(ack_num, self.base) and ack_num < self.next_seq:
+            self.sample_rtt(ack_num)
+            for seq in range(self.base, ack_num):
+                self.send_times.pop(seq, None)
+            if self.controller is not None:
+                self.controller.on_ack(ack_num + 1 - self.base)
+            self.send_buffer.on_bytes((ack_num + 1 - self.base) * self.source.packet_size, self.rtt.srtt)
+            self.base = ack_num + 1
+            self.dup_count = 0
+            self.cancel_timer()
+            if self.base < self.next_seq:
+                self.timer = self.loop.call_later(self.rtt.timeout, self.gbn_timeout)
+        elif ack_num == self.base - 1 and self.base < self.next_seq:
+            self.dup_count += 1
+            if self.dup_count == self.sender.DUP_THRESHOLD and not pf.seq_lt(self.base, self.recovery_seq):
+                self.fast_retransmit()
+
+        self.fill_window()
+        self.report_progress()
+        self.check_finished()
+
+    def handle_sack(self, cumulative, sack_bitmap):
+        """Selective Repeat: marks everything up to the cumulative ACK plus the SACKed packets."""
+        acked = list(range(self.base, min(cumulative + 1, self.next_seq)))
+        acked.extend(seq for seq in pf.sack_sequences(cumulative, sack_bitmap) if self.base <= seq < self.next_seq)
+        newest = None
+        for seq in acked:
+            if seq in self.acked:
+                continue
+            self.acked.add(seq)
+            self.timers.pop(seq).cancel()
+            self.repaired.discard(seq)
+            newest = seq
+            self.send_buffer.on_bytes(self.source.packet_size, self.rtt.srtt)
+            if self.controller is not None:
+                self.controller.on_ack()
+        for seq in acked:
+            if seq != newest:
+                self.send_times.pop(seq, None)  # One RTT sample per ACK, from the packet that triggered it
+        if newest is not None:
+            self.sample_rtt(newest)
+            self.highest_acked = max(self.highest_acked, newest)
+        while self.base in self.acked:
+            self.acked.discard(self.base)
+            self.base += 1
+
+        # Repair holes right away once DUP_THRESHOLD later packets are known to have arrived
+        if sack_bitmap:
+            for seq in range(self.base, self.highest_acked - self.sender.DUP_THRESHOLD + 1):
+                if seq not in self.acked and seq not in self.repaired:
+                    print(f"SACK shows packet {seq} missing. Retransmitted it.")
+                    self.repaired.add(seq)
+                    self.transmit(seq)
+                    self.retransmissions += 1
+                    self.send_times.pop(seq, None)
+                    self.timers.pop(seq).cancel()
+                    self.timers[seq] = self.loop.call_later(self.rtt.timeout, self.sr_timeout, seq)
+                    if self.controller is not None and seq >= self.recovery_seq:
+                        self.controller.on_loss()
+                        self.recovery_seq = self.next_seq
+
+    def sample_rtt(self, seq):
+        """Called for every ACK of new data; only packets sent once give an RTT sample."""
+        sent = self.send_times.pop(seq, None)
+        if sent is not None:
+            self.rtt.sample(time.time() - sent)
+        self.rtt.on_new_ack()
+
+    def back_off(self):
+        """Doubles the RTO, at most once per RTO so a burst of SR timeouts counts as one."""
+        now = time.time()
+        if now - self.last_backoff >= self.rtt.timeout:
+            self.rtt.on_timeout()
+            self.last_backoff = now
+
+    def transmit(self, seq):
+        self.sender.transmit_from(self.transport, self.dest, self.source, seq, self.error_type, self.error_rate)
+
+    def window(self):
+        """Packets allowed in flight: min(cwnd, rwnd)."""
+        return min(self.controller.window if self.controller is not None else self.window_size, self.rwnd)
+
+    def fill_window(self):
+        while self.next_seq < self.total_packets and self.next_seq < self.base + self.window():
+            self.transmit(self.next_seq)
+            self.send_times[self.next_seq] = time.time()
+            if self.selective:
+                self.timers[self.next_seq] = self.loop.call_later(self.rtt.timeout, self.sr_timeout, self.next_seq)
+            elif self.timer is None:
+                self.timer = self.loop.call_later(self.rtt.timeout, self.gbn_timeout)
+            self.next_seq += 1
+            if self.sizer is not None and self.sizer.on_sent(self.next_seq, self.retransmissions, self.rtt.srtt):
+                self.total_packets = self.source.total_packets
+
+    def go_back(self):
+        """Go-Back-N: retransmits every outstanding packet and restarts the timer."""
+        for seq in range(self.base, self.next_seq):
+            self.transmit(seq)
+        self.retransmissions += self.next_seq - self.base
+        self.send_times.clear()  # Every outstanding packet was retransmitted, none can be sampled
+        self.cancel_timer()
+        self.timer = self.loop.call_later(self.rtt.timeout, self.gbn_timeout)
+
+    def gbn_timeout(self):
+        print(f"Timeout occurred. Retransmitting packets from {self.base} to {self.next_seq - 1}.")
+        self.timer = None
+        self.back_off()
+        self.go_back()
+        if self.controller is not None:
+            self.controller.on_timeout()
+
+    def fast_retransmit(self):
+        """
+        Go-Back-N after DUP_THRESHOLD duplicate ACKs: the receiver discarded everything after the loss, so
+        the window is resent without waiting for the timer. ACKs are still arriving, so the congestion window
+        is halved (fast recovery) rather than reset, and further duplicates are ignored until base passes
+        the packets sent so far.
+        """
+        print(f"{self.dup_count} duplicate ACKs for {self.base - 1}. "
+              f"Fast retransmit of packets {self.base} to {self.next_seq - 1}.")
+        self.go_back()
+        self.fast_retransmits += 1
+        self.recovery_seq = self.next_seq
+        if self.controller is not None:
+            self.controller.on_loss()
+
+    def sr_timeout(self, seq):
+        print(f"Timeout for packet {seq}. Retransmitting.")
+        self.transmit(seq)
+        self.retransmissions += 1
+        self.send_times.pop(seq, None)
+        self.repaired.add(seq)
+        self.back_off()
+        self.timers[seq] = self.loop.call_later(self.rtt.timeout, self.sr_timeout, seq)
+        if self.controller is not None and seq >= self.recovery_seq:
+            self.controller.on_loss()
+            self.recovery_seq = self.next_seq
+
+    def cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def check_finished(self):
+        if self.state == "data" and self.base >= self.total_packets:
+            self.cancel_timer()
+            self.state = "finishing"
+            self.control_attempts = 0
+            self.send_control()
+
+    def report_progress(self):
+        if self.update_ui_callback is not None:
+            self.update_ui_callback(self.base / max(self.total_packets, 1), self.retransmissions,
+                                    self.duplicate_acks)
+
+    def metrics(self):
+        ack_efficiency, retransmissions_overhead = self.sender.compute_metrics(
+            max(self.total_packets, 1), self.retransmissions, self.total_acks_received, self.unique_acks_received)
+        return (self.total_packets, self.retransmissions, self.duplicate_acks, ack_efficiency,
+                retransmissions_overhead)
+
+    def complete(self):
+        self.close()
+        # Trajectory, RTT and packet sizes in self.sender.metrics
+        self.sender.record_metrics(self.controller, self.rtt, self.source, self.sizer)
+        self.sender.metrics["fast_retransmits"] = self.fast_retransmits
+        print(f"Image data sent successfully ({self.protocol.upper()}, asyncio) "
+              f"in {time.time() - self.start_time:.3f}s!")
+        self.done.set_result(self.metrics())
+
+    def fail(self, exception):
+        self.close()
+        self.done.set_exception(exception)
+
+    def expire(self):
+        if not self.done.done():
+            print(f">>> No ACK for {self.IDLE_TIMEOUT} seconds, giving up on the transfer.")
+            self.fail(TimeoutError("Receiver stopped acknowledging."))
+
+    def close(self):
+        """Cancels every pending timer and unmaps the file."""
+        self.cancel_timer()
+        for handle in self.timers.values():
+            handle.cancel()
+        self.timers.clear()
+        if self.control_timer is not None:
+            self.control_timer.cancel()
+        if self.idle is not None:
+            self.idle.cancel()
+        self.closed = True
+        if self.hashing is not None and not self.hashing.done():
+            # The worker thread still reads the mapping; unmap it once the hash is done
+            self.hashing.add_done_callback(lambda hashing: self.source.close())
+        else:
+            self.source.close()
+
+
+class receiver_session:
+    """
+    Receiving side of one transfer: waits for the announcement, places verified payloads directly into
+    the file buffer and ACKs them (cumulatively for Stop-and-Wait and Go-Back-N, per packet for SR).
+    """
+
+    IDLE_TIMEOUT = receive.receive.IDLE_TIMEOUT  # Seconds without a datagram before the sender is given up
+
+    def __init__(self, transport, protocol: str = "gbn", window_size: int = 10, error_type: int = 1,
+                 error_rate: float = 0, checksum_method=None, output_path: str = 'server_image.bmp',
+                 checkpoint_name: str = None):
+        self.loop = asyncio.get_running_loop()
+        self.transport = transport
+        self.receiver = receive.receive(checksum_method)  # ACK building, placement and saving
+        self.checksum = self.receiver.checksum
+        self.selective = protocol.lower() == "sr"
+        self.error_type = error_type
+        self.error_rate = error_rate
+        self.output_path = output_path
+        self.checkpoint_name = checkpoint_name  # Name the transfer was requested under, see receive.open_output
+        self.min_size = pf.DATA_HEADER_SIZE + self.checksum.size
+
+        self.file_buffer = None
+        self.total_packets = 0
+        self.packet_size = 0
+        # GBN only accepts the next expected packet, which is a receive window of one
+        self.window = ring_window(window_size if self.selective else 1)  # window.base: next expected packet
+        self.decoder = fec.fec_decoder()  # FEC repair packets, Selective Repeat only
+        self.received = 0
+        self.delayed_acks = self.receiver.ack_coalescer(1 if protocol.lower() == "sw" else window_size)
+        # Socket buffer tuning and the rwnd in every ACK (self.receiver.ack_packet advertises it)
+        self.flow = self.receiver.receive_window(transport.get_extra_info("socket") or transport,
+                                                 window_size if self.selective else pf.MAX_RWND)
+        self.ack_timer = None
+        self.idle = None
+        self.done = self.loop.create_future()
+
+    def start(self):
+        print(f"Receiver running in {'Selective Repeat' if self.selective else 'GBN'} mode (asyncio)")
+        self.idle = idle_timer(self.loop, self.IDLE_TIMEOUT, self.expire)
+
+    def expire(self):
+        """The sender went away: keeps what arrived for a resumed transfer and ends the session."""
+        if not self.done.done():
+            print(f">>> Nothing received for {self.IDLE_TIMEOUT} seconds, giving up on the transfer.")
+            self.receiver.suspend_checkpoint()
+            self.done.set_exception(TimeoutError("Sender stopped sending."))
+
+    def datagram_received(self, data, address):
+        if self.idle is not None:
+            self.idle.touch()
+        if pf.is_announcement(data):
+            if self.file_buffer is None:
+                self.total_packets, total_bytes, self.packet_size = pf.unpack_announcement(data)
+                # Resumed if interrupted
+                self.file_buffer = self.receiver.open_output(data, self.output_path, self.checkpoint_name)
+                print(f"[Control] Expected total packets to receive: {self.total_packets} "
+                      f"({total_bytes} bytes, first packets of {self.packet_size})")
+            self.transport.sendto(self.receiver.announce_reply, address)  # Also answers repeats whose reply was lost
+            return
+        if self.file_buffer is None:
+            print(">>> Ignoring a packet received before the transfer announcement.")
+            return
+        if data == pf.FIN:
+            self.transport.sendto(pf.FIN_REPLY, address)
+            if not self.done.done():
+                print("Received termination signal.")
+                print(f"Total received data size: {len(self.file_buffer)} bytes "
+                      f"({self.received} of {self.total_packets} packets)")
+                if self.receiver.save_file(self.file_buffer, self.output_path):
+                    self.done.set_result(self.received)
+                else:
+                    self.done.set_exception(ValueError("the received file does not match the sender's content hash"))
+            return
+        if len(data) < self.min_size:
+            print("Incomplete packet received. Ignoring.")
+            return
+        self.handle_data(memoryview(data), address)
+
+    def handle_data(self, packet, address):
+        seq_num, offset, flags = pf.unpack_data_header(packet, self.window.base)
+        data = packet[pf.DATA_HEADER_SIZE:-self.checksum.size]
+        if self.checksum.unpack(packet[-self.checksum.size:]) != self.receiver.data_checksum(packet, data):
+            print(f"Checksum error in packet {seq_num}. Discarding.")
+            if not self.selective and self.window.base > 0:
+                self.ack(address)
+            return
+
+        if flags & pf.FLAG_REPAIR:
+            if self.selective:
+                self.decoder.add(seq_num, offset, data)
+                recovered = self.receiver.place_repairs(self.decoder, seq_num, self.window, self.file_buffer)
+                if recovered:
+                    self.received += len(recovered)
+                    self.window.slide()
+                    self.decoder.forget(self.window.base)
+                    self.ack(address)
+            return
+
+        if self.selective:
+            if pf.seq_lt(seq_num, self.window.base):
+                self.ack(address)  # Already placed, our ACK was lost
+                return
+            if seq_num not in self.window:
+                return  # Beyond the window, the sender will retransmit it
+        elif seq_num != self.window.base:
+            if self.window.base > 0:
+                self.ack(address)
+            return
+
+        data = self.receiver.expand_payload(flags, data, seq_num)
+        if data is None:
+            return
+        in_order = seq_num == self.window.base
+        moved = 0
+        if not self.window.is_marked(seq_num) and self.receiver.place_payload(self.file_buffer, offset, seq_num,
+                                                                              data):
+            self.window.mark(seq_num)
+            self.received += 1
+            first = self.decoder.block_of(seq_num) if self.decoder.blocks else None
+            if first is not None:
+                self.received += len(self.receiver.place_repairs(self.decoder, first, self.window, self.file_buffer))
+            moved = self.window.slide()
+            self.decoder.forget(self.window.base)
+            self.flow.on_packet(len(packet), self.window.base)
+        # In-order packets may wait to be acknowledged together; gaps and repairs are reported at once
+        if not in_order or moved > 1 or (self.selective and self.window.sack_bitmap()):
+            self.ack(address)
+        elif self.delayed_acks.add():
+            self.ack(address)
+        elif self.ack_timer is None:
+            self.ack_timer = self.loop.call_later(self.delayed_acks.delay, self.ack, address)
+
+    def ack(self, address):
+        """Sends the cumulative ACK (with the SACK bitmap for SR) now."""
+        self.delayed_acks.clear()
+        if self.ack_timer is not None:
+            self.ack_timer.cancel()
+            self.ack_timer = None
+        sack_bitmap = self.window.sack_bitmap() if self.selective else 0
+        self.receiver.ack_packet(self.window.base - 1, self.transport, address, self.error_type, self.error_rate,
+                                 sack_bitmap)
+
+    def close(self):
+        if self.ack_timer is not None:
+            self.ack_timer.cancel()
+        if self.idle is not None:
+            self.idle.cancel()
+        if not self.done.done():
+            self.receiver.suspend_checkpoint()  # Keep what arrived for a resumed transfer
+
+
+class transfer_protocol(asyncio.DatagramProtocol):
+    """Hands every datagram of an endpoint to the session created for it."""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.session = None
+
+    def connection_made(self, transport):
+        self.session = self.session_factory(transport)
+        self.session.start()
+
+    def datagram_received(self, data, address):
+        self.session.datagram_received(data, address)
+
+    def error_received(self, exc):
+        print(f"Socket error during transfer: {exc}")
+
+
+async def transfer(role: str, sock=None, dest=None, local_addr=None, **options):
+    """
+    Runs one transfer on the current event loop and returns when it is over.
+    role is "send" (options as in sender_session, dest required) or "receive" (options as in
+    receiver_session). sock is an existing UDP socket to transfer on, e.g. the Client socket that sent the
+    PUSH/GET request; it is left open and in its original blocking mode afterwards. Without sock a new
+    socket is bound to local_addr.
+    Senders return (total packets, retransmissions, duplicate ACKs, ACK efficiency, retransmission overhead),
+    receivers the number of packets received.
+    """
+    loop = asyncio.get_running_loop()
+    if role == "send":
+        def factory(transport):
+            return sender_session(transport, dest, **options)
+    elif role == "receive":
+        def factory(transport):
+            return receiver_session(transport, **options)
+    else:
+        raise ValueError(f"Unknown transfer role {role!r}, expected 'send' or 'receive'.")
+
+    if sock is not None:
+        # asyncio closes the socket it is given, so it gets a duplicate bound to the same address
+        original_timeout = sock.gettimeout()
+        transport, protocol = await loop.create_datagram_endpoint(lambda: transfer_protocol(factory),
+                                                                  sock=sock.dup())
+    else:
+        transport, protocol = await loop.create_datagram_endpoint(lambda: transfer_protocol(factory),
+                                                                  local_addr=local_addr or ('0.0.0.0', 0))
+    try:
+        return await protocol.session.done
+    finally:
+        protocol.session.close()
+        transport.close()
+        if sock is not None:
+            sock.settimeout(original_timeout)  # The duplicate shares the non-blocking flag with sock
@@ -0,0 +1,337 @@
+import ctypes
+import errno
+import os
+import select
+import socket
+import struct
+import sys
+import time
+
+# Batched datagram I/O for Linux. A burst of packets leaves in one system call, either as one UDP GSO
+# (generic segmentation offload) super-datagram that the kernel cuts into equal segments, or as a sendmmsg
+# call with one message per packet. Received datagrams are drained with recvmmsg, many per call, and handed
+# out as views of the slots they were received into.
+# Everywhere else (Windows, macOS, asyncio transports, old kernels) the same objects fall back to one
+# sendto/recvfrom per packet, so callers never need to check what is available.
+
+SOL_UDP = getattr(socket, "SOL_UDP", 17)
+UDP_SEGMENT = getattr(socket, "UDP_SEGMENT", 103)  # Linux 4.18+
+MSG_WAITFORONE = getattr(socket, "MSG_WAITFORONE", 0x10000)  # recvmmsg: return once one datagram is in
+GSO_MAX_SEGMENTS = 64  # Kernel limit on segments per GSO send
+GSO_MAX_BYTES = 65000  # A GSO send is still one UDP datagram before segmentation, so under 64 KiB
+SOCKADDR_SIZE = 128  # sizeof(struct sockaddr_storage)
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(iovec)), ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", msghdr), ("msg_len", ctypes.c_uint)]
+
+
+# msg_namelen and msg_len of one mmsghdr, padded to its full size so a whole array can be iter_unpack'ed
+MESSAGE_LENGTHS = struct.Struct(
+    f"={msghdr.msg_namelen.offset}xI{mmsghdr.msg_len.offset - msghdr.msg_namelen.offset - 4}xI"
+    f"{ctypes.sizeof(mmsghdr) - mmsghdr.msg_len.offset - 4}x")
+
+
+def load_libc():
+    """The C library with sendmmsg/recvmmsg, or None where they do not exist."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int,
+                                  ctypes.c_void_p]
+    except (OSError, AttributeError):
+        return None
+    libc.sendmmsg.restype = ctypes.c_int
+    libc.recvmmsg.restype = ctypes.c_int
+    return libc
+
+
+libc = load_libc()
+
+
+def has_fd(port):
+    """True for real sockets; asyncio transports and test doubles only have sendto."""
+    return isinstance(port, socket.socket) and port.fileno() >= 0
+
+
+def encode_address(address, family):
+    """struct sockaddr_in / sockaddr_in6 bytes for an (host, port) address; host names are resolved once."""
+    host, port = address[:2]
+    try:
+        packed = socket.inet_pton(family, host)
+    except OSError:
+        address = socket.getaddrinfo(host, port, family, socket.SOCK_DGRAM)[0][4]
+        host = address[0]
+        packed = socket.inet_pton(family, host)
+    if family == socket.AF_INET:
+        return struct.pack("=H", family) + struct.pack("!H4s", port, packed) + bytes(8)
+    flowinfo, scope_id = (address[2], address[3]) if len(address) == 4 else (0, 0)
+    return struct.pack("=H", family) + struct.pack("!HI16s", port, flowinfo, packed) + struct.pack("=I", scope_id)
+
+
+def decode_address(name):
+    """The (host, port) tuple Python's recvfrom would return for sockaddr bytes."""
+    family = struct.unpack_from("=H", name)[0]
+    if family == socket.AF_INET:
+        return socket.inet_ntop(family, name[4:8]), struct.unpack_from("!H", name, 2)[0]
+    port, flowinfo = struct.unpack_from("!HI", name, 2)
+    return socket.inet_ntop(family, name[8:24]), port, flowinfo, struct.unpack_from("=I", name, 24)[0]
+
+
+def raise_errno():
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err))
+
+
+class batch_sender:
+    """
+    Collects packets (as lists of buffers, e.g. header + zero-copy payload + trailer) into preallocated
+    slots and sends them together on flush(). mode is "auto" (GSO, else sendmmsg, else per packet),
+    "gso", "mmsg" or "plain". Full batches are flushed automatically, as are packets for another address.
+    """
+
+    def __init__(self, port, slot_size: int = 4100, capacity: int = 64, mode: str = "auto"):
+        self.port = port
+        self.slot_size = slot_size
+        self.capacity = capacity
+        self.buffer = bytearray(slot_size * capacity)
+        self.view = memoryview(self.buffer)
+        self.lengths = []
+        self.dest = None
+        self.addresses = {}  # {dest: sockaddr bytes}, for sendmmsg
+        self.syscalls = 0
+        self.packets = 0
+
+        batched = has_fd(port)
+        self.use_gso = batched and mode in ("auto", "gso") and sys.platform.startswith("linux")
+        self.use_mmsg = batched and mode in ("auto", "mmsg", "gso") and libc is not None
+        if self.use_mmsg:
+            # One iovec per slot, pointing into self.buffer, and one message per iovec
+            base = ctypes.addressof(ctypes.c_char.from_buffer(self.buffer))
+            self.iovecs = (iovec * capacity)()
+            self.messages = (mmsghdr * capacity)()
+            for i in range(capacity):
+                self.iovecs[i].iov_base = base + i * slot_size
+                self.messages[i].msg_hdr.msg_iov = ctypes.pointer(self.iovecs[i])
+                self.messages[i].msg_hdr.msg_iovlen = 1
+
+    @property
+    def mode(self):
+        return "gso" if self.use_gso else "mmsg" if self.use_mmsg else "plain"
+
+    def add(self, dest, *parts):
+        """Queues one packet made of parts (bytes-like objects) for dest."""
+        if self.lengths and dest != self.dest:
+            self.flush()
+        self.dest = dest
+        length = sum(len(part) for part in parts)
+        if length > self.slot_size:
+            self.flush()
+            self.send_plain_one(b"".join(parts), dest)
+            return
+        offset = len(self.lengths) * self.slot_size
+        for part in parts:
+            self.view[offset:offset + len(part)] = part
+            offset += len(part)
+        self.lengths.append(length)
+        if len(self.lengths) == self.capacity:
+            self.flush()
+
+    def flush(self):
+        """Sends every queued packet. Returns the number of packets sent."""
+        count = len(self.lengths)
+        if not count:
+            return 0
+        try:
+            start = 0
+            if self.use_gso and count > 1:
+                start = self.send_gso()
+            if start < count and self.use_mmsg:
+                start = self.send_mmsg(start)
+            for i in range(start, count):
+                self.send_plain_one(self.slot(i), self.dest)
+        finally:
+            self.packets += count
+            self.lengths.clear()
+        return count
+
+    def slot(self, i):
+        return self.view[i * self.slot_size:i * self.slot_size + self.lengths[i]]
+
+    def send_plain_one(self, packet, dest):
+        self.port.sendto(packet, dest)
+        self.syscalls += 1
+
+    def send_gso(self):
+        """
+        Sends runs of equal-sized packets (the last one may be shorter) as GSO super-datagrams.
+        Returns the index of the first packet left for the other methods.
+        """
+        lengths = self.lengths
+        segment = lengths[0]
+        per_send = max(1, min(GSO_MAX_SEGMENTS, GSO_MAX_BYTES // segment))
+        i = 0
+        while i < len(lengths) and lengths[i] == segment:
+            end = i + 1
+            while end < len(lengths) and end - i < per_send and lengths[end - 1] == segment and lengths[end] <= segment:
+                end += 1
+            if end - i < 2:
+                break
+            try:
+                self.port.sendmsg([self.slot(j) for j in range(i, end)],
+                                  [(SOL_UDP, UDP_SEGMENT, struct.pack("=H", segment))], 0, self.dest)
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.EIO, errno.ENOPROTOOPT, errno.EOPNOTSUPP):
+                    raise
+                print(f"UDP GSO unavailable ({e}), falling back to sendmmsg.")
+                self.use_gso = False
+                return i
+            self.syscalls += 1
+            i = end
+        return i
+
+    def send_mmsg(self, start):
+        """Sends packets from start on with sendmmsg. Returns the index of the first packet not sent."""
+        name = self.addresses.get(self.dest)
+        if name is None:
+            name = ctypes.create_string_buffer(encode_address(self.dest, self.port.family))
+            self.addresses[self.dest] = name
+        for i in range(start, len(self.lengths)):
+            self.iovecs[i].iov_len = self.lengths[i]
+            header = self.messages[i].msg_hdr
+            header.msg_name = ctypes.addressof(name)
+            header.msg_namelen = len(name.raw)
+        i = start
+        while i < len(self.lengths):
+            first = ctypes.cast(ctypes.addressof(self.messages) + i * ctypes.sizeof(mmsghdr), ctypes.POINTER(mmsghdr))
+            sent = libc.sendmmsg(self.port.fileno(), first, len(self.lengths) - i, 0)
+            self.syscalls += 1
+            if sent < 0:
+                if ctypes.get_errno() in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    # A socket with a timeout is non-blocking underneath: let sendto wait for buffer space
+                    self.send_plain_one(self.slot(i), self.dest)
+                    i += 1
+                    continue
+                raise_errno()
+            i += sent
+        return i
+
+
+class batch_receiver:
+    """
+    Drains up to capacity datagrams per recvmmsg call and hands them out one at a time, as views of the
+    slots they were received into (recvfrom) or copied like socket.recvfrom_into. When nothing is queued,
+    recvmmsg waits for the first datagram, for at most the socket timeout.
+    """
+
+    def __init__(self, port, slot_size: int = 65535, capacity: int = 32, mode: str = "auto"):
+        self.port = port
+        self.slot_size = slot_size
+        self.capacity = capacity
+        self.use_mmsg = mode in ("auto", "mmsg") and libc is not None and has_fd(port)
+        self.next = 0
+        self.count = 0
+        self.names = {}  # {sockaddr bytes: address tuple}
+        self.syscalls = 0
+        self.packets = 0
+        self.buffer = bytearray(slot_size * capacity if self.use_mmsg else slot_size)
+        self.view = memoryview(self.buffer)
+        if self.use_mmsg:
+            self.poller = select.poll()  # Sockets with a timeout are non-blocking underneath, see fill()
+            self.poller.register(port, select.POLLIN)
+            self.name_buffer = ctypes.create_string_buffer(SOCKADDR_SIZE * capacity)
+            base = ctypes.addressof(ctypes.c_char.from_buffer(self.buffer))
+            self.iovecs = (iovec * capacity)()
+            self.messages = (mmsghdr * capacity)()
+            for i in range(capacity):
+                self.iovecs[i].iov_base = base + i * slot_size
+                self.iovecs[i].iov_len = slot_size
+                header = self.messages[i].msg_hdr
+                header.msg_iov = ctypes.pointer(self.iovecs[i])
+                header.msg_iovlen = 1
+                header.msg_name = ctypes.addressof(self.name_buffer) + i * SOCKADDR_SIZE
+                header.msg_namelen = SOCKADDR_SIZE
+            self.name_view = memoryview(self.name_buffer).cast("B")
+            self.message_view = memoryview(self.messages).cast("B")
+
+    @property
+    def mode(self):
+        return "mmsg" if self.use_mmsg else "plain"
+
+    @property
+    def pending(self):
+        """Datagrams already taken from the kernel but not handed out yet."""
+        return self.count - self.next
+
+    def recvfrom(self):
+        """
+        Returns (datagram, address) like socket.recvfrom, but the datagram is a view of a reused slot: it is
+        only valid until the next call. Raises socket.timeout like the socket would.
+        """
+        if not self.use_mmsg:
+            self.syscalls += 1
+            nbytes, address = self.port.recvfrom_into(self.buffer)
+            self.packets += 1
+            return self.view[:nbytes], address
+        if self.next >= self.count:
+            self.fill()
+        self.packets += 1
+        i = self.next
+        self.next = i + 1
+        namelen, nbytes = self.received[i]
+        start = i * self.slot_size
+        name = self.name_view[i * SOCKADDR_SIZE:i * SOCKADDR_SIZE + namelen].tobytes()
+        address = self.names.get(name)
+        if address is None:
+            address = self.names[name] = decode_address(name)
+        return self.view[start:start + nbytes], address
+
+    def recvfrom_into(self, buffer):
+        """Returns (nbytes, address) like socket.recvfrom_into, for callers that keep the datagram."""
+        datagram, address = self.recvfrom()
+        buffer[:len(datagram)] = datagram
+        return len(datagram), address
+
+    def fill(self):
+        """
+        Takes every waiting datagram with one recvmmsg, first waiting up to the socket timeout for one to
+        arrive. A socket with a timeout is non-blocking underneath (recvmmsg's own timeout is only checked
+        between datagrams), so like socket.recvfrom it polls the socket and retries when the call would block.
+        """
+        for i in range(self.count):
+            self.messages[i].msg_hdr.msg_namelen = SOCKADDR_SIZE  # The kernel shortened the ones it used
+        self.count = self.next = 0
+        timeout = self.port.gettimeout()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.syscalls += 1
+            count = libc.recvmmsg(self.port.fileno(), self.messages, self.capacity, MSG_WAITFORONE, None)
+            if count >= 0:
+                break
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err not in (errno.EAGAIN, errno.EWOULDBLOCK) or timeout == 0:
+                raise_errno()
+            if deadline is None:
+                self.poller.poll()
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.poller.poll(remaining * 1000):
+                    raise socket.timeout("timed out")
+        # (address length, datagram length) of every message, read straight from the mmsghdr array
+        self.received = list(MESSAGE_LENGTHS.iter_unpack(self.message_view[:count * MESSAGE_LENGTHS.size]))
+        self.count = count
@@ -0,0 +1,224 @@
+import glob
+import hashlib
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+import packet_format as pf
+
+# Resumable transfers. The receiver writes the file straight into a partial file on disk through a shared
+# memory map, so every placed payload is in the page cache at once and survives the process being killed.
+# At most every SAVE_INTERVAL seconds it also saves a bitmap of the CHUNK_SIZE chunks it holds completely.
+# Both files sit next to the output file, named after the file name the transfer was requested under and the
+# transfer ID and content hash of the announcement, so a retry resumes even when the server had to give it
+# another output name (see Server.output_path). A checkpoint still open in this process is never opened
+# twice: a concurrent receiver of the same file gets one named after its own output instead.
+# When the same transfer is announced again, the receiver answers with the bitmap (pf.pack_resume) and the
+# sender only cuts packets from the missing chunks. The partial file becomes the output once the transfer
+# completes.
+
+CHUNK_SIZE = 1 << 16
+SAVE_INTERVAL = 1.0  # Seconds between bitmap saves while chunks are being completed
+STATE_MAGIC = b"RCKP"
+STATE_FORMAT = "!4sQ16sQI"  # Magic, transfer ID, content hash, file size, chunk size; the bitmap follows
+STATE_SIZE = struct.calcsize(STATE_FORMAT)
+
+open_parts = set()  # Partial files of the checkpoints open in this process
+
+
+def transfer_id(path):
+    """ID of a transfer: which file is sent (its name); the content hash tells which version of it."""
+    return int.from_bytes(hashlib.blake2b(os.path.basename(path).encode(), digest_size=8).digest(), "big")
+
+
+def chunk_count(total_bytes, chunk_size: int = CHUNK_SIZE):
+    return -(-total_bytes // chunk_size)
+
+
+def is_held(bitmap, chunk):
+    return bitmap[chunk >> 3] >> (chunk & 7) & 1
+
+
+def missing_ranges(reply, total_bytes):
+    """
+    Byte ranges [(start, end), ...] a resume reply says the receiver is missing, merged where they touch.
+    Raises ValueError if the reply does not describe a file of total_bytes.
+    """
+    chunk_size, chunks, compressed = pf.unpack_resume(reply)
+    if chunk_size == 0 or chunks != chunk_count(total_bytes, chunk_size):
+        raise ValueError(f"resume bitmap of {chunks} chunks does not fit a file of {total_bytes} bytes")
+    try:
+        bitmap = zlib.decompressobj().decompress(compressed, (chunks + 7) // 8)
+    except zlib.error as e:
+        raise ValueError(str(e))
+    if len(bitmap) < (chunks + 7) // 8:
+        raise ValueError("resume bitmap is truncated")
+
+    ranges = []
+    for chunk in range(chunks):
+        if is_held(bitmap, chunk):
+            continue
+        start = chunk * chunk_size
+        end = min(start + chunk_size, total_bytes)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+class receive_checkpoint:
+    """
+    Partial file and chunk bitmap of one transfer. Payloads are placed into buffer (the memory-mapped
+    partial file); add() counts the bytes placed in each chunk, and a chunk is held once all of them are.
+    Packets may straddle chunks, but each byte is placed once, so a count never exceeds its chunk.
+    """
+
+    def __init__(self, output_path, total_bytes, transfer_id, content_hash, chunk_size: int = CHUNK_SIZE,
+                 name: str = None):
+        self.output_path = output_path
+        self.total_bytes = total_bytes
+        self.transfer_id = transfer_id
+        self.content_hash = content_hash
+        self.chunk_size = chunk_size
+        self.chunks = chunk_count(total_bytes, chunk_size)
+        directory = os.path.dirname(os.path.abspath(output_path))  # Same file system, so the rename is atomic
+        for name in dict.fromkeys((name or os.path.basename(output_path), os.path.basename(output_path))):
+            self.prefix = os.path.join(directory, f".{name}.{transfer_id:016x}-")
+            self.part_path = f"{self.prefix}{content_hash.hex()}.part"
+            if self.part_path not in open_parts:
+                break
+            print(f"The checkpoint {self.part_path} is in use by another transfer.")
+        self.state_path = f"{self.prefix}{content_hash.hex()}.resume"
+        self.remove_stale()
+
+        self.held = self.load()
+        self.counts = array('I', [0]) * self.chunks  # Bytes placed in each chunk
+        self.held_bytes = 0
+        for chunk in range(self.chunks):
+            if is_held(self.held, chunk):
+                self.counts[chunk] = self.chunk_length(chunk)
+                self.held_bytes += self.counts[chunk]
+        self.resumed_bytes = self.held_bytes
+
+        self.file = open(self.part_path, 'r+b' if self.resumed_bytes else 'w+b')
+        self.file.truncate(total_bytes)
+        # mmap cannot map an empty file
+        self.buffer = mmap.mmap(self.file.fileno(), total_bytes) if total_bytes else bytearray()
+        self.last_save = time.time()
+        open_parts.add(self.part_path)
+
+    def chunk_length(self, chunk):
+        return min(self.chunk_size, self.total_bytes - chunk * self.chunk_size)
+
+    def remove_stale(self):
+        """
+        Deletes checkpoints of the same name and transfer ID with another content hash: the file changed
+        since. Checkpoints of other names, or open in another transfer, belong to other receivers.
+        """
+        for path in glob.glob(glob.escape(self.prefix) + "*"):
+            version = path[len(self.prefix):].split(".", 1)[0]
+            if path not in (self.part_path, self.state_path) and f"{self.prefix}{version}.part" not in open_parts:
+                print(f"Removing the checkpoint of an older version of the file: {path}")
+                os.remove(path)
+
+    def load(self):
+        """Bitmap of the chunks an earlier attempt saved, or an empty one if there is no usable checkpoint."""
+        empty = bytearray((self.chunks + 7) // 8)
+        try:
+            with open(self.state_path, 'rb') as f:
+                state = f.read()
+            part_size = os.path.getsize(self.part_path)
+        except OSError:
+            return empty
+        expected = struct.pack(STATE_FORMAT, STATE_MAGIC, self.transfer_id, self.content_hash, self.total_bytes,
+                               self.chunk_size)
+        if state[:STATE_SIZE] != expected or len(state) != STATE_SIZE + len(empty) or part_size != self.total_bytes:
+            print(f"Ignoring the unusable checkpoint {self.state_path}.")
+            return empty
+        return bytearray(state[STATE_SIZE:])
+
+    def add(self, offset, length):
+        """Counts length bytes placed at offset, and saves the bitmap if chunks were completed a while ago."""
+        end = offset + length
+        completed = False
+        while offset < end:
+            chunk = offset // self.chunk_size
+            step = min(end, (chunk + 1) * self.chunk_size) - offset
+            if not is_held(self.held, chunk):
+                self.counts[chunk] += step
+                if self.counts[chunk] >= self.chunk_length(chunk):
+                    self.held[chunk >> 3] |= 1 << (chunk & 7)
+                    self.held_bytes += self.chunk_length(chunk)
+                    completed = True
+            offset += step
+        if completed and time.time() - self.last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def reply(self):
+        """Answer to the announcement: ANNOUNCE_REPLY for a fresh transfer, or the bitmap of a resumed one."""
+        if not self.held_bytes:
+            return pf.ANNOUNCE_REPLY
+        compressed = zlib.compress(bytes(self.held), 9)
+        if pf.RESUME_SIZE + len(compressed) > pf.MAX_CONTROL_SIZE:
+            print("The checkpoint bitmap does not fit in a datagram, receiving the whole file again.")
+            return pf.ANNOUNCE_REPLY  # Chunks sent again are simply placed again
+        return pf.pack_resume(self.chunk_size, self.chunks, compressed)
+
+    def save(self):
+        """Writes the bitmap, once the payloads it covers have reached the partial file."""
+        if self.total_bytes:
+            self.buffer.flush()
+        temporary = self.state_path + ".tmp"
+        with open(temporary, 'wb') as f:
+            f.write(struct.pack(STATE_FORMAT, STATE_MAGIC, self.transfer_id, self.content_hash, self.total_bytes,
+                                self.chunk_size))
+            f.write(self.held)
+        os.replace(temporary, self.state_path)  # A crash leaves the old bitmap or the new one, never half of one
+        self.last_save = time.time()
+
+    def complete(self, output_path=None):
+        """
+        Makes the partial file the output file and deletes the checkpoint. A resumed file is first checked
+        against the content hash: if it does not match, the output is left untouched, the checkpoint is
+        discarded so the next attempt starts over, and False is returned.
+        """
+        if self.resumed_bytes:
+            digest = hashlib.blake2b(digest_size=16)
+            for start in range(0, self.total_bytes, 1 << 20):
+                digest.update(self.buffer[start:start + (1 << 20)])
+            if digest.digest() != self.content_hash:
+                print(">>> The resumed file does not match the sender's content hash, discarding the checkpoint!")
+                self.discard()
+                return False
+        self.close()
+        os.replace(self.part_path, output_path or self.output_path)
+        self.remove(self.state_path)  # Nothing may have been saved yet
+        return True
+
+    def discard(self):
+        """Deletes the partial file and the bitmap."""
+        self.close()
+        self.remove(self.part_path)
+        self.remove(self.state_path)
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def suspend(self):
+        """Saves the bitmap of an interrupted transfer, keeping the partial file for the next attempt."""
+        self.save()
+        self.close()
+        print(f"Transfer interrupted: {self.held_bytes} of {self.total_bytes} bytes kept in {self.part_path}.")
+
+    def close(self):
+        if self.total_bytes:
+            self.buffer.close()
+        self.file.close()
+        open_parts.discard(self.part_path)
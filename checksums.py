@@ -1,6 +1,13 @@
-# Configuration value to select checksum method
-# 0 for XOR checksum, 1 for CRC-16
-CHECKSUM_METHOD = 0
+import struct
+import zlib
+import binascii
+import numpy as np
+
+# Name of the default checksum method (see CHECKSUM_ENGINES for the options).
+# The legacy integer values are still accepted: 0 for XOR checksum, 1 for CRC-16
+CHECKSUM_METHOD = "xor"
+LEGACY_METHODS = {0: "xor", 1: "crc16"}
+
 
 def compute_xor_checksum(data):
     """Calculate a 16-bit XOR checksum."""
@@ -10,8 +17,9 @@ def compute_xor_checksum(data):
         checksum &= 0xFFFF  # Ensure that the checksum stays within 16 bits
     return checksum
 
-def compute_crc16(data):
-    """Calculate a 16-bit CRC using the polynomial 0x8005."""
+
+def compute_crc16_bitwise(data):
+    """Calculate a 16-bit CRC using the polynomial 0x8005, one bit at a time (reference version)."""
     crc = 0xFFFF
     polynomial = 0x8005
     for byte in data:
@@ -24,10 +32,168 @@ def compute_crc16(data):
             crc &= 0xFFFF  # Ensure that the CRC stays within 16 bits
     return crc
 
-def compute_checksum(data):
-    if CHECKSUM_METHOD == 0:
-        return compute_xor_checksum(data)
-    elif CHECKSUM_METHOD == 1:
-        return compute_crc16(data)
+
+def make_crc16_tables(polynomial=0x8005):
+    """Build the two 256-entry lookup tables used by the slicing-by-2 CRC-16."""
+    table = []
+    for index in range(256):
+        crc = index << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ polynomial
+            else:
+                crc <<= 1
+            crc &= 0xFFFF
+        table.append(crc)
+    # table2[x] is the CRC contribution of byte x followed by one more zero byte
+    table2 = [((entry & 0xFF) << 8) ^ table[entry >> 8] for entry in table]
+    return table, table2
+
+
+CRC16_TABLE, CRC16_TABLE2 = make_crc16_tables()
+
+
+def compute_crc16(data):
+    """Calculate a 16-bit CRC using the polynomial 0x8005 (table driven, two bytes per step)."""
+    crc = 0xFFFF
+    table = CRC16_TABLE
+    table2 = CRC16_TABLE2
+    length = len(data)
+    # Slicing-by-2: fold a pair of bytes into the CRC with two table lookups
+    for high, low in zip(data[0:length - 1:2], data[1::2]):
+        crc = table2[(crc >> 8) ^ high] ^ table[(crc & 0xFF) ^ low]
+    if length % 2:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ data[-1]]
+    return crc
+
+
+def compute_crc16_ccitt(data):
+    """Calculate a 16-bit CRC-CCITT (polynomial 0x1021) using the C implementation in binascii."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def compute_crc32(data):
+    """Calculate a 32-bit CRC using the C implementation in zlib."""
+    return zlib.crc32(data) & 0xFFFFFFFF
+
+
+def compute_adler32(data):
+    """Calculate an Adler-32 checksum using the C implementation in zlib."""
+    return zlib.adler32(data) & 0xFFFFFFFF
+
+
+def compute_internet_checksum(data):
+    """Calculate the 16-bit one's-complement sum of 16-bit words (RFC 1071)."""
+    if len(data) % 2:
+        data = bytes(data) + b"\x00"
+    return int(compute_internet_checksum_batch(data, max(len(data), 2))[0])
+
+
+def as_packet_matrix(data, packet_size, dtype=np.uint8):
+    """View a payload buffer as a 2-D array (packets x bytes), zero padding the last packet."""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    total_packets = len(buffer) // packet_size + (1 if len(buffer) % packet_size else 0)
+    full_packets = len(buffer) // packet_size
+    if full_packets == total_packets:
+        matrix = buffer.reshape(total_packets, packet_size)
     else:
-        raise ValueError("Invalid checksum method selected.")
\ No newline at end of file
+        # Only the last packet needs to be copied to pad it to packet_size
+        matrix = np.zeros((total_packets, packet_size), dtype=np.uint8)
+        matrix[:full_packets] = buffer[:full_packets * packet_size].reshape(full_packets, packet_size)
+        matrix[full_packets, :len(buffer) - full_packets * packet_size] = buffer[full_packets * packet_size:]
+    return matrix.view(dtype)
+
+
+def compute_xor_checksum_batch(data, packet_size):
+    """XOR checksum of every packet_size chunk of data, computed with one array reduction."""
+    matrix = as_packet_matrix(data, packet_size)
+    return np.bitwise_xor.reduce(matrix, axis=1).astype(np.uint32)
+
+
+def compute_internet_checksum_batch(data, packet_size):
+    """One's-complement checksum of every packet_size chunk of data, computed with one array reduction."""
+    if packet_size % 2:
+        # Packets do not start on a 16-bit boundary, so each one is padded on its own
+        view = memoryview(data)
+        return np.array([compute_internet_checksum(bytes(view[start:start + packet_size]))
+                         for start in range(0, len(view), packet_size)], dtype=np.uint32)
+    if len(data) % 2:
+        data = bytes(data) + b"\x00"
+    if len(data) == 0:
+        return np.full(1, 0xFFFF, dtype=np.uint32)
+    words = as_packet_matrix(data, packet_size, dtype=">u2")
+    sums = words.sum(axis=1, dtype=np.uint64)
+    # Fold the carries back into the low 16 bits until none are left
+    while (sums >> 16).any():
+        sums = (sums & 0xFFFF) + (sums >> 16)
+    return (~sums & 0xFFFF).astype(np.uint32)
+
+
+class checksum_engine:
+    """A named checksum function together with the size of the trailer it needs on the wire."""
+
+    def __init__(self, name, function, size=2, batch_function=None):
+        if size not in (2, 4):
+            raise ValueError("Checksum trailer size must be 2 or 4 bytes.")
+        self.name = name
+        self.function = function
+        self.batch_function = batch_function
+        self.size = size
+        self.format = "!H" if size == 2 else "!I"
+
+    def compute(self, data):
+        return self.function(data)
+
+    def compute_batch(self, data, packet_size):
+        """Return an array with the checksum of every packet_size chunk of data."""
+        if self.batch_function is not None:
+            return self.batch_function(data, packet_size)
+        # No vectorized version, fall back to one call per packet on zero-copy slices
+        view = memoryview(data)
+        return np.array([self.function(view[start:start + packet_size])
+                         for start in range(0, len(view), packet_size)], dtype=np.uint32)
+
+    def pack(self, value):
+        return struct.pack(self.format, value)
+
+    def unpack(self, trailer):
+        return struct.unpack(self.format, trailer)[0]
+
+
+CHECKSUM_ENGINES = {}
+
+
+def register_checksum(name, function, size=2, batch_function=None):
+    """Register a checksum function under a name so it can be selected per transfer."""
+    CHECKSUM_ENGINES[name] = checksum_engine(name, function, size, batch_function)
+    return CHECKSUM_ENGINES[name]
+
+
+register_checksum("xor", compute_xor_checksum, batch_function=compute_xor_checksum_batch)
+register_checksum("inet16", compute_internet_checksum, batch_function=compute_internet_checksum_batch)
+register_checksum("crc16", compute_crc16)
+register_checksum("crc16-ccitt", compute_crc16_ccitt)
+register_checksum("crc32", compute_crc32, size=4)
+register_checksum("adler32", compute_adler32, size=4)
+
+
+def get_engine(method=None):
+    """Look up a checksum engine by name (defaults to CHECKSUM_METHOD)."""
+    if method is None:
+        method = CHECKSUM_METHOD
+    if isinstance(method, checksum_engine):
+        return method
+    method = LEGACY_METHODS.get(method, method)
+    try:
+        return CHECKSUM_ENGINES[str(method).lower()]
+    except KeyError:
+        raise ValueError(f"Invalid checksum method selected: {method}")
+
+
+def compute_checksum(data, method=None):
+    return get_engine(method).compute(data)
+
+
+def compute_checksums(data, packet_size, method=None):
+    """Checksum every packet of a transfer in one pass; returns an array indexed by sequence number."""
+    return get_engine(method).compute_batch(data, packet_size)
@@ -0,0 +1,201 @@
+import bz2
+import time
+import zlib
+import packet_format as pf
+
+try:
+    import lzma  # Optional: Python can be built without it
+except ImportError:
+    lzma = None
+
+# Payload compression, chosen per transfer. Every packet's payload is compressed on its own, so each
+# packet can still be verified, decompressed and placed at its offset without the others (and lost,
+# retransmitted or rebuilt by FEC on its own). The codec's code travels in the data header flags, so a
+# receiver decompresses whatever arrives without being configured, and a packet that does not shrink
+# simply goes out uncompressed.
+
+# Name of the default compression method (see CODECS); None sends payloads as they are
+COMPRESSION_METHOD = None
+MAX_PAYLOAD = 1 << 16  # Largest decompressed payload accepted, against corrupted or hostile packets
+DECOMPRESS_ERRORS = (zlib.error, OSError, EOFError) + ((lzma.LZMAError,) if lzma is not None else ())
+
+
+class codec:
+    """A registered compression method: code is the value carried in the data header flags."""
+
+    def __init__(self, name, code, compress, decompress, default_level):
+        self.name = name
+        self.code = code
+        self.compress = compress  # compress(data, level) -> bytes
+        self.decompress = decompress  # decompress(data, max_length) -> bytes
+        self.default_level = default_level
+
+
+CODECS = {}
+CODECS_BY_CODE = {}
+
+
+def register_codec(name, code, compress, decompress, default_level):
+    """Register a compression method under a name so it can be selected per transfer."""
+    if not 0 < code <= pf.COMPRESSION_MASK >> pf.COMPRESSION_SHIFT:
+        raise ValueError(f"Codec code {code} does not fit in the data header flags.")
+    CODECS[name] = CODECS_BY_CODE[code] = codec(name, code, compress, decompress, default_level)
+    return CODECS[name]
+
+
+def bounded(decompressor, data, max_length):
+    """Runs a streaming decompressor without letting it produce more than max_length bytes."""
+    out = decompressor.decompress(data, max_length)
+    if not decompressor.eof:
+        raise ValueError("payload is truncated or larger than a packet")
+    return out
+
+
+register_codec("zlib", 1, lambda data, level: zlib.compress(data, level),
+               lambda data, max_length: bounded(zlib.decompressobj(), data, max_length), 6)
+register_codec("bz2", 3, lambda data, level: bz2.compress(data, level),
+               lambda data, max_length: bounded(bz2.BZ2Decompressor(), data, max_length), 9)
+if lzma is not None:
+    # Raw LZMA2 without the .xz container, whose headers would cost about 60 bytes per packet.
+    # A payload is never larger than MAX_PAYLOAD, so neither is the dictionary either side needs.
+    LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "dict_size": MAX_PAYLOAD}]
+
+    register_codec("lzma", 2,
+                   lambda data, level: lzma.compress(data, format=lzma.FORMAT_RAW,
+                                                     filters=[dict(LZMA_FILTERS[0], preset=level)]),
+                   lambda data, max_length: bounded(lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=LZMA_FILTERS),
+                                                    data, max_length), 1)
+
+
+def parse_method(method):
+    """Splits "name" or "name:level" into (codec, level), or returns None for no compression."""
+    if method is None or str(method).lower() in ("none", "off", ""):
+        return None
+    name, _, level = str(method).lower().partition(":")
+    try:
+        selected = CODECS[name]
+    except KeyError:
+        raise ValueError(f"Invalid compression method selected: {method}")
+    try:
+        return selected, int(level) if level else selected.default_level
+    except ValueError:
+        raise ValueError(f"Invalid compression level in {method!r}")
+
+
+def decompress(code, data):
+    """Decompresses the payload of a packet whose flags carry codec code. Raises ValueError if it cannot."""
+    try:
+        return CODECS_BY_CODE[code].decompress(data, MAX_PAYLOAD)
+    except KeyError:
+        raise ValueError(f"unknown compression code {code}")
+    except DECOMPRESS_ERRORS as e:
+        raise ValueError(str(e))
+
+
+class compressor:
+    """
+    Sender side of one transfer. Whether compression pays depends on the bottleneck: on a slow link every
+    byte saved is time saved, on a fast one the CPU time is simply added to the transfer. So instead of
+    modelling it, the sender measures it: after WARMUP packets (while slow start and the packet sizer
+    settle, compression stays on), the transfer runs in epochs of EPOCH packets, alternately with and
+    without compression, and keeps the mode that moved more file bytes per second. Only the second half of
+    an epoch is timed: until the window in flight has turned over, the ACK clock still runs at the previous
+    mode's pace. Every RETRY_EPOCHS epochs one epoch runs in the other mode again, in case the link or the
+    data changed. Data that does not shrink by MIN_SAVING counts as a loss for compression.
+    """
+
+    WARMUP = 64
+    EPOCH = 64
+    RETRY_EPOCHS = 8
+    MIN_SAVING = 0.05
+
+    def __init__(self, method, adaptive: bool = True):
+        self.codec, self.level = parse_method(method)
+        self.code = self.codec.code
+        self.flags = pf.compression_flags(self.code)
+        self.adaptive = adaptive
+        self.enabled = True  # Mode of the current epoch
+        self.chosen = True  # Mode that measured faster
+        self.rates = {True: None, False: None}  # File bytes per second of the last epoch in each mode
+        self.epochs_since_retry = 0
+        self.epoch_start = None
+        self.epoch_packets = 0
+        self.epoch_bytes = [0, 0]  # File bytes and wire bytes of the current epoch
+        self.packets = 0
+        self.compressed = 0  # Packets sent compressed
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu = 0.0
+        self.history = [(0, True)]  # (packet count, chosen mode) after every change
+
+    @property
+    def name(self):
+        return f"{self.codec.name}:{self.level}"
+
+    def compress(self, payload):
+        """Returns the payload compressed, or None if it should go out as it is."""
+        now = time.perf_counter()
+        self.packets += 1
+        out = None
+        if self.enabled:
+            out = self.codec.compress(payload, self.level)
+            self.cpu += time.perf_counter() - now
+            if len(out) >= len(payload):
+                out = None
+            self.bytes_in += len(payload)
+            self.bytes_out += len(out) if out is not None else len(payload)
+        if self.adaptive and self.packets > self.WARMUP:
+            self.count(len(payload), len(out) if out is not None else len(payload))
+        if out is not None:
+            self.compressed += 1
+        return out
+
+    def count(self, file_bytes, wire_bytes, now=None):
+        """Adds a packet to the current epoch, and picks the next epoch's mode when it is complete."""
+        now = time.perf_counter() if now is None else now
+        self.epoch_packets += 1
+        if self.epoch_packets == self.EPOCH // 2:
+            self.epoch_start = now  # The timed half starts after this packet
+            return
+        if self.epoch_packets < self.EPOCH // 2:
+            return
+        self.epoch_bytes[0] += file_bytes
+        self.epoch_bytes[1] += wire_bytes
+        if self.epoch_packets < self.EPOCH:
+            return
+
+        file_bytes, wire_bytes = self.epoch_bytes
+        rate = file_bytes / max(now - self.epoch_start, 1e-9)
+        if self.enabled and wire_bytes > (1 - self.MIN_SAVING) * file_bytes:
+            rate = 0.0  # Incompressible data: never worth the CPU
+        self.rates[self.enabled] = rate
+        self.epoch_packets = 0
+        self.epoch_bytes = [0, 0]
+
+        if None in self.rates.values():
+            self.enabled = not self.enabled  # Measure the other mode first
+            return
+        chosen = self.rates[True] > self.rates[False]
+        if chosen != self.chosen:
+            self.chosen = chosen
+            self.history.append((self.packets, chosen))
+            print(f"Compression {'on' if chosen else 'off'}: {self.rates[True] / 1e6:.2f} MB/s with it, "
+                  f"{self.rates[False] / 1e6:.2f} MB/s without")
+        self.epochs_since_retry += 1
+        if self.epochs_since_retry >= self.RETRY_EPOCHS:
+            self.epochs_since_retry = 0
+            self.enabled = not chosen  # One epoch in the other mode
+        else:
+            self.enabled = chosen
+
+    def stats(self):
+        return {"compression": self.name, "compressed_packets": self.compressed,
+                "compression_ratio": self.bytes_in / self.bytes_out if self.bytes_out else 1.0,
+                "compression_cpu": self.cpu, "compression_history": self.history}
+
+
+def make_compressor(method=COMPRESSION_METHOD, adaptive: bool = True):
+    """Returns a compressor for method ("zlib", "zlib:9", "lzma", "bz2", ...), or None for no compression."""
+    if parse_method(method) is None:
+        return None
+    return compressor(method, adaptive)
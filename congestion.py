@@ -0,0 +1,124 @@
+import time
+
+# Congestion window controllers for the windowed senders (GBN and Selective Repeat).
+# The window is counted in packets. Senders call on_ack for every newly acknowledged packet, on_loss when a
+# single packet is found lost while others are still being acknowledged, and on_timeout when the whole
+# window stalls. The usable window is min(cwnd, max_window), where max_window is the window_size argument
+# (the most the receiver will buffer).
+
+
+class reno:
+    """Slow start, additive increase of one packet per window, halving on loss and back to one on timeout."""
+
+    name = "reno"
+
+    def __init__(self, max_window: int = 64, initial_window: float = 1, ssthresh: float = None):
+        self.max_window = max_window
+        self.cwnd = float(initial_window)
+        self.ssthresh = float(ssthresh if ssthresh is not None else max_window)
+        self.start_time = time.time()
+        # (seconds since start, cwnd) whenever the whole-packet window or ssthresh changes, not on every ACK
+        self.history = [(0.0, self.cwnd)]
+        self.recorded = (int(self.cwnd), self.ssthresh)
+
+    @property
+    def window(self):
+        """Whole packets the sender may have in flight."""
+        return max(1, min(int(self.cwnd), self.max_window))
+
+    def record(self):
+        state = (int(self.cwnd), self.ssthresh)
+        if state != self.recorded:
+            self.recorded = state
+            self.history.append((time.time() - self.start_time, self.cwnd))
+
+    def on_ack(self, acked: int = 1):
+        for _ in range(acked):
+            if self.cwnd < self.ssthresh:
+                self.cwnd += 1  # Slow start: doubles every round trip
+            else:
+                self.cwnd += 1 / self.cwnd  # Congestion avoidance: one packet per round trip
+        # Growing far past the receiver's limit would only make the next decrease meaningless
+        self.cwnd = min(self.cwnd, float(self.max_window))
+        self.record()
+
+    def on_loss(self):
+        self.ssthresh = max(self.cwnd / 2, 2.0)
+        self.cwnd = self.ssthresh
+        self.record()
+
+    def on_timeout(self):
+        self.ssthresh = max(self.cwnd / 2, 2.0)
+        self.cwnd = 1.0
+        self.record()
+
+
+class cubic(reno):
+    """
+    CUBIC-style growth: after a decrease the window follows W(t) = C(t - K)^3 + W_max, a concave approach to
+    the window where loss last happened and a convex probe beyond it. Time is measured in round trips
+    (counted from acknowledged windows) rather than seconds, so the curve has the same shape on a LAN with
+    sub-millisecond round trips as on a WAN. The Reno-equivalent window is used when it is larger.
+    """
+
+    name = "cubic"
+    C = 0.4
+    BETA = 0.7  # Multiplicative decrease factor
+
+    def __init__(self, max_window: int = 64, initial_window: float = 1, ssthresh: float = None):
+        super().__init__(max_window, initial_window, ssthresh)
+        self.w_max = 0.0
+        self.k = 0.0
+        self.rounds = 0.0  # Round trips since the last decrease
+        self.w_reno = self.cwnd
+
+    def on_ack(self, acked: int = 1):
+        if self.cwnd < self.ssthresh:
+            super().on_ack(acked)
+            return
+        for _ in range(acked):
+            self.rounds += 1 / self.cwnd
+            self.w_reno += 3 * (1 - self.BETA) / (1 + self.BETA) / self.cwnd
+            target = max(self.C * (self.rounds - self.k) ** 3 + self.w_max, self.w_reno)
+            if target > self.cwnd:
+                self.cwnd += (target - self.cwnd) / self.cwnd
+            else:
+                self.cwnd += 0.01 / self.cwnd  # Plateau around W_max
+        self.cwnd = min(self.cwnd, float(self.max_window))
+        self.record()
+
+    def decrease(self):
+        self.w_max = self.cwnd
+        self.k = (self.w_max * (1 - self.BETA) / self.C) ** (1 / 3)
+        self.rounds = 0.0
+        self.ssthresh = max(self.cwnd * self.BETA, 2.0)
+
+    def on_loss(self):
+        self.decrease()
+        self.cwnd = self.ssthresh
+        self.w_reno = self.cwnd
+        self.record()
+
+    def on_timeout(self):
+        self.decrease()
+        self.cwnd = 1.0
+        self.w_reno = self.ssthresh
+        self.record()
+
+
+CONGESTION_CONTROLS = {"reno": reno, "cubic": cubic}
+
+
+def in_slow_start(controller):
+    """True while the window is still doubling every round trip (False for a fixed window)."""
+    return controller is not None and controller.cwnd < controller.ssthresh
+
+
+def make_controller(name, max_window: int):
+    """Returns a controller for name, or None for a fixed window (None, "none" or "fixed")."""
+    if name is None or name.lower() in ("none", "fixed"):
+        return None
+    try:
+        return CONGESTION_CONTROLS[name.lower()](max_window=max_window)
+    except KeyError:
+        raise ValueError(f"Unknown congestion control {name!r}, expected one of {list(CONGESTION_CONTROLS)}.")
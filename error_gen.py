@@ -1,4 +1,5 @@
 import random
+from packet_format import DATA_HEADER_SIZE
 
 
 class error_gen:
@@ -33,8 +34,9 @@ class error_gen:
             # return bytes(random.getrandbits(8) for _ in range(length))
 
             print("Full Random Error")  # Debug
-            # Preserve sequence number (first 2 bytes), corrupt only the rest
-            return packet[:2] + bytes(random.getrandbits(8) for _ in range(len(packet) - 2))
+            # Preserve the header (sequence number and offset), corrupt only the rest
+            keep = DATA_HEADER_SIZE if length > DATA_HEADER_SIZE else 0  # Too short to be a data packet
+            return packet[:keep] + bytes(random.getrandbits(8) for _ in range(length - keep))
 
         else:
             print(str(error_count) + " bit errors")  # Debug
@@ -0,0 +1,264 @@
+from bisect import bisect_right
+import numpy as np
+import packet_format as pf
+
+# Forward error correction for Selective Repeat. After every block of k data packets the sender adds m
+# repair packets, and the receiver rebuilds up to m lost packets of the block from the ones that arrived,
+# without waiting a retransmission round trip.
+# The code is a systematic Reed-Solomon code over GF(256) built from a Cauchy matrix whose columns are
+# scaled so that the first repair row is all ones: repair packet 0 is the plain XOR of the block, and any
+# k of the k + m packets rebuild it. A block's packets are contiguous in the file, so the receiver knows
+# every packet's offset from the block's first offset and the lengths carried by each repair packet.
+
+GF_POLYNOMIAL = 0x11D
+MAX_REPAIR = 8  # Repair rows of the coefficient matrix; blocks may hold up to 256 - MAX_REPAIR packets
+
+
+def make_gf_tables():
+    """Exponent and logarithm tables of GF(256), and the full 256 x 256 multiplication table."""
+    exp = np.zeros(512, dtype=np.int32)
+    log = np.zeros(256, dtype=np.int32)
+    value = 1
+    for power in range(255):
+        exp[power] = value
+        log[value] = power
+        value <<= 1
+        if value & 0x100:
+            value ^= GF_POLYNOMIAL
+    exp[255:510] = exp[:255]
+    mul = exp[(log[:, None] + log[None, :])].astype(np.uint8)
+    mul[0, :] = 0
+    mul[:, 0] = 0
+    return exp, log, mul
+
+
+GF_EXP, GF_LOG, GF_MUL = make_gf_tables()
+
+
+def gf_inverse(a):
+    return int(GF_EXP[255 - GF_LOG[a]])
+
+
+def make_coefficients():
+    """MAX_REPAIR x (256 - MAX_REPAIR) Cauchy matrix 1 / (j xor (MAX_REPAIR + i)), scaled so row 0 is all ones."""
+    rows, columns = MAX_REPAIR, 256 - MAX_REPAIR
+    coefficients = np.zeros((rows, columns), dtype=np.uint8)
+    for i in range(columns):
+        column = [gf_inverse(j ^ (MAX_REPAIR + i)) for j in range(rows)]
+        scale = gf_inverse(column[0])  # Scaling a column keeps every square submatrix invertible
+        coefficients[:, i] = [GF_MUL[value, scale] for value in column]
+    return coefficients
+
+
+COEFFICIENTS = make_coefficients()
+
+
+def as_rows(payloads, length):
+    """k x length matrix of the payloads, zero-padded."""
+    rows = np.zeros((len(payloads), length), dtype=np.uint8)
+    for i, payload in enumerate(payloads):
+        rows[i, :len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+    return rows
+
+
+def encode(payloads, index):
+    """Repair symbol index (0 = XOR) of a block of payloads, as long as the longest payload."""
+    rows = as_rows(payloads, max(len(payload) for payload in payloads))
+    if index == 0:
+        return np.bitwise_xor.reduce(rows, axis=0).tobytes()
+    coefficients = COEFFICIENTS[index, :len(payloads), None]
+    return np.bitwise_xor.reduce(GF_MUL[coefficients, rows], axis=0).tobytes()
+
+
+def gf_invert(matrix):
+    """Inverse of a small square matrix over GF(256) (Gauss-Jordan elimination)."""
+    size = len(matrix)
+    rows = [list(row) + [int(i == r) for i in range(size)] for r, row in enumerate(matrix)]
+    for column in range(size):
+        pivot = next(r for r in range(column, size) if rows[r][column])
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        scale = gf_inverse(rows[column][column])
+        rows[column] = [int(GF_MUL[value, scale]) for value in rows[column]]
+        for r in range(size):
+            factor = rows[r][column]
+            if r != column and factor:
+                rows[r] = [value ^ int(GF_MUL[factor, pivot_value])
+                           for value, pivot_value in zip(rows[r], rows[column])]
+    return [row[size:] for row in rows]
+
+
+def decode(lengths, received, repairs):
+    """
+    Rebuilds the missing payloads of a block. received is {data index: payload}, repairs is
+    {repair index: symbol}. Returns {data index: payload} for the missing ones, or None if too many are lost.
+    """
+    k = len(lengths)
+    missing = [i for i in range(k) if i not in received]
+    if len(missing) > len(repairs):
+        return None
+    if not missing:
+        return {}
+    length = max(lengths)
+    used = sorted(repairs)[:len(missing)]
+    present = sorted(received)
+    known = as_rows([received[i] for i in present], length)
+    # Subtract what the received packets contributed to each repair symbol
+    syndromes = []
+    for j in used:
+        symbol = np.frombuffer(repairs[j], dtype=np.uint8)[:length]
+        if present:
+            contribution = GF_MUL[COEFFICIENTS[j, present][:, None], known]
+            symbol = symbol ^ np.bitwise_xor.reduce(contribution, axis=0)
+        syndromes.append(symbol)
+    if len(missing) == 1 and used == [0]:
+        return {missing[0]: syndromes[0][:lengths[missing[0]]].tobytes()}  # Plain XOR parity
+    inverse = gf_invert([[int(COEFFICIENTS[j, i]) for i in missing] for j in used])
+    syndromes = np.stack(syndromes)
+    rebuilt = {}
+    for row, i in zip(inverse, missing):
+        payload = np.bitwise_xor.reduce(GF_MUL[np.array(row, dtype=np.uint8)[:, None], syndromes], axis=0)
+        rebuilt[i] = payload[:lengths[i]].tobytes()
+    return rebuilt
+
+
+class fec_encoder:
+    """
+    Sender side: repair packets for each block of data packets. Redundancy follows the losses FEC did not
+    cover: a retransmission in a block adds a repair packet to the following blocks, and CLEAN_BLOCKS
+    blocks without one take a repair packet away (down to none), so a clean link stops paying for FEC.
+    "xor" is limited to one repair packet per block; "rs" uses up to max_repair.
+    """
+
+    BLOCK = 16
+    CLEAN_BLOCKS = 8
+
+    def __init__(self, method: str = "rs", block: int = BLOCK, max_repair: int = 4):
+        self.method = method
+        self.block = block
+        self.max_repair = 1 if method == "xor" else min(max_repair, MAX_REPAIR)
+        self.repair = 1
+        self.block_start = 0
+        self.clean = 0
+        self.protected_from = 0  # Losses before this packet were sent with redundancy already raised for
+        self.repair_packets = 0
+        self.protected = {}  # {first sequence number: end} of unacknowledged blocks sent with repair packets
+        self.protected_starts = []  # Their first sequence numbers in order, to find the block of a packet
+        self.history = [(0, self.repair)]  # (first sequence number, repair packets per block) after every change
+
+    def block_ready(self, next_seq, total_packets, source=None):
+        """
+        True when the packets before next_seq complete a block (or the file). A block also ends where a
+        resumed transfer skips to the next missing range of source, since the receiver rebuilds offsets
+        from packets being contiguous in the file.
+        """
+        if next_seq <= self.block_start:
+            return False
+        return (next_seq - self.block_start >= self.block or next_seq >= total_packets
+                or (source is not None and source.ends_range(next_seq - 1)))
+
+    def repairs(self, source, end):
+        """Returns [(repair body, first sequence number, first offset)] for the block ending before end."""
+        first = self.block_start
+        self.block_start = end
+        self.clean += 1
+        if self.clean >= self.CLEAN_BLOCKS and self.repair > 0:
+            self.set_repair(self.repair - 1, end)
+        if self.repair == 0:
+            return []
+        self.protected[first] = end
+        self.protected_starts.append(first)
+        payloads = [source.payload(seq) for seq in range(first, end)]
+        lengths = [len(payload) for payload in payloads]
+        bodies = []
+        for index in range(self.repair):
+            bodies.append(pf.pack_repair(index, lengths) + encode(payloads, index))
+        self.repair_packets += len(bodies)
+        return [(body, first, source.offset_of(first)) for body in bodies]
+
+    def awaiting_repair(self, seq, highest_acked, threshold):
+        """
+        True while the repair packets of seq's block may still rebuild it at the receiver: they follow the
+        block, so the hole is only certain once threshold packets after the block were acknowledged.
+        """
+        index = bisect_right(self.protected_starts, seq) - 1
+        if index < 0:
+            return False
+        end = self.protected[self.protected_starts[index]]
+        return seq < end and highest_acked < end - 1 + threshold
+
+    def forget(self, base):
+        """Drops the blocks the cumulative ACK has passed: none of their packets can be missing anymore."""
+        passed = 0
+        while passed < len(self.protected_starts) and self.protected[self.protected_starts[passed]] <= base:
+            del self.protected[self.protected_starts[passed]]
+            passed += 1
+        del self.protected_starts[:passed]
+
+    def on_loss(self, seq):
+        """A packet had to be retransmitted: its block was not covered."""
+        if seq >= self.protected_from:
+            self.set_repair(min(self.repair + 1, self.max_repair), self.block_start)
+            self.protected_from = self.block_start + self.block  # The block being sent gets the new redundancy
+        self.clean = 0
+
+    def set_repair(self, repair, next_seq):
+        self.clean = 0
+        if repair != self.repair:
+            self.repair = repair
+            self.history.append((next_seq, repair))
+
+
+class fec_decoder:
+    """Receiver side: keeps repair packets until their block can be rebuilt or has arrived complete."""
+
+    def __init__(self):
+        self.blocks = {}  # {first sequence number: (first offset, lengths, {repair index: symbol})}
+        self.recovered = 0
+
+    def add(self, first, offset, body):
+        index, lengths, header_size = pf.unpack_repair(body)
+        block = self.blocks.setdefault(first, (offset, lengths, {}))
+        block[2][index] = bytes(body[header_size:])  # body is a view of a reused receive buffer
+
+    def block_of(self, seq):
+        """First sequence number of the pending block holding seq, or None."""
+        for first, (_, lengths, _) in self.blocks.items():
+            if first <= seq < first + len(lengths):
+                return first
+        return None
+
+    def recover(self, first, is_received, file_buffer):
+        """
+        Rebuilds what it can of block first. is_received(seq) tells which packets are already in file_buffer.
+        Returns [(sequence number, offset, payload)] of the rebuilt packets.
+        """
+        block = self.blocks.get(first)
+        if block is None:
+            return []
+        offset, lengths, repairs = block
+        offsets = [offset]
+        for length in lengths[:-1]:
+            offsets.append(offsets[-1] + length)
+        received = {i: file_buffer[offsets[i]:offsets[i] + lengths[i]]
+                    for i in range(len(lengths)) if is_received(first + i)}
+        rebuilt = decode(lengths, received, repairs)
+        if rebuilt is None:
+            return []  # Not enough yet, keep the repair packets
+        del self.blocks[first]
+        self.recovered += len(rebuilt)
+        return [(first + i, offsets[i], payload) for i, payload in rebuilt.items()]
+
+    def forget(self, base):
+        """Drops blocks that arrived complete (every packet is below base)."""
+        for first in [first for first, (_, lengths, _) in self.blocks.items() if first + len(lengths) <= base]:
+            del self.blocks[first]
+
+
+def make_encoder(method, window_size: int = fec_encoder.BLOCK):
+    """Returns an encoder for method (None, "xor" or "rs"); blocks are never longer than the window."""
+    if method is None or str(method).lower() in ("none", "off"):
+        return None
+    method = str(method).lower()
+    if method not in ("xor", "rs"):
+        raise ValueError(f"Unknown FEC method {method!r}, expected None, 'xor' or 'rs'.")
+    return fec_encoder(method, block=max(2, min(fec_encoder.BLOCK, window_size)))
@@ -0,0 +1,167 @@
+import hashlib
+import mmap
+import os
+from array import array
+from collections import OrderedDict, deque
+import checksums
+
+
+class file_source:
+    """
+    Memory-mapped, read-only view of a file that hands out packets on demand.
+    Nothing is read or checksummed until a packet is asked for, so the first packet can leave
+    immediately and only the blocks around the send window are ever resident.
+
+    Packets start at packet_size bytes, i.e. at offset seq * packet_size. After set_packet_size, packets
+    not handed out yet are cut at the new size as they are first asked for, and their offsets, lengths and
+    checksums are kept in arrays so retransmissions carry exactly the same bytes.
+
+    skip() limits the packets to byte ranges of the file (the chunks a resuming receiver is missing); they
+    are cut the same way, never across the end of a range.
+    """
+
+    def __init__(self, path, packet_size: int = 4096, checksum=None, block_packets: int = 256):
+        self.path = path
+        self.packet_size = packet_size  # Size of the packets not cut yet
+        self.initial_packet_size = packet_size
+        self.max_packet_size = packet_size
+        self.first_resized = None  # Packets before this one are at seq * initial_packet_size
+        self.offsets = array('Q')  # From first_resized on: offset, length and checksum of every packet cut
+        self.lengths = array('I')
+        self.checksums = array('I')
+        self.next_offset = 0  # First byte not in any packet yet (once resized)
+        self.ranges = deque()  # Byte ranges still to be cut after the current one (see skip)
+        self.range_ends = set()  # Ends of all the ranges of skip(); the next packet starts elsewhere in the file
+        self.skipped_bytes = 0
+        self.hash = None
+        self.checksum = checksums.get_engine(checksum)
+        self.block_packets = block_packets
+        self.block_cache = OrderedDict()  # {block index: list of checksums}
+        self.max_cached_blocks = 4
+
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size > 0:
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.mmap)
+        else:
+            # mmap cannot map an empty file
+            self.mmap = None
+            self.view = memoryview(b'')
+        self.range_end = self.size  # End of the range packets are being cut from
+
+    @property
+    def total_packets(self):
+        """Packets in the file at the current packet size; grows or shrinks when the size changes."""
+        if self.first_resized is None:
+            return -(-self.size // self.initial_packet_size)
+        uncut = -(-(self.range_end - self.next_offset) // self.packet_size)
+        uncut += sum(-(-(end - start) // self.packet_size) for start, end in self.ranges)
+        return self.first_resized + len(self.offsets) + uncut
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def set_packet_size(self, packet_size, next_seq):
+        """Packets from next_seq on (none of them handed out yet) carry packet_size bytes."""
+        if packet_size == self.packet_size:
+            return
+        if self.first_resized is not None and next_seq > 0:
+            self.resized_index(next_seq - 1)  # Packets before next_seq keep the old size even if not cut yet
+        if self.first_resized is None:
+            self.first_resized = next_seq
+            self.next_offset = min(next_seq * self.initial_packet_size, self.size)
+        self.packet_size = packet_size
+        self.max_packet_size = max(self.max_packet_size, packet_size)
+
+    def skip(self, ranges):
+        """
+        Sends only the byte ranges [(start, end), ...] (in order, not overlapping); the rest of the file is
+        already at the receiver. Must be called before any packet is handed out.
+        """
+        self.ranges = deque(ranges)
+        self.range_ends = {end for start, end in ranges}
+        self.skipped_bytes = self.size - sum(end - start for start, end in self.ranges)
+        self.first_resized = 0
+        self.next_offset, self.range_end = self.ranges.popleft() if self.ranges else (self.size, self.size)
+
+    def content_hash(self):
+        """BLAKE2b digest (16 bytes) of the whole file, computed once; it keys the receiver's checkpoint."""
+        if self.hash is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for start in range(0, self.size, 1 << 20):
+                digest.update(self.view[start:start + (1 << 20)])
+            self.hash = digest.digest()
+        return self.hash
+
+    def resized_index(self, sequence_number):
+        """Index of a packet in the arrays, cutting packets up to it at the current size; None if fixed."""
+        if self.first_resized is None or sequence_number < self.first_resized:
+            return None
+        index = sequence_number - self.first_resized
+        while len(self.offsets) <= index:
+            if self.next_offset >= self.range_end and self.ranges:
+                self.next_offset, self.range_end = self.ranges.popleft()
+            length = min(self.packet_size, self.range_end - self.next_offset)
+            if length <= 0:
+                raise IndexError(f"Packet {sequence_number} is past the end of the file.")
+            self.offsets.append(self.next_offset)
+            self.lengths.append(length)
+            self.checksums.append(self.checksum.compute(self.view[self.next_offset:self.next_offset + length]))
+            self.next_offset += length
+        return index
+
+    def offset_of(self, sequence_number):
+        """Byte offset of a packet's payload in the file."""
+        index = self.resized_index(sequence_number)
+        if index is None:
+            return sequence_number * self.initial_packet_size
+        return self.offsets[index]
+
+    def ends_range(self, sequence_number):
+        """True if the next packet does not continue where this one ends in the file (see skip)."""
+        if not self.range_ends:
+            return False
+        return self.offset_of(sequence_number) + len(self.payload(sequence_number)) in self.range_ends
+
+    def payload(self, sequence_number):
+        """Zero-copy view of the bytes carried by a sequence number."""
+        index = self.resized_index(sequence_number)
+        if index is None:
+            start = sequence_number * self.initial_packet_size
+            return self.view[start:start + self.initial_packet_size]
+        start = self.offsets[index]
+        return self.view[start:start + self.lengths[index]]
+
+    def checksum_of(self, sequence_number):
+        """Checksum of a packet, computed a block of packets at a time with the batch API."""
+        index = self.resized_index(sequence_number)
+        if index is not None:
+            return self.checksums[index]  # Computed when the packet was cut
+        block = sequence_number // self.block_packets
+        block_checksums = self.block_cache.get(block)
+        if block_checksums is None:
+            start = block * self.block_packets * self.initial_packet_size
+            end = start + self.block_packets * self.initial_packet_size
+            block_checksums = self.checksum.compute_batch(self.view[start:end], self.initial_packet_size).tolist()
+            self.block_cache[block] = block_checksums
+            if len(self.block_cache) > self.max_cached_blocks:
+                self.block_cache.popitem(last=False)  # Forget the oldest block
+        else:
+            self.block_cache.move_to_end(block)
+        return block_checksums[sequence_number % self.block_packets]
+
+    def close(self):
+        self.view.release()
+        if self.mmap is not None:
+            try:
+                self.mmap.close()
+            except BufferError:
+                pass  # A packet view is still alive, the map is closed when it is garbage collected
+        self.file.close()
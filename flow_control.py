@@ -0,0 +1,99 @@
+import sys
+import time
+from socket import SOL_SOCKET, SO_RCVBUF, SO_SNDBUF
+import packet_format as pf
+
+# Flow control: the receiver advertises in every ACK how many more packets it can take (rwnd), and the
+# windowed senders keep at most min(cwnd, rwnd) packets in flight. Both ends grow their socket buffers to
+# twice the bandwidth-delay product measured during the transfer, so the advertised window can open up
+# instead of staying at what a fixed 64 KB buffer holds.
+
+
+class buffer_sizer:
+    """
+    Grows a socket buffer (SO_RCVBUF or SO_SNDBUF) to twice the bandwidth-delay product, measured as the
+    bytes delivered per round trip, like Linux's receive buffer auto-tuning. Buffers only grow; the kernel
+    caps them at its own limit (net.core.rmem_max / wmem_max), and size is what it actually granted.
+    """
+
+    MIN_BUFFER = 65536
+    MAX_BUFFER = 8 << 20
+
+    def __init__(self, port, option=SO_RCVBUF):
+        self.port = port
+        self.option = option
+        self.size = 0  # Bytes of payload the buffer holds
+        self.bdp = 0
+        self.bytes = 0
+        self.start = None
+        self.resize(self.MIN_BUFFER)
+
+    def resize(self, size):
+        if not hasattr(self.port, "setsockopt"):
+            self.size = size  # Nothing to tune (e.g. a test double)
+            return
+        try:
+            self.port.setsockopt(SOL_SOCKET, self.option, int(size))
+            granted = self.port.getsockopt(SOL_SOCKET, self.option)
+            # Linux reports twice the size it grants, the other half is kept for its bookkeeping
+            self.size = granted // 2 if sys.platform.startswith("linux") else granted
+        except OSError as e:
+            print(f"Could not resize socket buffer to {size} bytes: {e}")
+        print(f"Socket {'receive' if self.option == SO_RCVBUF else 'send'} buffer is now {self.size} bytes")
+
+    def on_bytes(self, nbytes, rtt, now=None):
+        """Counts delivered bytes; once a round trip has passed, the rate times rtt is the new BDP sample."""
+        now = time.time() if now is None else now
+        if self.start is None:
+            self.start = now
+            return
+        self.bytes += nbytes
+        elapsed = now - self.start
+        if not rtt or elapsed < rtt:
+            return
+        self.bdp = self.bytes / elapsed * rtt
+        self.bytes = 0
+        self.start = now
+        target = min(2 * self.bdp, self.MAX_BUFFER)
+        if target > self.size * 1.25:  # Small changes are not worth a system call
+            self.resize(target)
+
+
+class receive_window:
+    """
+    The receiver's side: the socket buffer, its auto-tuning, and the window to advertise.
+    rwnd is the number of packets of the latest size that fit in the buffer, minus the ones already
+    queued for processing, and never more than limit (Selective Repeat's receive window).
+    With no RTT of its own, the receiver times how long the cumulative ACK takes to advance by one
+    advertised window: a sender that fills the window sends one window per round trip.
+    """
+
+    ALPHA = 0.125
+
+    def __init__(self, port, limit: int = pf.MAX_RWND, backlog=None):
+        self.buffer = buffer_sizer(port, SO_RCVBUF)
+        self.limit = min(limit, pf.MAX_RWND)  # rwnd is a 16-bit packet count on the wire
+        self.backlog = backlog  # Object whose pending attribute counts datagrams read but not processed
+        self.packet_bytes = 1
+        self.rtt = None
+        self.mark_seq = None  # Cumulative point that ends the current round trip measurement
+        self.mark_time = None
+
+    def on_packet(self, nbytes, base, now=None):
+        """Called for every data packet; base is the next packet expected in order."""
+        now = time.time() if now is None else now
+        self.packet_bytes = nbytes
+        if self.mark_seq is None:
+            self.mark_seq, self.mark_time = base + self.advertise(), now
+        elif base >= self.mark_seq:
+            sample = now - self.mark_time
+            self.rtt = sample if self.rtt is None else (1 - self.ALPHA) * self.rtt + self.ALPHA * sample
+            self.mark_seq, self.mark_time = base + self.advertise(), now
+        self.buffer.on_bytes(nbytes, self.rtt, now)
+
+    def advertise(self, queued: int = None):
+        """Packets the sender may have in flight beyond the cumulative ACK (at least one, so it never stalls)."""
+        if queued is None:
+            queued = self.backlog.pending if self.backlog is not None else 0
+        free = self.buffer.size // self.packet_bytes - queued
+        return max(1, min(free, self.limit))
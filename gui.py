@@ -7,9 +7,10 @@ import asyncio
 import threading  # Use threading instead of multiprocessing
 import time
 # Files in the project
-import send
-import receive
+import async_transfer
 import port as p
+import checksums
+import compression
 
 
 class gui:
@@ -29,6 +30,8 @@ class gui:
         self.execute_button = None
         self.transmit_type = None
         self.transmit_type_name = None
+        self.checksum_type = None
+        self.compression_type = None
         self.progress_bar = None
         self.retrans_label = None
         self.dup_ack_label = None
@@ -56,7 +59,7 @@ class gui:
         except ConnectionResetError:
             self.response_textbox.value += 'Connection was forcibly closed by the server.\n'
 
-    def run_client_get(self):
+    async def run_client_get(self):
         message = 'GET'
         self.client_socket.sendto(message.encode(), (self.server_name, self.server_port))
 
@@ -64,46 +67,46 @@ class gui:
         transmit_map = {1: "sw", 2: "gbn", 3: "sr"}
         protocol = transmit_map.get(self.transmit_type.value, "sw")
 
-        # Send error parameters along with the protocol choice
-        msg = str([self.error_type.value, self.error_rate.value, protocol])
+        # Send error parameters along with the protocol, checksum and compression choice
+        msg = str([self.error_type.value, self.error_rate.value, protocol, self.checksum_type.value,
+                   self.compression_method()])
         self.client_socket.sendto(msg.encode(), (self.server_name, self.server_port))
 
-        r = receive.receive()
-        r.udp_receive_protocol(self.client_socket, False, self.error_type.value, self.error_rate.value, protocol)
+        # Runs on the UI event loop, so the page stays responsive without a receive thread
+        await async_transfer.transfer("receive", self.client_socket, protocol=protocol,
+                                      error_type=self.error_type.value, error_rate=self.error_rate.value,
+                                      checksum_method=self.checksum_type.value, output_path='client_image.bmp')
         self.response_textbox.value += f'GET Response: Image received.\n' # Append server response to text box
 
-    def run_client_push(self):
+    async def run_client_push(self):
         message = 'PUSH'
         self.client_socket.sendto(message.encode(), (self.server_name, self.server_port))
 
         transmit_map = {1: "sw", 2: "gbn", 3: "sr"}
         protocol = transmit_map.get(self.transmit_type.value, "sw")
 
-        msg = str([self.error_type.value, self.error_rate.value, protocol])
+        msg = str([self.error_type.value, self.error_rate.value, protocol, self.checksum_type.value,
+                   self.compression_method()])
         self.client_socket.sendto(msg.encode(), (self.server_name, self.server_port))
-        s = send.send()
-
-        def send_with_progress():
-            total_packets, retransmissions, duplicate_acks, ack_efficiency, retransmission_overhead = \
-                s.udp_send_protocol(
-                    self.client_socket,
-                    (self.server_name, self.server_port),
-                    self.error_type.value,
-                    self.error_rate.value,
-                    protocol=protocol,
-                    update_ui_callback=[self.progress_bar,
-                                        self.retrans_label,
-                                        self.dup_ack_label,
-                                        self.ack_eff_label,
-                                        self.retrans_overhead_label]
-                )
-            # ui.run(lambda: self.update_progress(1, retransmissions, duplicate_acks, ack_efficiency,retransmission_overhead))
-
-            self.update_progress(1, retransmissions, duplicate_acks, ack_efficiency, retransmission_overhead)
-            # Schedule notify_completion in the main event loop
-            # ui.run(lambda: self.notify_completion(total_packets))
-
-        threading.Thread(target=send_with_progress, daemon=True).start()
+
+        # The transfer shares the UI event loop; progress is reported after every ACK
+        total_packets, retransmissions, duplicate_acks, ack_efficiency, retransmission_overhead = \
+            await async_transfer.transfer(
+                "send",
+                self.client_socket,
+                (self.server_name, self.server_port),
+                protocol=protocol,
+                error_type=self.error_type.value,
+                error_rate=self.error_rate.value,
+                checksum_method=self.checksum_type.value,
+                compression_method=self.compression_method(),
+                update_ui_callback=self.update_progress
+            )
+        self.update_progress(1, retransmissions, duplicate_acks, ack_efficiency, retransmission_overhead)
+        await self.notify_completion(total_packets)
+
+    def compression_method(self):
+        return None if self.compression_type.value == "none" else self.compression_type.value
 
     async def notify_completion(self, total_packets):
         """Notify UI when transfer is complete"""
@@ -132,11 +135,11 @@ class gui:
         # self.error_control(True)
         self.state = 'push'
 
-    def execute(self):
+    async def execute(self):
         if self.state == 'get':
-            self.run_client_get()
+            await self.run_client_get()
         elif self.state == 'push':
-            self.run_client_push()
+            await self.run_client_push()
 
     def error_control(self, value):
         # Make all error and protocol controls visible when needed
@@ -179,6 +182,13 @@ class gui:
             {1: 'RDT 3.0', 2: 'GBN', 3: 'SR'}
         ).bind_value(self.transmit_type)
 
+        # Checksum selection (sent to the server with the other transfer parameters)
+        self.checksum_type = ui.select(list(checksums.CHECKSUM_ENGINES.keys()), value=checksums.CHECKSUM_METHOD,
+                                       label='Checksum')
+        # Payload compression (the sender turns it off by itself when it would not save time)
+        self.compression_type = ui.select(["none"] + list(compression.CODECS.keys()), value="none",
+                                          label='Compression')
+
         self.execute_button = ui.button("Execute", on_click=self.execute)
 
         # Create UI elements for progress tracking
@@ -0,0 +1,196 @@
+import argparse
+import heapq
+import itertools
+import random
+import selectors
+import threading
+import time
+from socket import *
+
+
+class impairment_proxy:
+    """
+    Local UDP proxy that sits between the client and the server and impairs traffic on its own timers.
+    Point the client at listen_port instead of the server. Every client address gets its own upstream
+    socket, so the server still sees one address per client. Delay, jitter, loss, corruption, reordering,
+    duplication and a bandwidth cap are applied to both directions without blocking either endpoint.
+    With a bandwidth cap, queue_bytes (0 = unlimited) is the bottleneck buffer: a datagram that arrives
+    while more than that is waiting to be serialized is dropped, like a drop-tail router queue.
+    """
+
+    def __init__(self, listen_port: int = 12001, server=('localhost', 12000), delay: float = 0.0,
+                 jitter: float = 0.0, loss: float = 0.0, corruption: float = 0.0, reorder: float = 0.0,
+                 reorder_delay: float = 0.02, duplicate: float = 0.0, bandwidth_mbps: float = 0.0,
+                 directions=("up", "down"), seed=None, queue_bytes: int = 0):
+        self.server = server
+        self.delay = delay
+        self.jitter = jitter
+        self.loss = loss
+        self.corruption = corruption
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+        self.duplicate = duplicate
+        self.bandwidth_mbps = bandwidth_mbps
+        self.queue_bytes = queue_bytes
+        self.directions = set(directions)  # "up" is client -> server, "down" is server -> client
+        self.random = random.Random(seed)
+
+        self.listen_socket = socket(AF_INET, SOCK_DGRAM)
+        self.listen_socket.bind(('', listen_port))
+        self.listen_port = self.listen_socket.getsockname()[1]
+        self.upstream = {}  # {client address: socket connected towards the server}
+        self.clients = {}  # {upstream socket: client address}
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listen_socket, selectors.EVENT_READ)
+
+        self.schedule = []  # Heap of (deliver time, tie breaker, socket, datagram, destination)
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.link_free_at = {"up": 0.0, "down": 0.0}  # When each direction finishes serializing its queue
+        self.running = False
+        self.threads = []
+        self.stats = {direction: {"forwarded": 0, "dropped": 0, "overflowed": 0, "corrupted": 0, "duplicated": 0,
+                                  "reordered": 0}
+                      for direction in ("up", "down")}
+
+    def start(self):
+        self.running = True
+        self.threads = [threading.Thread(target=self.receive_loop, daemon=True),
+                        threading.Thread(target=self.deliver_loop, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        print(f"Impairment proxy listening on port {self.listen_port}, forwarding to {self.server}")
+        return self
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify()
+        for thread in self.threads:
+            thread.join()
+        self.selector.close()
+        self.listen_socket.close()
+        for upstream in self.upstream.values():
+            upstream.close()
+        self.print_stats()
+
+    def print_stats(self):
+        print("\n===== Impairment Proxy Statistics =====")
+        for direction, stats in self.stats.items():
+            print(f"{direction}: " + ", ".join(f"{name}={count}" for name, count in stats.items()))
+        print("=======================================\n")
+
+    def receive_loop(self):
+        """Drains every socket as fast as possible; all waiting happens in deliver_loop."""
+        while self.running:
+            for key, _ in self.selector.select(timeout=0.1):
+                sock = key.fileobj
+                try:
+                    data, address = sock.recvfrom(65535)
+                except OSError:
+                    continue
+                if sock is self.listen_socket:
+                    upstream = self.upstream.get(address)
+                    if upstream is None:
+                        upstream = socket(AF_INET, SOCK_DGRAM)
+                        self.upstream[address] = upstream
+                        self.clients[upstream] = address
+                        self.selector.register(upstream, selectors.EVENT_READ)
+                    self.impair("up", data, upstream, self.server)
+                else:
+                    self.impair("down", data, self.listen_socket, self.clients[sock])
+
+    def impair(self, direction, data, sock, destination):
+        """Decides the fate of one datagram and schedules its delivery (and any duplicate)."""
+        now = time.monotonic()
+        stats = self.stats[direction]
+        if direction not in self.directions:
+            self.enqueue(now, sock, data, destination)
+            return
+
+        if self.random.random() < self.loss:
+            stats["dropped"] += 1
+            return
+        if self.random.random() < self.corruption and data:
+            data = bytearray(data)
+            data[self.random.randrange(len(data))] ^= 1 << self.random.randrange(8)
+            data = bytes(data)
+            stats["corrupted"] += 1
+
+        # Bandwidth cap: each datagram waits for the link to finish serializing the previous ones
+        departure = now
+        if self.bandwidth_mbps > 0:
+            backlog = max(0.0, self.link_free_at[direction] - now) * self.bandwidth_mbps * 1e6 / 8
+            if self.queue_bytes and backlog + len(data) > self.queue_bytes:
+                stats["overflowed"] += 1  # Bottleneck queue full
+                return
+            departure = max(now, self.link_free_at[direction]) + len(data) * 8 / (self.bandwidth_mbps * 1e6)
+            self.link_free_at[direction] = departure
+
+        deliver_at = departure + max(0.0, self.delay + self.random.uniform(-self.jitter, self.jitter))
+        if self.random.random() < self.reorder:
+            deliver_at += self.reorder_delay  # Held back so later datagrams overtake it
+            stats["reordered"] += 1
+        self.enqueue(deliver_at, sock, data, destination)
+
+        if self.random.random() < self.duplicate:
+            self.enqueue(deliver_at + self.random.uniform(0, max(self.jitter, 0.001)), sock, data, destination)
+            stats["duplicated"] += 1
+
+    def enqueue(self, deliver_at, sock, data, destination):
+        with self.condition:
+            heapq.heappush(self.schedule, (deliver_at, next(self.counter), sock, data, destination))
+            self.condition.notify()
+
+    def deliver_loop(self):
+        """Sleeps until the earliest scheduled delivery and sends everything that is due."""
+        while self.running:
+            with self.condition:
+                if not self.schedule:
+                    self.condition.wait(0.1)
+                    continue
+                wait = self.schedule[0][0] - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                _, _, sock, data, destination = heapq.heappop(self.schedule)
+            try:
+                sock.sendto(data, destination)
+                self.stats["up" if sock is not self.listen_socket else "down"]["forwarded"] += 1
+            except OSError as e:
+                print(f"Proxy failed to forward datagram: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP network impairment proxy")
+    parser.add_argument("--listen", type=int, default=12001, help="port the client connects to")
+    parser.add_argument("--server", default="localhost:12000", help="server host:port")
+    parser.add_argument("--delay", type=float, default=0.0, help="one-way delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- jitter in seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="loss probability (0-1)")
+    parser.add_argument("--corruption", type=float, default=0.0, help="single bit error probability (0-1)")
+    parser.add_argument("--reorder", type=float, default=0.0, help="probability of holding a datagram back")
+    parser.add_argument("--reorder-delay", type=float, default=0.02, help="extra delay of a reordered datagram")
+    parser.add_argument("--duplicate", type=float, default=0.0, help="duplication probability (0-1)")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="bandwidth cap in Mbit/s (0 = unlimited)")
+    parser.add_argument("--queue", type=int, default=0, help="bottleneck queue in bytes with --bandwidth (0 = unlimited)")
+    parser.add_argument("--only", choices=["up", "down"], help="impair only client->server or server->client")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible runs")
+    args = parser.parse_args()
+
+    host, port = args.server.rsplit(":", 1)
+    proxy = impairment_proxy(args.listen, (host, int(port)), args.delay, args.jitter, args.loss, args.corruption,
+                             args.reorder, args.reorder_delay, args.duplicate, args.bandwidth,
+                             directions=(args.only,) if args.only else ("up", "down"), seed=args.seed,
+                             queue_bytes=args.queue)
+    proxy.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        proxy.stop()
+
+
+if __name__ == '__main__':
+    main()
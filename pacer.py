@@ -0,0 +1,82 @@
+import time
+
+# Pacing for the windowed senders: instead of sending every packet the window allows back-to-back, each
+# transmission waits for enough tokens in a bucket that fills at the target rate, so a window is spread
+# over the round trip rather than arriving at the bottleneck as one burst.
+
+
+class pacer:
+    """
+    Token bucket in bytes. The bucket holds at most burst_packets packets, so a sender that was idle can
+    send a couple of packets at once but never a whole window. The rate is either fixed (Mbit/s) or follows
+    cwnd / SRTT, scaled like Linux does (200% in slow start so the window can still double, 120% after).
+    Waits above SLEEP_THRESHOLD use time.sleep (waking SLEEP_MARGIN early); the rest is busy-waited on
+    perf_counter, because sleeps cannot produce the sub-millisecond gaps of a fast link.
+    """
+
+    SLEEP_THRESHOLD = 0.001
+    SLEEP_MARGIN = 0.0005
+    SLOW_START_GAIN = 2.0
+    GAIN = 1.2
+
+    def __init__(self, rate_mbps: float = None, burst_packets: int = 2):
+        self.fixed = rate_mbps is not None
+        self.rate = rate_mbps * 125000 if self.fixed else None  # Bytes per second; None sends unpaced
+        self.burst_packets = burst_packets
+        self.tokens = 0.0
+        self.last = time.perf_counter()
+        self.packets = 0
+        self.delayed = 0  # Packets that had to wait for tokens
+        self.waited = 0.0  # Seconds spent waiting
+
+    @property
+    def name(self):
+        return f"{self.rate / 125000:.1f} Mbit/s" if self.fixed else "cwnd/srtt"
+
+    def update(self, window, packet_size, srtt, slow_start: bool = False):
+        """Derives the rate from the window and the smoothed RTT, unless a fixed rate was configured."""
+        if self.fixed or not srtt:
+            return
+        gain = self.SLOW_START_GAIN if slow_start else self.GAIN
+        self.rate = gain * window * packet_size / srtt
+
+    def wait(self, nbytes):
+        """Blocks until nbytes may leave."""
+        self.packets += 1
+        now = time.perf_counter()
+        if self.rate is None:
+            self.last = now
+            return
+        self.tokens = min(self.tokens + (now - self.last) * self.rate, self.burst_packets * nbytes)
+        self.last = now
+        if self.tokens < nbytes:
+            due = now + (nbytes - self.tokens) / self.rate
+            self.sleep_until(due)
+            self.delayed += 1
+            self.waited += due - now
+            self.tokens = nbytes
+            self.last = due
+        self.tokens -= nbytes
+
+    def sleep_until(self, due):
+        remaining = due - time.perf_counter()
+        if remaining > self.SLEEP_THRESHOLD:
+            time.sleep(remaining - self.SLEEP_MARGIN)
+        while time.perf_counter() < due:
+            pass
+
+    def stats(self):
+        return {"pacing": self.name, "paced_packets": self.packets, "pacing_delayed": self.delayed,
+                "pacing_wait": self.waited}
+
+
+def make_pacer(pacing):
+    """Returns a pacer for pacing: None or False for none, "auto" for cwnd/SRTT, or a rate in Mbit/s."""
+    if pacing is None or pacing is False or str(pacing).lower() in ("none", "off"):
+        return None
+    if str(pacing).lower() in ("auto", "cwnd"):
+        return pacer()
+    try:
+        return pacer(float(pacing))
+    except ValueError:
+        raise ValueError(f"Unknown pacing {pacing!r}, expected None, 'auto' or a rate in Mbit/s.")
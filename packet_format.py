@@ -0,0 +1,171 @@
+import struct
+
+# Sequence numbers are 32-bit on the wire and compared with serial number arithmetic (RFC 1982),
+# so a transfer is not limited to 65,535 packets and wraps around safely if it ever exceeds 2^32.
+SEQ_BITS = 32
+SEQ_FORMAT = "!I"
+SEQ_SIZE = struct.calcsize(SEQ_FORMAT)
+
+# Data packet header: sequence number, byte offset of the payload in the file, flags. Packet size can change
+# during a transfer, so the receiver places every payload at its offset instead of at seq * packet size.
+# The checksum trailer covers the payload and the header (see header_checksum). The flags byte marks
+# packets that are not plain file data.
+DATA_HEADER_FORMAT = "!IQB"
+DATA_HEADER_SIZE = struct.calcsize(DATA_HEADER_FORMAT)
+FLAG_REPAIR = 0x01  # FEC repair packet: sequence number and offset are the block's first (see fec.py)
+# Bits 1-2: code of the codec the payload is compressed with, 0 if it is not (see compression.py)
+COMPRESSION_SHIFT = 1
+COMPRESSION_MASK = 0x06
+
+# Repair packet body, before the repair symbol: data packets in the block, repair index, and the
+# length of each data packet (2 bytes each).
+REPAIR_FORMAT = "!BB"
+REPAIR_SIZE = struct.calcsize(REPAIR_FORMAT)
+
+# Initial packet: magic, total packets (4 bytes), file size (8 bytes), packet size (4 bytes), transfer ID
+# (8 bytes) and content hash (16 bytes). The receiver answers ANNOUNCE_REPLY, or RESUME when its checkpoint
+# of the same transfer (see checkpoint.py) already holds part of the file, and the sender repeats the
+# announcement until it gets either.
+ANNOUNCE_MAGIC = b"ANN"
+ANNOUNCE_FORMAT = "!3sIQIQ16s"
+ANNOUNCE_SIZE = struct.calcsize(ANNOUNCE_FORMAT)
+ANNOUNCE_REPLY = b"ANNOK"
+
+# Resume reply: magic, chunk size (4 bytes), chunks in the file (4 bytes), then the zlib-compressed bitmap
+# of the chunks the receiver holds (bit i of byte i // 8 is chunk i). The sender only sends the rest.
+RESUME_MAGIC = b"RES"
+RESUME_FORMAT = "!3sII"
+RESUME_SIZE = struct.calcsize(RESUME_FORMAT)
+MAX_CONTROL_SIZE = 65507  # Largest UDP payload, the most a resume reply can take
+
+# End of transfer marker and its reply. This is not b'END', which the server reads as its shutdown
+# command, so a repeated marker that arrives after the transfer cannot stop the server.
+FIN = b"FIN"
+FIN_REPLY = b"FINOK"
+
+
+def wire_seq(sequence_number, bits: int = SEQ_BITS):
+    """Sequence number as it is written in a packet header (modulo 2^bits)."""
+    return sequence_number % (1 << bits)
+
+
+def seq_diff(a, b, bits: int = SEQ_BITS):
+    """Signed distance a - b in serial number arithmetic."""
+    modulo = 1 << bits
+    difference = (a - b) % modulo
+    if difference >= modulo // 2:
+        difference -= modulo
+    return difference
+
+
+def seq_lt(a, b, bits: int = SEQ_BITS):
+    """True if a comes before b, even across a wraparound."""
+    return seq_diff(a, b, bits) < 0
+
+
+def unwrap_seq(received, reference, bits: int = SEQ_BITS):
+    """Absolute sequence number closest to reference that has the received wire value."""
+    return reference + seq_diff(received, reference, bits)
+
+
+def pack_data_header(buffer, sequence_number, offset, flags: int = 0):
+    """Writes the data header into buffer (a reused bytearray of DATA_HEADER_SIZE)."""
+    struct.pack_into(DATA_HEADER_FORMAT, buffer, 0, wire_seq(sequence_number), offset, flags)
+
+
+def unpack_data_header(packet, reference):
+    """Returns (absolute sequence number, payload offset, flags); reference is the receiver's next expected packet."""
+    sequence_number, offset, flags = struct.unpack_from(DATA_HEADER_FORMAT, packet)
+    return unwrap_seq(sequence_number, reference), offset, flags
+
+
+def compression_flags(code):
+    return code << COMPRESSION_SHIFT
+
+
+def compression_code(flags):
+    return (flags & COMPRESSION_MASK) >> COMPRESSION_SHIFT
+
+
+def pack_repair(index, lengths):
+    """Repair body header: repair index and the lengths of the block's data packets."""
+    return struct.pack(REPAIR_FORMAT + f"{len(lengths)}H", len(lengths), index, *lengths)
+
+
+def unpack_repair(body):
+    """Returns (repair index, data packet lengths, size of the repair header)."""
+    count, index = struct.unpack_from(REPAIR_FORMAT, body)
+    lengths = struct.unpack_from(f"!{count}H", body, REPAIR_SIZE)
+    return index, list(lengths), REPAIR_SIZE + 2 * count
+
+
+def header_checksum(engine, payload_checksum, header):
+    """
+    Trailer value of a data packet: the payload checksum (precomputed by file_source) XOR the checksum of
+    the header, so a corrupted sequence number or offset fails verification like a corrupted payload.
+    """
+    return payload_checksum ^ engine.compute(header)
+
+
+def pack_announcement(total_packets, total_bytes, packet_size, transfer_id: int = 0,
+                      content_hash: bytes = bytes(16)):
+    return struct.pack(ANNOUNCE_FORMAT, ANNOUNCE_MAGIC, total_packets, total_bytes, packet_size, transfer_id,
+                       content_hash)
+
+
+def is_announcement(packet):
+    return len(packet) == ANNOUNCE_SIZE and packet[:len(ANNOUNCE_MAGIC)] == ANNOUNCE_MAGIC
+
+
+def unpack_announcement(packet):
+    """Returns (total packets, total bytes, packet size)."""
+    return struct.unpack(ANNOUNCE_FORMAT, packet[:ANNOUNCE_SIZE])[1:4]
+
+
+def announcement_key(packet):
+    """Returns (transfer ID, content hash) of an announcement, which select the receiver's checkpoint."""
+    return struct.unpack(ANNOUNCE_FORMAT, packet[:ANNOUNCE_SIZE])[4:]
+
+
+def pack_resume(chunk_size, chunks, compressed_bitmap):
+    return struct.pack(RESUME_FORMAT, RESUME_MAGIC, chunk_size, chunks) + compressed_bitmap
+
+
+def is_resume(packet):
+    return len(packet) >= RESUME_SIZE and packet[:len(RESUME_MAGIC)] == RESUME_MAGIC
+
+
+def unpack_resume(packet):
+    """Returns (chunk size, chunks, compressed bitmap)."""
+    _, chunk_size, chunks = struct.unpack_from(RESUME_FORMAT, packet)
+    return chunk_size, chunks, bytes(packet[RESUME_SIZE:])
+
+
+# ACK: cumulative ACK (the last packet received in order, so -1 before any) and a selective-ACK bitmap where
+# bit i set means packet cumulative + 1 + i was received out of order. The checksum engine's trailer follows.
+# Bit 0 is always clear (that packet is the hole that stops the cumulative ACK), so 63 packets are covered.
+# The last field is the receiver's advertised window (rwnd): packets it can take beyond the cumulative ACK.
+ACK_FORMAT = "!IQH"
+ACK_HEADER_SIZE = struct.calcsize(ACK_FORMAT)
+SACK_BITS = 64
+MAX_RWND = 0xFFFF
+
+
+def pack_ack(cumulative, sack_bitmap: int = 0, rwnd: int = MAX_RWND):
+    return struct.pack(ACK_FORMAT, wire_seq(cumulative), sack_bitmap, rwnd)
+
+
+def unpack_ack(packet, reference):
+    """Returns (absolute cumulative ACK, SACK bitmap, rwnd); reference is the sender's window base."""
+    cumulative, sack_bitmap, rwnd = struct.unpack_from(ACK_FORMAT, packet)
+    return unwrap_seq(cumulative, reference), sack_bitmap, rwnd
+
+
+def sack_sequences(cumulative, sack_bitmap):
+    """Sequence numbers selectively acknowledged by the bitmap, in increasing order."""
+    bit = 0
+    while sack_bitmap:
+        if sack_bitmap & 1:
+            yield cumulative + 1 + bit
+        sack_bitmap >>= 1
+        bit += 1
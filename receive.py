@@ -1,16 +1,61 @@
 from socket import *
-import pickle
-import struct
 import random
 import time
-from PIL import Image
 from error_gen import error_gen
 import checksums  # Import the checksums module
+import packet_format as pf
+from window import ring_window
+import batch_io
+import flow_control
+import fec
+import compression
+import checkpoint
+
+
+class ack_coalescer:
+    """
+    Delayed ACKs: in-order packets are acknowledged together, once every `every` packets or `delay` seconds
+    after the first unacknowledged one, whichever comes first. Anything unusual (a gap, a duplicate, a
+    corrupted packet) is acknowledged at once by the caller, which then calls clear().
+    """
+
+    def __init__(self, every: int = 1, delay: float = 0.005):
+        self.every = every
+        self.delay = delay
+        self.pending = 0
+        self.deadline = None
+
+    def add(self):
+        """Counts one in-order packet. Returns True if the ACK should be sent now."""
+        self.pending += 1
+        if self.pending >= self.every:
+            self.clear()
+            return True
+        if self.pending == 1:
+            self.deadline = time.time() + self.delay
+        return False
+
+    def remaining(self):
+        """Seconds until the pending ACK is due, or None if nothing is pending."""
+        if not self.pending:
+            return None
+        return max(self.deadline - time.time(), 0.0001)
+
+    def clear(self):
+        self.pending = 0
+        self.deadline = None
 
 
 class receive:
-    def __init__(self):
+    ACK_DELAY = 0.005  # Longest an in-order packet waits for its ACK to be combined with the next ones
+    MAX_ACK_EVERY = 16
+    BATCH_IO = "auto"  # batch_io mode for draining the socket: "auto", "mmsg" or "plain" (one recvfrom each)
+    CHECKPOINT = True  # Receive into an on-disk checkpoint an interrupted transfer resumes from (see checkpoint)
+    IDLE_TIMEOUT = 30.0  # Seconds without a datagram before a transfer is given up (and kept for a resume)
+
+    def __init__(self, checksum_method=None):
         """Initialize tracking variables to avoid AttributeError."""
+        self.checksum = checksums.get_engine(checksum_method)  # Negotiated checksum engine
         self.retrans_overhead_label = None
         self.ack_eff_label = None
         self.dup_ack_label = None
@@ -18,20 +63,39 @@ class receive:
         self.progress_bar = None
         self.total_acks_sent = 0  # Ensure this variable is initialized
         self.unique_acks_sent = set()  # Also initialize unique ACK tracking
+        self.flow = None  # receive_window of the current transfer, advertised in every ACK
+        self.checkpoint = None  # checkpoint.receive_checkpoint of the current transfer
+        self.announce_reply = pf.ANNOUNCE_REPLY  # Answer to the announcement, repeated if it is announced again
+        self.recovered_packets = 0  # Packets rebuilt from FEC repair packets
+
+    def ack_coalescer(self, window_size):
+        """ACK every packet for Stop-and-Wait, otherwise about twice per window (at most MAX_ACK_EVERY apart)."""
+        return ack_coalescer(max(1, min(self.MAX_ACK_EVERY, window_size // 2)), self.ACK_DELAY)
+
+    def batch_receiver(self, port):
+        """Stands in for port.recvfrom, draining many datagrams per system call where the OS allows."""
+        return batch_io.batch_receiver(port, mode=self.BATCH_IO)
 
-    def ack_packet(self, index, port, address, error_type: int = 1, error_rate: float = 0):
-        # Simulate network delay (0-100ms) before sending ACK
-        delay = random.uniform(0, 0.1)
-        time.sleep(delay)
+    def receive_window(self, port, limit: int = pf.MAX_RWND):
+        """Sizes the socket buffer and tracks the window advertised in ACKs (see flow_control)."""
+        self.flow = flow_control.receive_window(port, limit)
+        return self.flow
 
-        # Pack the sequence number into 2 bytes
-        ack_seq = struct.pack("!H", index)
+    def ack_packet(self, index, port, address, error_type: int = 1, error_rate: float = 0, sack_bitmap: int = 0,
+                   rwnd: int = None):
+        """Sends a cumulative ACK for index (the last packet received in order) with a SACK bitmap and rwnd."""
+        # Network delay is no longer simulated here; run impairment_proxy.py between the peers instead
+        if rwnd is None:
+            rwnd = self.flow.advertise() if self.flow is not None else pf.MAX_RWND
 
-        # Compute checksum on the sequence number bytes
-        ack_checksum = checksums.compute_checksum(ack_seq)
+        # Pack the cumulative ACK (4 bytes), the bitmap of packets received beyond it (8 bytes) and rwnd (2 bytes)
+        ack_header = pf.pack_ack(index, sack_bitmap, rwnd)
 
-        # Append the checksum (2 bytes) to the ACK packet
-        ack_packet = ack_seq + struct.pack("!H", ack_checksum)
+        # Compute checksum on the header
+        ack_checksum = self.checksum.compute(ack_header)
+
+        # Append the checksum (2 or 4 bytes) to the ACK packet
+        ack_packet = ack_header + self.checksum.pack(ack_checksum)
 
         eg = error_gen()
 
@@ -40,8 +104,11 @@ class receive:
         elif error_type == 2:
             ack_packet = eg.packet_error(ack_packet, error_rate)
 
-        # Send the 4-byte ACK packet
-        port.sendto(ack_packet, address)
+        # Send the ACK packet
+        if ack_packet is None:
+            print(f">>> Simulating ACK packet loss for ACK {index}.")
+        else:
+            port.sendto(ack_packet, address)
 
         # Ensure variables exist before modifying them
         # if not hasattr(self, 'total_acks_sent'):
@@ -52,57 +119,214 @@ class receive:
         # Track ACK statistics
         self.total_acks_sent += 1
         self.unique_acks_sent.add(index)
-        print(f"Sent ACK {index} with checksum {ack_checksum}, Delay: {round(delay * 1000, 2)}ms")
+        print(f"Sent ACK {index} (SACK {sack_bitmap:#x}, rwnd {rwnd}) with checksum {ack_checksum}")
+
+    def receive_announcement(self, port, output_path):
+        """
+        Waits (at most IDLE_TIMEOUT seconds) for the sender's announcement of total packets, total bytes and
+        packet size, and confirms it (with the chunks already held if it resumes an interrupted transfer).
+        Returns the announced values and the buffer to receive the file into (see open_output).
+        """
+        port.settimeout(self.IDLE_TIMEOUT)
+        while True:
+            meta_packet, address = port.recvfrom(1024)
+            if pf.is_announcement(meta_packet):
+                break
+            print(">>> Ignoring a packet received before the transfer announcement.")
+        file_buffer = self.open_output(meta_packet, output_path)
+        port.sendto(self.announce_reply, address)
+        expected_total_packets, total_bytes, packet_size = pf.unpack_announcement(meta_packet)
+        print(f"[Control] Expected total packets to receive: {expected_total_packets} "
+              f"({total_bytes} bytes, first packets of {packet_size})")
+        return expected_total_packets, total_bytes, packet_size, file_buffer
+
+    def open_output(self, announcement, output_path, checkpoint_name=None):
+        """
+        Buffer the announced file is received into: the partial file of its checkpoint, holding whatever an
+        earlier attempt at the same transfer received, or a bytearray if CHECKPOINT is off or the sender sent
+        no content hash. Sets the reply to the announcement.
+        checkpoint_name is the file name the transfer was requested under, when output_path was made unique
+        for this session (see Server.output_path): a retry from another session resumes under the same name.
+        """
+        total_bytes = pf.unpack_announcement(announcement)[1]
+        transfer_id, content_hash = pf.announcement_key(announcement)
+        self.checkpoint = None
+        self.announce_reply = pf.ANNOUNCE_REPLY
+        if not self.CHECKPOINT or content_hash == bytes(len(content_hash)):
+            return bytearray(total_bytes)
+        self.checkpoint = checkpoint.receive_checkpoint(output_path, total_bytes, transfer_id, content_hash,
+                                                        name=checkpoint_name)
+        self.announce_reply = self.checkpoint.reply()
+        if pf.is_resume(self.announce_reply):
+            print(f"[Control] Resuming: {self.checkpoint.resumed_bytes} of {total_bytes} bytes are already here")
+        return self.checkpoint.buffer
+
+    def wait_time(self, delayed_acks, last_heard):
+        """Socket timeout for the next datagram: until the delayed ACK is due, but never past IDLE_TIMEOUT."""
+        idle = max(last_heard + self.IDLE_TIMEOUT - time.time(), 0.0001)
+        due = delayed_acks.remaining()
+        return idle if due is None else min(due, idle)
+
+    def is_idle(self, last_heard):
+        if time.time() - last_heard < self.IDLE_TIMEOUT:
+            return False
+        print(f">>> Nothing received for {self.IDLE_TIMEOUT} seconds, giving up on the transfer.")
+        return True
+
+    def suspend_checkpoint(self):
+        """Keeps what an unfinished transfer received for the next attempt (see checkpoint)."""
+        if self.checkpoint is not None:
+            self.checkpoint.suspend()
+            self.checkpoint = None
+
+    def handle_control(self, packet, port, address):
+        """
+        Answers control packets seen during the data phase. Returns True once the transfer is over.
+        A repeated announcement means our reply was lost, so it is simply confirmed again.
+        """
+        if packet == pf.FIN:
+            port.sendto(pf.FIN_REPLY, address)
+            return True
+        if pf.is_announcement(packet):
+            port.sendto(self.announce_reply, address)
+        return False
+
+    def data_checksum(self, packet, data):
+        """Checksum a data packet must carry: the payload's, with the header (sequence number, offset) folded in."""
+        return pf.header_checksum(self.checksum, self.checksum.compute(data), packet[:pf.DATA_HEADER_SIZE])
+
+    def place_payload(self, file_buffer, start, seq_num, data):
+        """Copies a verified payload straight to its offset (from the packet header) in the file buffer."""
+        if start + len(data) > len(file_buffer):
+            print(f">>> Packet {seq_num} does not fit in the announced file size! Ignoring...")
+            return False
+        file_buffer[start:start + len(data)] = data
+        if self.checkpoint is not None:
+            self.checkpoint.add(start, len(data))
+        return True
+
+    def expand_payload(self, flags, data, seq_num):
+        """Decompresses the payload of a compressed packet (the codec is in its flags); None if it cannot be."""
+        code = pf.compression_code(flags)
+        if not code:
+            return data
+        try:
+            return compression.decompress(code, data)
+        except ValueError as e:
+            print(f">>> Cannot decompress packet {seq_num} ({e})! Discarding...")
+            return None
 
-    def udp_receive(self, port: socket, server: bool, error_type: int, error_rate: float, use_gbn=False, update_ui_callback = None):
-        """Receives an image file over UDP using sequence numbers and checksum."""
+    def place_repairs(self, decoder, first, window, file_buffer):
+        """
+        Rebuilds what the FEC repair packets of block first allow (see fec.fec_decoder) and places it like
+        received packets, marking them in the window. Returns the lengths of the recovered payloads.
+        """
+        def is_received(seq):
+            return pf.seq_lt(seq, window.base) or (seq in window and window.is_marked(seq))
+
+        recovered = []
+        for seq, offset, data in decoder.recover(first, is_received, file_buffer):
+            if seq in window and self.place_payload(file_buffer, offset, seq, data):
+                window.mark(seq)
+                recovered.append(len(data))
+                self.recovered_packets += 1
+                print(f"Recovered packet {seq} from FEC repair packets.")
+        return recovered
+
+    def save_file(self, data, output_path):
+        """
+        Writes the reassembled bytes to disk exactly as the sender's file. A checkpoint's partial file already
+        holds them, and is renamed instead. Returns False, leaving output_path untouched, if a resumed file
+        does not match the sender's content hash.
+        """
+        if self.checkpoint is not None and data is self.checkpoint.buffer:
+            completed = self.checkpoint.complete(output_path)
+            self.checkpoint = None
+            if not completed:
+                print(f">>> {output_path} was not written: the file has to be received again.")
+                return False
+        else:
+            with open(output_path, 'wb') as f:
+                f.write(data)
+        print(f"File successfully saved as {output_path}")
+        return True
+
+    def udp_receive(self, port: socket, server: bool, error_type: int, error_rate: float, use_gbn=False,
+                    update_ui_callback = None, output_path: str = None, window_size: int = 10):
+        """
+        Receives a file (the image by default) over UDP using sequence numbers and checksum.
+        With GBN, in-order packets are acknowledged together (see ack_coalescer); window_size is the sender's.
+        """
         mode = "GBN" if use_gbn else "Stop-and-Wait"
+        if output_path is None:
+            output_path = "server_image.bmp" if server else "client_image.bmp"
         print('The server is ready to receive image data' if server else 'The client is ready to receive image data')
         print(f"Receiver running in {mode} mode")
 
-        received_data = {}
+        received = 0  # Packets placed in file_buffer (always the ones before expected_seq_num)
+        received_bytes = 0  # Packets may differ in size, so progress is counted in bytes
         expected_seq_num = 0
+        delayed_acks = self.ack_coalescer(window_size if use_gbn else 1)
         retransmissions = 0
         duplicate_acks = 0
 
 
-        port.setsockopt(SOL_SOCKET, SO_RCVBUF, 65536)  # Increase receive buffer
+        flow = self.receive_window(port)  # Socket buffer grows with the measured bandwidth-delay product
 
         # Initialize ui_update values
         if update_ui_callback is not None:
             [self.progress_bar, self.retrans_label, self.dup_ack_label, self.ack_eff_label,
              self.retrans_overhead_label] = update_ui_callback
 
-        # Receive total packet count from sender
+        # Receive total packet count and file size from sender
         try:
-            meta_packet, _ = port.recvfrom(1024)
-            expected_total_packets = struct.unpack("!H", meta_packet[:2])[0]
-            print(f"[Control] Expected total packets to receive: {expected_total_packets}")
+            expected_total_packets, total_bytes, packet_size, file_buffer = self.receive_announcement(port,
+                                                                                                    output_path)
         except Exception as e:
             print(f"Error receiving metadata: {e}")
             return
 
+        # The whole file is received in place; every datagram is a view of the batch receiver's reused slots
+        incoming = self.batch_receiver(port)
+        flow.backlog = incoming  # Datagrams drained but not processed yet still take up room
+        finished = False
+        last_heard = time.time()
+
         while True:
             try:
-                packet, address = port.recvfrom(65535)
-
-                # Check for termination signal
-                if packet == b'END':
-                    print("Received all packets, reconstructing the image...")
-                    break
+                port.settimeout(self.wait_time(delayed_acks, last_heard))  # Wake up when a delayed ACK is due
+                try:
+                    packet, address = incoming.recvfrom()
+                except timeout:
+                    if self.is_idle(last_heard):
+                        break
+                    if delayed_acks.remaining() is not None:  # Otherwise only the idle check woke up early
+                        delayed_acks.clear()
+                        self.ack_packet(expected_seq_num - 1, port, address, error_type, error_rate)
+                    continue
+                last_heard = time.time()
+                nbytes = len(packet)
+
+                # Check for termination signal (and repeated announcements)
+                if nbytes <= pf.ANNOUNCE_SIZE and (packet == pf.FIN or pf.is_announcement(packet)):
+                    if self.handle_control(packet, port, address):
+                        print("Received all packets, reconstructing the image...")
+                        finished = True
+                        break
+                    continue
 
                 # Ensure packet is large enough to contain a valid sequence number and checksum
-                if len(packet) < 4:
+                if nbytes < pf.DATA_HEADER_SIZE + self.checksum.size:
                     print(">>> Received an incomplete packet! Ignoring...")
                     continue
 
-                # Extract sequence number, data, and checksum from the packet
-                seq_num = struct.unpack("!H", packet[:2])[0]
-                data = packet[2:-2]
-                received_checksum = struct.unpack("!H", packet[-2:])[0]
+                # Extract sequence number, data, and checksum from the packet (views, no copies)
+                seq_num, offset, flags = pf.unpack_data_header(packet, expected_seq_num)
+                data = packet[pf.DATA_HEADER_SIZE:-self.checksum.size]
+                received_checksum = self.checksum.unpack(packet[-self.checksum.size:])
 
-                # Compute checksum over the data (as done on the sender side)
-                computed_checksum = checksums.compute_checksum(data)
+                # Compute checksum over the header and data (as done on the sender side)
+                computed_checksum = self.data_checksum(packet, data)
                 print(f"Receiver computed checksum: {computed_checksum}, Received checksum: {received_checksum}")
 
                 # If checksum fails, discard packet and resend ACK for last valid packet
@@ -110,35 +334,41 @@ class receive:
                     print(f">>> Checksum error in packet {seq_num}! Discarding...")
                     # Resend the last ACK for the previous packet
                     if expected_seq_num > 0:
+                        delayed_acks.clear()
                         self.ack_packet(expected_seq_num - 1, port, address, error_type, error_rate)
                         retransmissions += 1
                         print(f"Resent ACK {expected_seq_num - 1} due to checksum error.")
                     continue
+                if flags & pf.FLAG_REPAIR:
+                    continue  # FEC is only used with Selective Repeat
 
                 # Check for out-of-order packet (applies to both GBN and Stop-and-Wait)
                 if seq_num != expected_seq_num:
                     print(f">>> Out-of-order packet! Expected {expected_seq_num}, got {seq_num}. Ignoring...")
-                    ack_num = max(0, expected_seq_num - 1)
+                    ack_num = expected_seq_num - 1  # -1 while packet 0 is missing, never an ACK of it
+                    delayed_acks.clear()
                     self.ack_packet(ack_num, port, address, error_type, error_rate)
                     duplicate_acks += 1
                     continue
 
                 # Otherwise, packet is valid.
+                data = self.expand_payload(flags, data, seq_num)
+                if data is None or not self.place_payload(file_buffer, offset, seq_num, data):
+                    continue
                 print(f"Received packet {seq_num}. Checksum verified. Data added.")
-                received_data[seq_num] = data  # Store packet by sequence number
+                received += 1
+                received_bytes += len(data)
 
                 # Update the expected sequence number for the next packet
                 expected_seq_num += 1
+                flow.on_packet(nbytes, expected_seq_num)
 
-                # Simulate network delay (0-100ms) before sending ACK
-                delay = random.uniform(0, 0.1)
-                time.sleep(delay)
-
-                # Send ACK for the packet just received using the dedicated method
-                self.ack_packet(seq_num, port, address, error_type, error_rate)
+                # Send the (possibly delayed) cumulative ACK using the dedicated method
+                if delayed_acks.add():
+                    self.ack_packet(seq_num, port, address, error_type, error_rate)
 
                 if self.progress_bar:
-                    progress = (len(received_data) / expected_total_packets) * 100
+                    progress = (received_bytes / max(total_bytes, 1)) * 100
                     ack_eff = (len(self.unique_acks_sent) / self.total_acks_sent) * 100 if self.total_acks_sent > 0 else 0
                     overhead = ((self.total_acks_sent - len(self.unique_acks_sent)) / self.total_acks_sent) * 100 if self.total_acks_sent > 0 else 0
                     self.update_progress(progress, retransmissions, duplicate_acks, ack_eff, overhead)
@@ -146,27 +376,17 @@ class receive:
             except Exception as e:
                 print(f"Error receiving packet: {e}")
 
-        # Reassemble the full image byte stream in order
+        if not finished and self.checkpoint is not None:
+            self.suspend_checkpoint()  # The sender went away: keep what arrived for a resume
+            return
+
+        # Payloads were placed at their offsets as they arrived, so there is nothing to reassemble
         try:
-            sorted_data = b''.join(received_data[i] for i in sorted(received_data.keys()))
-            print(f"Total received data size: {len(sorted_data)} bytes")  # Debug print
-
-            # Deserialize the array
-            numpydata = pickle.loads(sorted_data)
-            print("Deserialization successful.")
-
-            # Convert array back to an image and save
-            img = Image.fromarray(numpydata)
-            if server:
-                img.save("server_image.bmp")
-            else:
-                img.save("client_image.bmp")
-            print("Image successfully saved as client/server_image.bmp")
-
-        except pickle.UnpicklingError as e:
-            print(f"Unpickling error: {e}")
+            print(f"Total received data size: {len(file_buffer)} bytes ({received} packets)")  # Debug print
+            self.save_file(file_buffer, output_path)
+
         except Exception as e:
-            print(f"Unexpected error during image reconstruction: {e}")
+            print(f"Unexpected error during file reconstruction: {e}")
 
             # Compute and display ACK Efficiency
             ack_efficiency = (len(self.unique_acks_sent) / self.total_acks_sent) * 100 if self.total_acks_sent > 0 else 0
@@ -176,50 +396,75 @@ class receive:
             print(f"ACK Efficiency: {ack_efficiency:.2f}%")
             print("================================\n")
 
-    def udp_receive_sr(self, port: socket, server: bool, error_type: int, error_rate: float, window_size: int = 10, update_ui_callback = None):
+    def udp_receive_sr(self, port: socket, server: bool, error_type: int, error_rate: float, window_size: int = 10,
+                       update_ui_callback = None, output_path: str = None):
         """
-        Receives an image file over UDP using the Selective Repeat protocol.
+        Receives a file (the image by default) over UDP using the Selective Repeat protocol.
         """
 
+        if output_path is None:
+            output_path = "server_image_sr.bmp" if server else "client_image_sr.bmp"
         print('The server is ready to receive image data' if server else 'The client is ready to receive image data')
         print("Receiver running in Selective Repeat mode")
 
-        received_data = {}  # Buffer to store packets by sequence number
-        expected_seq = 0
+        window = ring_window(window_size)  # Received flags of the window; window.base is the next expected packet
+        decoder = fec.fec_decoder()  # Repair packets of blocks with a packet still missing
+        received = 0
+        received_bytes = 0  # Packets may differ in size, so progress is counted in bytes
+        delayed_acks = self.ack_coalescer(window_size)
         retransmissions = 0
         duplicate_acks = 0
 
-        port.setsockopt(SOL_SOCKET, SO_RCVBUF, 65536)
+        flow = self.receive_window(port, window_size)  # Never advertise more than the reorder window holds
 
         # Initialize ui_update values
         if update_ui_callback is not None:
             [self.progress_bar, self.retrans_label, self.dup_ack_label, self.ack_eff_label,
              self.retrans_overhead_label] = update_ui_callback
 
-        # Receive total packet count from sender
+        # Receive total packet count and file size from sender
         try:
-            meta_packet, _ = port.recvfrom(1024)
-            expected_total_packets = struct.unpack("!H", meta_packet[:2])[0]
-            print(f"[Control] Expected total packets to receive: {expected_total_packets}")
+            expected_total_packets, total_bytes, packet_size, file_buffer = self.receive_announcement(port,
+                                                                                                    output_path)
         except Exception as e:
             print(f"Error receiving metadata: {e}")
             return
 
+        # Out-of-order packets go straight to their final offset, so no reordering buffer is needed
+        finished = False
+        incoming = self.batch_receiver(port)
+        flow.backlog = incoming  # Datagrams drained but not processed yet still take up room
+        last_heard = time.time()
+
         while True:
             try:
-                packet, address = port.recvfrom(65535)
-                if packet == b'END':
-                    print("Received termination signal. Reassembling image...")
-                    break
+                port.settimeout(self.wait_time(delayed_acks, last_heard))  # Wake up when a delayed ACK is due
+                try:
+                    packet, address = incoming.recvfrom()
+                except timeout:
+                    if self.is_idle(last_heard):
+                        break
+                    if delayed_acks.remaining() is not None:  # Otherwise only the idle check woke up early
+                        delayed_acks.clear()
+                        self.ack_packet(window.base - 1, port, address, error_type, error_rate, window.sack_bitmap())
+                    continue
+                last_heard = time.time()
+                nbytes = len(packet)
+                if nbytes <= pf.ANNOUNCE_SIZE and (packet == pf.FIN or pf.is_announcement(packet)):
+                    if self.handle_control(packet, port, address):
+                        print("Received termination signal. Reassembling image...")
+                        finished = True
+                        break
+                    continue
 
-                if len(packet) < 4:
+                if nbytes < pf.DATA_HEADER_SIZE + self.checksum.size:
                     print("Incomplete packet received. Ignoring.")
                     continue
 
-                seq_num = struct.unpack("!H", packet[:2])[0]
-                data = packet[2:-2]
-                received_checksum = struct.unpack("!H", packet[-2:])[0]
-                computed_checksum = checksums.compute_checksum(data)
+                seq_num, offset, flags = pf.unpack_data_header(packet, window.base)
+                data = packet[pf.DATA_HEADER_SIZE:-self.checksum.size]
+                received_checksum = self.checksum.unpack(packet[-self.checksum.size:])
+                computed_checksum = self.data_checksum(packet, data)
                 print(f"Receiver computed checksum: {computed_checksum}, Received checksum: {received_checksum}")
 
                 if received_checksum != computed_checksum:
@@ -227,24 +472,57 @@ class receive:
                     retransmissions += 1
                     continue
 
+                if flags & pf.FLAG_REPAIR:
+                    # seq_num and offset are those of the block's first packet
+                    decoder.add(seq_num, offset, data)
+                    recovered = self.place_repairs(decoder, seq_num, window, file_buffer)
+                    if recovered:
+                        received += len(recovered)
+                        received_bytes += sum(recovered)
+                        window.slide()
+                        decoder.forget(window.base)
+                        delayed_acks.clear()
+                        self.ack_packet(window.base - 1, port, address, error_type, error_rate, window.sack_bitmap())
+                    continue
+
                 # Accept packet if within the receiver's window.
-                if seq_num < expected_seq or seq_num >= expected_seq + window_size:
-                    print(f"Packet {seq_num} is outside the receiving window. Sending ACK anyway.")
-                    self.ack_packet(seq_num, port, address, error_type, error_rate)
+                if pf.seq_lt(seq_num, window.base):
+                    print(f"Packet {seq_num} was already received. Sending ACK again.")
+                    delayed_acks.clear()
+                    self.ack_packet(window.base - 1, port, address, error_type, error_rate, window.sack_bitmap())
                     duplicate_acks += 1
                     continue
+                if seq_num not in window:
+                    # Not buffered, so it must not be ACKed; the sender retransmits it once the window moves
+                    print(f"Packet {seq_num} is beyond the receiving window. Discarding.")
+                    continue
 
-                # Buffer the packet and send an ACK.
-                received_data[seq_num] = data
-                self.ack_packet(seq_num, port, address, error_type, error_rate)
-                print(f"Accepted packet {seq_num} and sent ACK.")
-
-                # Slide the window if the expected packet(s) have arrived.
-                while expected_seq in received_data:
-                    expected_seq += 1
+                # Place the packet (once), slide the window if the expected packet(s) have arrived, and ACK.
+                in_order = seq_num == window.base
+                if not window.is_marked(seq_num):
+                    data = self.expand_payload(flags, data, seq_num)
+                    if data is None or not self.place_payload(file_buffer, offset, seq_num, data):
+                        continue
+                    window.mark(seq_num)
+                    received += 1
+                    received_bytes += len(data)
+                    first = decoder.block_of(seq_num) if decoder.blocks else None
+                    if first is not None:
+                        recovered = self.place_repairs(decoder, first, window, file_buffer)
+                        received += len(recovered)
+                        received_bytes += sum(recovered)
+                moved = window.slide()
+                decoder.forget(window.base)
+                flow.on_packet(nbytes, window.base)
+                sack_bitmap = window.sack_bitmap()
+                # In-order packets may wait to be acknowledged together; gaps and repairs are reported at once
+                if not in_order or moved > 1 or sack_bitmap or delayed_acks.add():
+                    delayed_acks.clear()
+                    self.ack_packet(window.base - 1, port, address, error_type, error_rate, sack_bitmap)
+                print(f"Accepted packet {seq_num}.")
 
                 if self.progress_bar:
-                    progress = (len(received_data) / expected_total_packets) * 100
+                    progress = (received_bytes / max(total_bytes, 1)) * 100
                     ack_eff = (len(self.unique_acks_sent) / self.total_acks_sent) * 100 if self.total_acks_sent > 0 else 0
                     overhead = ((self.total_acks_sent - len(self.unique_acks_sent)) / self.total_acks_sent) * 100 if self.total_acks_sent > 0 else 0
                     self.update_progress(progress, retransmissions, duplicate_acks, ack_eff, overhead)
@@ -253,34 +531,32 @@ class receive:
                 print(f"Error receiving packet: {e}")
                 break
 
-        # Reassemble and reconstruct the image.
+        if not finished and self.checkpoint is not None:
+            self.suspend_checkpoint()  # Not the whole file: keep it for a resume rather than save it
+            return
+
+        # Save the file (payloads are already in place).
         try:
-            sorted_data = b''.join(received_data[i] for i in sorted(received_data.keys()))
-            print(f"Total received data size: {len(sorted_data)} bytes")
-            numpydata = pickle.loads(sorted_data)
-            print("Deserialization successful.")
-            img = Image.fromarray(numpydata)
-            if server:
-                img.save("server_image_sr.bmp")
-            else:
-                img.save("client_image_sr.bmp")
-            print("Image successfully saved as server_image_sr.bmp or client_image_sr.bmp")
+            print(f"Total received data size: {len(file_buffer)} bytes ({received} packets)")
+            self.save_file(file_buffer, output_path)
         except Exception as e:
-            print(f"Error reconstructing image: {e}")
+            print(f"Error reconstructing file: {e}")
 
     def udp_receive_protocol(self, port: socket, server: bool, error_type: int, error_rate: float,
-                               protocol: str = "sw", window_size: int = 10):
+                               protocol: str = "sw", window_size: int = 10, output_path: str = None):
         """
         Unified function to receive data using a selectable protocol.
         protocol: "sw" for Stop-and-Wait, "gbn" for Go-Back-N, "sr" for Selective Repeat.
+        output_path: where to save the received file (defaults to server/client_image.bmp).
         """
         protocol = protocol.lower()
         if protocol == "gbn":
-            return self.udp_receive(port, server, error_type, error_rate, use_gbn=True)
+            return self.udp_receive(port, server, error_type, error_rate, use_gbn=True, output_path=output_path,
+                                    window_size=window_size)
         elif protocol == "sr":
-            return self.udp_receive_sr(port, server, error_type, error_rate, window_size)
+            return self.udp_receive_sr(port, server, error_type, error_rate, window_size, output_path=output_path)
         else:
-            return self.udp_receive(port, server, error_type, error_rate, use_gbn=False)
+            return self.udp_receive(port, server, error_type, error_rate, use_gbn=False, output_path=output_path)
         
     
     def update_progress(self, progress, retransmissions, duplicate_acks, ack_efficiency=0, retransmission_overhead=0):
@@ -0,0 +1,224 @@
+from socket import *
+import queue
+import threading
+import time
+import packet_format as pf
+import receive
+import fec
+from window import ring_window
+
+
+class queue_stats:
+    """Queue depth seen by a pipeline stage each time it takes an item."""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = 0
+        self.total_depth = 0
+        self.max_depth = 0
+
+    def record(self, depth):
+        self.samples += 1
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def summary(self):
+        average = self.total_depth / self.samples if self.samples else 0
+        return {"queue": self.name, "items": self.samples, "average_depth": average, "max_depth": self.max_depth}
+
+
+class receive_pipelined(receive.receive):
+    """
+    Receiver split into three threads connected by bounded queues:
+    a socket-draining thread that only calls recvfrom_into, a worker that verifies checksums and places
+    payloads, and a response thread that builds and sends ACKs. The drain thread never does any other work,
+    so the kernel buffer is emptied while the worker is checksumming or an ACK is being sent.
+    """
+
+    QUEUE_SIZE = 1024
+
+    def __init__(self, checksum_method=None):
+        super().__init__(checksum_method)
+        self.pipeline_stats = {}
+
+    def drain_loop(self, port, free_buffers, packet_queue, stop):
+        """Stage 1: move datagrams from the socket into pooled buffers as fast as possible."""
+        port.settimeout(0.1)  # Only so the thread notices the end of the transfer
+        incoming = self.batch_receiver(port)  # Many datagrams per recvmmsg where available
+        while not stop.is_set():
+            buffer = free_buffers.get()
+            try:
+                nbytes, address = incoming.recvfrom_into(buffer)
+            except timeout:
+                free_buffers.put(buffer)
+                continue
+            except OSError:
+                free_buffers.put(buffer)
+                break
+            packet_queue.put((buffer, nbytes, address))
+
+    def response_loop(self, port, ack_queue, error_type, error_rate, stats):
+        """Stage 3: send the ACKs (and control replies) decided by the worker."""
+        while True:
+            stats.record(ack_queue.qsize())
+            item = ack_queue.get()
+            if item is None:
+                break
+            kind, value, address = item
+            if kind == "ack":
+                cumulative, sack_bitmap, rwnd = value
+                self.ack_packet(cumulative, port, address, error_type, error_rate, sack_bitmap, rwnd)
+            else:
+                port.sendto(value, address)
+
+    def udp_receive_pipelined(self, port: socket, server: bool, error_type: int, error_rate: float,
+                              protocol: str = "sr", window_size: int = 10, output_path: str = None):
+        """
+        Receives a file with Go-Back-N ("gbn") or Selective Repeat ("sr") semantics using the three-stage
+        pipeline. Returns the queue depth statistics of each stage.
+        """
+        selective = protocol.lower() == "sr"
+        if output_path is None:
+            output_path = "server_image.bmp" if server else "client_image.bmp"
+        print('The server is ready to receive image data' if server else 'The client is ready to receive image data')
+        print(f"Receiver running in pipelined {'Selective Repeat' if selective else 'GBN'} mode")
+
+        flow = self.receive_window(port, window_size if selective else pf.MAX_RWND)
+
+        try:
+            expected_total_packets, total_bytes, packet_size, file_buffer = self.receive_announcement(port,
+                                                                                                    output_path)
+        except Exception as e:
+            print(f"Error receiving metadata: {e}")
+            return
+
+        # GBN only accepts the next expected packet, which is a receive window of one
+        window = ring_window(window_size if selective else 1)  # window.base is the next expected packet
+        decoder = fec.fec_decoder()  # FEC repair packets, Selective Repeat only
+        received = 0
+        delayed_acks = self.ack_coalescer(window_size)
+        min_size = pf.DATA_HEADER_SIZE + self.checksum.size
+
+        # Pool of receive buffers: the drain thread blocks (instead of allocating) if the worker falls behind
+        free_buffers = queue.Queue()
+        for _ in range(self.QUEUE_SIZE + 2):
+            free_buffers.put(bytearray(65535))
+        packet_queue = queue.Queue(self.QUEUE_SIZE)
+        ack_queue = queue.Queue(self.QUEUE_SIZE)
+        stop = threading.Event()
+        packet_stats = queue_stats("packets (drain -> worker)")
+        ack_stats = queue_stats("acks (worker -> response)")
+
+        drainer = threading.Thread(target=self.drain_loop, args=(port, free_buffers, packet_queue, stop), daemon=True)
+        responder = threading.Thread(target=self.response_loop, args=(port, ack_queue, error_type, error_rate, ack_stats),
+                                     daemon=True)
+        drainer.start()
+        responder.start()
+        start_time = time.time()
+
+        def acknowledge(address):
+            """Queues a cumulative ACK (with the SACK bitmap for SR) and resets the delayed ACK."""
+            delayed_acks.clear()
+            # Packets waiting in the queue have left the socket buffer but still have to be processed
+            rwnd = flow.advertise(packet_queue.qsize())
+            ack_queue.put(("ack", (window.base - 1, window.sack_bitmap() if selective else 0, rwnd), address))
+
+        # Stage 2 runs on the calling thread: verify, place and decide what to acknowledge
+        address = None
+        finished = False
+        last_heard = time.time()
+        while True:
+            packet_stats.record(packet_queue.qsize())
+            try:
+                buffer, nbytes, address = packet_queue.get(timeout=self.wait_time(delayed_acks, last_heard))
+            except queue.Empty:
+                if self.is_idle(last_heard):
+                    break
+                if delayed_acks.remaining() is not None:  # Otherwise only the idle check woke up early
+                    acknowledge(address)  # The delayed ACK is due
+                continue
+            last_heard = time.time()
+            packet = memoryview(buffer)[:nbytes]
+            try:
+                if nbytes <= pf.ANNOUNCE_SIZE and packet == pf.FIN:
+                    ack_queue.put(("raw", pf.FIN_REPLY, address))
+                    print("Received termination signal.")
+                    finished = True
+                    break
+                if pf.is_announcement(packet):
+                    ack_queue.put(("raw", self.announce_reply, address))
+                    continue
+                if nbytes < min_size:
+                    print("Incomplete packet received. Ignoring.")
+                    continue
+
+                seq_num, offset, flags = pf.unpack_data_header(buffer, window.base)
+                data = packet[pf.DATA_HEADER_SIZE:-self.checksum.size]
+                if self.checksum.unpack(packet[-self.checksum.size:]) != self.data_checksum(packet, data):
+                    print(f"Checksum error in packet {seq_num}. Discarding.")
+                    if not selective and window.base > 0:
+                        acknowledge(address)
+                    continue
+
+                if flags & pf.FLAG_REPAIR:
+                    if selective:
+                        decoder.add(seq_num, offset, data)  # Copied, the buffer goes back to the pool
+                        recovered = self.place_repairs(decoder, seq_num, window, file_buffer)
+                        if recovered:
+                            received += len(recovered)
+                            window.slide()
+                            decoder.forget(window.base)
+                            acknowledge(address)
+                    continue
+
+                if selective:
+                    if pf.seq_lt(seq_num, window.base):
+                        acknowledge(address)  # Already placed, our ACK was lost
+                        continue
+                    if seq_num not in window:
+                        continue  # Beyond the window, the sender will retransmit it
+                elif seq_num != window.base:
+                    if window.base > 0:
+                        acknowledge(address)
+                    continue
+
+                data = self.expand_payload(flags, data, seq_num)
+                if data is None:
+                    continue
+                in_order = seq_num == window.base
+                moved = 0
+                if not window.is_marked(seq_num) and self.place_payload(file_buffer, offset, seq_num, data):
+                    window.mark(seq_num)
+                    received += 1
+                    first = decoder.block_of(seq_num) if decoder.blocks else None
+                    if first is not None:
+                        received += len(self.place_repairs(decoder, first, window, file_buffer))
+                    moved = window.slide()
+                    decoder.forget(window.base)
+                    flow.on_packet(nbytes, window.base)
+                # In-order packets may wait to be acknowledged together; gaps and repairs are reported at once
+                if not in_order or moved > 1 or (selective and window.sack_bitmap()) or delayed_acks.add():
+                    acknowledge(address)
+            finally:
+                packet.release()
+                free_buffers.put(buffer)
+
+        stop.set()
+        ack_queue.put(None)
+        responder.join()
+        drainer.join()
+        elapsed = time.time() - start_time
+
+        print(f"Total received data size: {len(file_buffer)} bytes ({received} of {expected_total_packets} packets)")
+        if finished or self.checkpoint is None:
+            self.save_file(file_buffer, output_path)
+        else:
+            self.suspend_checkpoint()  # The sender went away: keep what arrived for a resume
+
+        self.pipeline_stats = {"elapsed": elapsed, "stages": [packet_stats.summary(), ack_stats.summary()]}
+        print("\n===== Pipeline Queue Depths =====")
+        for stage in self.pipeline_stats["stages"]:
+            print(f"{stage['queue']}: {stage['items']} items, average depth {stage['average_depth']:.2f}, "
+                  f"max depth {stage['max_depth']}")
+        print("=================================\n")
+        return self.pipeline_stats
@@ -0,0 +1,49 @@
+class rtt_estimator:
+    """
+    Retransmission timeout from RTT samples, as TCP computes it (RFC 6298):
+    SRTT and RTTVAR are smoothed with alpha = 1/8 and beta = 1/4, and RTO = SRTT + 4 * RTTVAR.
+    Callers only sample packets that were sent once (Karn's algorithm), because the ACK of a retransmitted
+    packet cannot be matched to one transmission. Each timeout doubles the RTO. Until the first sample
+    the backed-off value is kept (so an initial RTO below the path RTT cannot cause endless spurious timeouts);
+    once the RTT is known, an ACK of new data also ends the backoff, because GBN timeouts caused by
+    reordering would otherwise leave the timer backed off for the rest of the transfer.
+    """
+
+    ALPHA = 0.125
+    BETA = 0.25
+    K = 4
+    MIN_RTO = 0.01  # Seconds; loopback RTTs are far smaller, this keeps scheduling jitter from firing timers
+    MAX_RTO = 2.0
+    MAX_BACKOFF = 64
+
+    def __init__(self, initial_rto: float = 0.05):
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_rto
+        self.backoff = 1
+        self.samples = 0
+
+    @property
+    def timeout(self):
+        """Current timeout in seconds, including the exponential backoff."""
+        return min(self.rto * self.backoff, self.MAX_RTO)
+
+    def sample(self, rtt):
+        """Adds the RTT of a packet that was transmitted exactly once."""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.rto = min(max(self.srtt + self.K * self.rttvar, self.MIN_RTO), self.MAX_RTO)
+        self.backoff = 1
+        self.samples += 1
+
+    def on_timeout(self):
+        self.backoff = min(self.backoff * 2, self.MAX_BACKOFF)
+
+    def on_new_ack(self):
+        """Called when an ACK acknowledges new data, sampled or not."""
+        if self.srtt is not None:
+            self.backoff = 1
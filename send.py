@@ -1,47 +1,203 @@
 from socket import *
-import numpy as np
-from PIL import Image
-import pickle  # To serialize NumPy array
+import contextlib
 import struct  # To attach packet sequence numbers
 import random
 import error_gen
 import time
 import checksums  # Import the checksums module
+import packet_format as pf
+import congestion
+from rtt_estimator import rtt_estimator
+from timers import timer_heap
+from window import ring_window
+from file_source import file_source
+import batch_io
+import flow_control
+import pacer
+import fec
+import compression
+import checkpoint
+
+
+class packet_sizer:
+    """
+    Live packet sizing: every `every` new packets, the loss rate since the last decision (retransmissions
+    per new packet) and the smoothed RTT go through send.adjust_packet_size, and the packets not sent yet
+    are cut at the size it returns. Corrupted or lost datagrams then cost less data, and a clean path
+    moves the file in fewer, larger packets.
+    """
+
+    def __init__(self, sender, source, every: int = 32):
+        self.sender = sender
+        self.source = source
+        self.every = every
+        self.sent = 0
+        self.retransmissions = 0
+        self.history = [(0, source.packet_size)]  # (first sequence number, packet size) after every change
+
+    def on_sent(self, next_seq, retransmissions, ack_delay):
+        """Called after each new packet; next_seq is the first one not sent. Returns True if the size changed."""
+        self.sent += 1
+        if self.sent < self.every:
+            return False
+        loss_rate = (retransmissions - self.retransmissions) / self.sent
+        self.sent = 0
+        self.retransmissions = retransmissions
+        size = self.sender.adjust_packet_size(self.source.packet_size, loss_rate, ack_delay or 0)
+        if size == self.source.packet_size:
+            return False
+        print(f"Loss rate {loss_rate:.2%}, RTT {ack_delay or 0:.4f}s: packets from {next_seq} on carry {size} bytes.")
+        self.source.set_packet_size(size, next_seq)
+        self.history.append((next_seq, size))
+        return True
 
 
 class send:
-    def __init__(self):
+    CONTROL_TIMEOUT = 0.2  # Seconds to wait for the reply to an announcement or end of transfer
+    CONTROL_RETRIES = 25
+    DUP_THRESHOLD = 3  # A packet is taken as lost once this many later packets are acknowledged
+    BATCH_IO = "auto"  # batch_io mode for window bursts: "auto", "gso", "mmsg" or "plain" (one sendto each)
+    PACKET_SIZE = 4096  # Payload bytes of the first packets
+    MIN_PACKET_SIZE = 1024
+    MAX_PACKET_SIZE = 8192
+    ADAPT_PACKET_SIZE = True  # False keeps PACKET_SIZE for the whole transfer
+
+    def __init__(self, checksum_method=None, compression_method=None):
+        self.checksum = checksums.get_engine(checksum_method)  # Negotiated checksum engine
+        compression.parse_method(compression_method)  # Fail now, not at the first packet, if it is unknown
+        self.compression_method = compression_method  # Negotiated payload compression (see compression)
+        self.compressor = None  # compression.compressor of the current transfer
+        self.ack_size = pf.ACK_HEADER_SIZE + self.checksum.size  # Cumulative ACK + SACK bitmap + checksum
+        # Small reusable buffers for the packet header and trailer (see transmit_packet)
+        self.header_buffer = bytearray(pf.DATA_HEADER_SIZE)
+        self.trailer_buffer = bytearray(self.checksum.size)
+        self.batch = None  # batch_io.batch_sender queueing the packets of the current burst
+        self.batching = False
+        self.pacer = None  # pacer.pacer of the current transfer, if it is paced
         self.progress_bar = None
         self.retrans_label = None
         self.dup_ack_label = None
         self.ack_eff_label = None
         self.retrans_overhead_label = None
+        self.metrics = {}  # Extra results of the last transfer, e.g. the congestion window trajectory
 
-    def make_packet(self, data_bytes, packet_size, sequence_number):
-        """Creates a packet with sequence number and checksum."""
+    def make_packet(self, data_bytes, packet_size, sequence_number, checksum=None):
+        """Creates a packet with sequence number and checksum (computed here unless already known)."""
         start = sequence_number * packet_size
         end = start + packet_size
         chunk = data_bytes[start:end]
 
         # Compute checksum
-        checksum = checksums.compute_checksum(chunk)
-        print(f"Sender computed checksum: {checksum}")
+        if checksum is None:
+            checksum = self.checksum.compute(chunk)
+            print(f"Sender computed checksum: {checksum}")
 
-        # Attach sequence number (2 bytes) + chunk + checksum (2 bytes)
-        return struct.pack("!H", sequence_number) + chunk + struct.pack("!H", checksum)
+        # Attach sequence number, offset and flags (13 bytes) + chunk + checksum (2 or 4 bytes)
+        header = struct.pack(pf.DATA_HEADER_FORMAT, pf.wire_seq(sequence_number), start, 0)
+        return header + chunk + self.checksum.pack(pf.header_checksum(self.checksum, checksum, header))
+
+    def transmit_packet(self, port, dest, sequence_number, payload, checksum, error_type: int = 1,
+                        error_rate: float = 0, offset: int = None, flags: int = 0):
+        """
+        Sends one data packet as header + payload + trailer using scatter-gather I/O.
+        The payload (a memoryview) is never copied in user space; only the 13-byte header and the
+        checksum trailer are packed, into buffers reused for every packet.
+        offset is the payload's position in the file (sequence_number * len(payload) if not given).
+        flags go in the header (pf.FLAG_REPAIR for FEC repair packets).
+        Returns False if the packet was dropped by the error simulation.
+        """
+        if self.pacer is not None:
+            self.pacer.wait(pf.DATA_HEADER_SIZE + len(payload) + self.checksum.size)
+        if error_type == 5 and random.random() < error_rate:
+            return False  # Simulate drop
+
+        if offset is None:
+            offset = sequence_number * len(payload)
+        pf.pack_data_header(self.header_buffer, sequence_number, offset, flags)
+        struct.pack_into(self.checksum.format, self.trailer_buffer, 0,
+                         pf.header_checksum(self.checksum, checksum, self.header_buffer))
+
+        if error_type == 3:
+            # Corruption needs its own copy of the packet, so only this mode joins the parts
+            packet = bytes(self.header_buffer) + bytes(payload) + bytes(self.trailer_buffer)
+            packet = self.simulate_packet_error(packet, error_type, error_rate)
+            if self.batching:
+                self.batch.add(dest, packet)
+            else:
+                port.sendto(packet, dest)
+        elif self.batching:
+            self.batch.add(dest, self.header_buffer, payload, self.trailer_buffer)  # Copied into the batch
+        elif hasattr(port, "sendmsg"):
+            port.sendmsg([self.header_buffer, payload, self.trailer_buffer], [], 0, dest)
+        else:
+            # Windows sockets have no sendmsg, join the parts instead
+            port.sendto(b"".join([self.header_buffer, payload, self.trailer_buffer]), dest)
+        return True
+
+    def transmit_from(self, port, dest, source, sequence_number, error_type: int = 1, error_rate: float = 0):
+        """
+        Sends packet sequence_number of a file_source (see transmit_packet), compressed if the transfer
+        compresses and the payload shrinks. The offset in the header is always the uncompressed one.
+        """
+        if self.compressor is not None:
+            compressed = self.compressor.compress(source.payload(sequence_number))
+            if compressed is not None:
+                return self.transmit_packet(port, dest, sequence_number, compressed, self.checksum.compute(compressed),
+                                            error_type, error_rate, source.offset_of(sequence_number),
+                                            self.compressor.flags)
+        return self.transmit_packet(port, dest, sequence_number, source.payload(sequence_number),
+                                    source.checksum_of(sequence_number), error_type, error_rate,
+                                    source.offset_of(sequence_number))
+
+    def transmit_repairs(self, port, dest, encoder, source, end, error_type: int = 1, error_rate: float = 0):
+        """
+        Sends the FEC repair packets of the block that ends before packet end (see fec.fec_encoder). They carry
+        the block's first sequence number and offset, and are never retransmitted.
+        """
+        for body, first, offset in encoder.repairs(source, end):
+            if self.transmit_packet(port, dest, first, body, self.checksum.compute(body), error_type, error_rate,
+                                    offset, pf.FLAG_REPAIR):
+                print(f"Sent FEC repair packet for packets {first} to {end - 1}")
+
+    @contextlib.contextmanager
+    def burst(self, port, packet_size: int = None):
+        """
+        Packets transmitted inside the block are queued and leave together when it ends, in as few system
+        calls as batch_io manages (UDP GSO or sendmmsg on Linux, one sendto each elsewhere).
+        """
+        if self.batching or self.pacer is not None:
+            yield  # Paced packets leave one at a time, a batch would put the burst back
+            return
+        slot_size = pf.DATA_HEADER_SIZE + (packet_size or self.MAX_PACKET_SIZE) + self.checksum.size
+        if self.batch is None or self.batch.port is not port or self.batch.slot_size < slot_size:
+            self.batch = batch_io.batch_sender(port, slot_size, mode=self.BATCH_IO)
+        self.batching = True
+        try:
+            yield
+        finally:
+            self.batching = False
+            self.batch.flush()
 
     def adjust_packet_size(self, current_size, loss_rate, ack_delay):
         """Adjust packet size based on loss rate and ACK delay."""
         if loss_rate > 0.1 or ack_delay > 0.1:
-            return max(1024, current_size // 2)  # Reduce packet size
+            return max(self.MIN_PACKET_SIZE, current_size // 2)  # Reduce packet size
         elif loss_rate < 0.01 and ack_delay < 0.05:
-            return min(8192, current_size * 2)  # Increase packet size
+            return min(self.MAX_PACKET_SIZE, current_size * 2)  # Increase packet size
         return current_size
 
-    def load_image_bytes(self, image_path):
-        img = Image.open(image_path)
-        numpydata = np.asarray(img)
-        return pickle.dumps(numpydata)
+    def open_source(self, path, packet_size=None, window_size: int = 1):
+        """Memory-maps the file to send; packets are read and checksummed only when needed."""
+        self.compressor = compression.make_compressor(self.compression_method)  # Each transfer decides anew
+        return file_source(path, packet_size or self.PACKET_SIZE, self.checksum, block_packets=max(256, window_size))
+
+    def send_buffer(self, port):
+        """Grows the socket send buffer with the measured bandwidth-delay product (see flow_control)."""
+        return flow_control.buffer_sizer(port, SO_SNDBUF)
+
+    def packet_sizer(self, source):
+        """Adapts the packet size of source during the transfer, or None if ADAPT_PACKET_SIZE is off."""
+        return packet_sizer(self, source) if self.ADAPT_PACKET_SIZE else None
 
     def simulate_packet_error(self, packet, error_type, error_rate):
 
@@ -61,22 +217,115 @@ class send:
 
         return packet
 
+    def parse_ack(self, ack_packet, reference):
+        """
+        Returns (cumulative ACK, SACK bitmap) with the ACK unwrapped near reference,
+        or None if the ACK is the wrong size or fails its checksum.
+        """
+        if len(ack_packet) != self.ack_size:
+            return None
+        header = ack_packet[:pf.ACK_HEADER_SIZE]
+        if self.checksum.unpack(ack_packet[pf.ACK_HEADER_SIZE:]) != self.checksum.compute(header):
+            return None
+        return pf.unpack_ack(header, reference)
+
+    def control_exchange(self, port, dest, message, reply, description):
+        """
+        Sends a control packet until the receiver answers with the expected reply (or retries run out).
+        reply is the expected bytes, or a function that accepts a response. Returns the reply, or None.
+        """
+        for attempt in range(self.CONTROL_RETRIES):
+            port.sendto(message, dest)
+            deadline = time.time() + self.CONTROL_TIMEOUT
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                port.settimeout(remaining)
+                try:
+                    response, _ = port.recvfrom(pf.MAX_CONTROL_SIZE)  # A resume reply carries a bitmap
+                except timeout:
+                    break
+                if response == reply or (callable(reply) and reply(response)):
+                    return response
+                # Anything else is a stale ACK from the data phase; keep waiting
+            print(f"No reply to {description}, retrying ({attempt + 1}/{self.CONTROL_RETRIES})...")
+        return None
+
+    def announcement(self, source):
+        """
+        The initial packet: total packets (4 bytes), file size (8 bytes), packet size (4 bytes), and the transfer
+        ID and content hash under which the receiver keeps its checkpoint (see checkpoint).
+        """
+        return pf.pack_announcement(source.total_packets, len(source), source.packet_size,
+                                    checkpoint.transfer_id(source.path), source.content_hash())
+
+    def announce(self, port, dest, source):
+        """Sends the announcement until it is answered, and skips what a resuming receiver already holds."""
+        reply = self.control_exchange(port, dest, self.announcement(source),
+                                      lambda response: response == pf.ANNOUNCE_REPLY or pf.is_resume(response),
+                                      "transfer announcement")
+        if reply is None:
+            raise TimeoutError("Receiver did not acknowledge the transfer announcement.")
+        print(f"Sent total_packets info: {source.total_packets} ({len(source)} bytes)")
+        self.resume(source, reply)
+
+    def resume(self, source, reply):
+        """Cuts source down to the chunks a resume reply says are missing; any other reply sends everything."""
+        if not pf.is_resume(reply):
+            return
+        try:
+            source.skip(checkpoint.missing_ranges(reply, len(source)))
+        except ValueError as e:
+            print(f">>> Unusable resume reply ({e}), sending the whole file.")
+            return
+        print(f"Receiver already holds {source.skipped_bytes} of {len(source)} bytes, "
+              f"resuming with {source.total_packets} packets.")
+
+    def finish(self, port, dest):
+        """Sends the end of transfer marker until the receiver confirms it."""
+        if not self.control_exchange(port, dest, pf.FIN, pf.FIN_REPLY, "end of transfer"):
+            print("Receiver did not confirm the end of transfer.")
+
+    def record_metrics(self, controller, estimator=None, source=None, sizer=None):
+        """Saves the congestion window trajectory, final RTT estimate and sizes of the transfer that just ended."""
+        self.metrics = {
+            "congestion_control": controller.name if controller is not None else "fixed",
+            "cwnd_history": controller.history if controller is not None else [],
+        }
+        if source is not None:
+            # Throughput must come from bytes, packets no longer all carry the same amount
+            self.metrics.update({"file_bytes": len(source), "packets": source.total_packets,
+                                 "resumed_bytes": source.skipped_bytes})
+        self.metrics["packet_size_history"] = sizer.history if sizer is not None else []
+        if estimator is not None:
+            self.metrics.update({"srtt": estimator.srtt, "rto": estimator.rto, "rtt_samples": estimator.samples})
+        if self.batch is not None:
+            self.metrics.update({"batch_io": self.batch.mode, "batched_packets": self.batch.packets,
+                                 "batch_syscalls": self.batch.syscalls})
+            self.batch = None  # The next transfer starts its own counts
+        if self.pacer is not None:
+            self.metrics.update(self.pacer.stats())
+            self.pacer = None
+        if self.compressor is not None:
+            self.metrics.update(self.compressor.stats())
+            self.compressor = None
+
     def calculate_total_packets(self, data_bytes, packet_size):
         return len(data_bytes) // packet_size + (1 if len(data_bytes) % packet_size else 0)
 
     def compute_metrics(self, total_packets, retransmissions, total_acks_received, unique_acks_received):
         ack_efficiency = (len(unique_acks_received) / total_acks_received) * 100 if total_acks_received else 0
-        retrans_overhead = (retransmissions / total_packets) * 100
+        retrans_overhead = (retransmissions / total_packets) * 100 if total_packets else 0
         return ack_efficiency, retrans_overhead
 
     def udp_send(self, port: socket, dest, error_type: int, error_rate: float, image: str = 'image/OIP.bmp',
                  update_ui_callback = None):
         """RDT 3.0 with adaptive timeout implementation."""
 
-        data_bytes = self.load_image_bytes(image)
-
-        packet_size = 4096
-        total_packets = self.calculate_total_packets(data_bytes,packet_size)
+        source = self.open_source(image)
+        sizer = self.packet_sizer(source)
+        total_packets = source.total_packets
 
         print(f"Sending {total_packets} packets using Stop-and-Wait (RDT 3.0)...")
 
@@ -99,15 +348,11 @@ class send:
             [self.progress_bar, self.retrans_label, self.dup_ack_label, self.ack_eff_label,
              self.retrans_overhead_label] = update_ui_callback
 
-        # Send initial packet with total_packets (2 bytes)
-        init_packet = struct.pack("!H", total_packets)
-        port.sendto(init_packet, dest)
-        print(f"Sent total_packets info: {total_packets}")
+        # Send initial packet with total_packets and the file size
+        self.announce(port, dest, source)
+        total_packets = source.total_packets  # Fewer if the receiver resumes
 
         while sequence_number < total_packets:
-            packet = self.make_packet(data_bytes, packet_size, sequence_number)
-            # print(f"Constructed packet: {packet}")  # Debug
-            print(f"Packet type: {type(packet)}")  # Debug
             retries = 0
 
             while retries < MAX_RETRIES:
@@ -116,13 +361,8 @@ class send:
 
                     start_time = time.time()
 
-                    pkt_to_send = self.simulate_packet_error(packet, error_type, error_rate)
-                    print(f"Packet type(pkt_to_send): {type(pkt_to_send)}")  # Debug
-
-                    # Ensure that the packet to send is not None or invalid
-                    if pkt_to_send:
+                    if self.transmit_from(port, dest, source, sequence_number, error_type, error_rate):
                         print(f"Sent packet {sequence_number}")
-                        port.sendto(pkt_to_send, dest)
                     else:
                         print(f"Packet {sequence_number} was dropped due to error.")
 
@@ -132,23 +372,15 @@ class send:
                     print(f"Adaptive timeout is now {adaptive_timeout:.4f} seconds")
 
                     # Wait for ACK
-                    ack_packet, _ = port.recvfrom(4) # 4 bytes: 2 for sequence number and 2 for checksum
+                    ack_packet, _ = port.recvfrom(self.ack_size)  # Cumulative ACK + SACK bitmap + checksum
                     end_time = time.time()
 
-                    if len(ack_packet) != 4:
-                        print("ACK packet size error!")
-                        continue
-
-                    # Extract the sequence number and its checksum
-                    ack_seq = ack_packet[:2]
-                    received_checksum = struct.unpack("!H", ack_packet[2:])[0]
-                    computed_checksum = checksums.compute_checksum(ack_seq)
-
-                    if received_checksum != computed_checksum:
-                        print("ACK checksum error! Discarding ACK.")
+                    # ACK numbers are wire values; unwrap them relative to the packet we are waiting on
+                    ack = self.parse_ack(ack_packet, sequence_number)
+                    if ack is None:
+                        print("ACK size or checksum error! Discarding ACK.")
                         continue
-
-                    ack_num = struct.unpack("!H", ack_seq)[0]
+                    ack_num = ack[0]  # With one packet in flight the SACK bitmap is always empty
                     total_acks_received += 1
 
                     if ack_num not in unique_acks_received:
@@ -171,6 +403,8 @@ class send:
                         DevRTT = (1 - beta) * DevRTT + beta * abs(RTT - ERTT)
                         print(f"Updated ERTT: {ERTT:.4f}, DevRTT: {DevRTT:.4f}")
 
+                        if sizer is not None and sizer.on_sent(sequence_number, retransmissions, ERTT):
+                            total_packets = source.total_packets
                         break  # Exit retry loop
 
                     else:
@@ -184,11 +418,14 @@ class send:
 
             if retries == MAX_RETRIES:
                 print(f"Failed to send packet {sequence_number} after {MAX_RETRIES} retries.")
+                source.close()
                 return total_packets, retransmissions, duplicate_acks
 
         # Send termination signal
-        port.sendto(b'END', dest)
+        self.finish(port, dest)
+        source.close()
         print("Image data sent successfully using RDT 3.0!")
+        self.record_metrics(None, source=source, sizer=sizer)
 
         # Compute efficiency metrics
         ack_efficiency, retransmissions_overhead = self.compute_metrics(total_packets, retransmissions, total_acks_received, unique_acks_received)
@@ -202,33 +439,36 @@ class send:
 
     def udp_send_gbn(self, port: socket, dest, error_type: int, error_rate: float,
                      image: str = 'image/OIP.bmp', window_size: int = 10, timeout_interval: float = 0.05,
-                     update_ui_callback = None):
+                     update_ui_callback = None, congestion_control: str = None, pacing=None):
         """
-        Sends an image file over UDP using the Go-Back-N protocol.
-        window_size: Number of packets to send before waiting for ACKs.
-        timeout_interval: Fixed timeout for the oldest unacknowledged packet.
+        Sends a file (the image by default) over UDP using the Go-Back-N protocol.
+        window_size: Number of packets to send before waiting for ACKs (the cap when congestion control is on).
+        timeout_interval: Initial timeout for the oldest unacknowledged packet; later timeouts come from RTT samples.
+        congestion_control: None for a fixed window, or "reno" / "cubic" (see congestion.py).
+        pacing: None to send each window back-to-back, "auto" to pace at cwnd/SRTT, or a rate in Mbit/s.
         """
-        # Load image and serialize into bytes
-        data_bytes = self.load_image_bytes(image)
-
-        packet_size = 4096
-        total_packets = self.calculate_total_packets(data_bytes,packet_size)
-
-        # Create the list of packets
-        packets = []
-        for seq in range(total_packets):
-            packet = self.make_packet(data_bytes, packet_size, seq)
-            packets.append(packet)
+        # Map the file; packets are sliced and checksummed (a block at a time) as the window reaches them
+        source = self.open_source(image, window_size=window_size)
+        sizer = self.packet_sizer(source)
+        total_packets = source.total_packets
 
         print(f"Sending {total_packets} packets using GBN with window size {window_size}...")
 
         base = 0
         next_seq_num = 0
         timer_start = None
-        eg = error_gen.error_gen()
+        controller = congestion.make_controller(congestion_control, window_size)
+        self.pacer = pacer.make_pacer(pacing)
+        estimator = rtt_estimator(timeout_interval)
+        send_times = {}  # {seq: first transmission time}, only for packets not retransmitted (Karn)
+        dup_count = 0  # Duplicate ACKs of base - 1 in a row
+        recovery_seq = 0  # After a fast retransmit, more duplicate ACKs are ignored until base passes this
+        rwnd = window_size  # Receiver's advertised window, known from the first ACK
+        send_buffer = self.send_buffer(port)
 
         retransmissions = 0
         duplicate_acks = 0
+        fast_retransmits = 0
         total_acks_received = 0
         unique_acks_received = set()
 
@@ -237,64 +477,69 @@ class send:
             [self.progress_bar, self.retrans_label, self.dup_ack_label, self.ack_eff_label,
              self.retrans_overhead_label] = update_ui_callback
 
-        # Send initial packet with total_packets (2 bytes)
-        init_packet = struct.pack("!H", total_packets)
-        port.sendto(init_packet, dest)
-        print(f"Sent total_packets info: {total_packets}")
+        # Send initial packet with total_packets and the file size
+        self.announce(port, dest, source)
+        total_packets = source.total_packets  # Fewer if the receiver resumes
 
         while base < total_packets:
             # Send packets within the window
-            while next_seq_num < base + window_size and next_seq_num < total_packets:
-                pkt = packets[next_seq_num]
-                pkt_to_send = self.simulate_packet_error(pkt, error_type, error_rate)
-
-                if pkt_to_send:
-                    port.sendto(pkt_to_send, dest)
-                    print(f"Sent packet {next_seq_num}")
-
-                # Start timer for the first unacknowledged packet
-                if base == next_seq_num:
-                    timer_start = time.time()
-                next_seq_num += 1
+            window = min(controller.window if controller is not None else window_size, rwnd)
+            if self.pacer is not None:
+                self.pacer.update(window, source.packet_size, estimator.srtt, congestion.in_slow_start(controller))
+            with self.burst(port):  # The window's new packets leave together
+                while next_seq_num < base + window and next_seq_num < total_packets:
+                    if self.transmit_from(port, dest, source, next_seq_num, error_type, error_rate):
+                        print(f"Sent packet {next_seq_num}")
+                    send_times[next_seq_num] = time.time()
+
+                    # Start timer for the first unacknowledged packet
+                    if base == next_seq_num:
+                        timer_start = time.time()
+                    next_seq_num += 1
+                    if sizer is not None and sizer.on_sent(next_seq_num, retransmissions, estimator.srtt):
+                        total_packets = source.total_packets
 
             # Wait for ACK with timeout
             try:
                 elapsed = time.time() - timer_start if timer_start is not None else 0
-                remaining_time = timeout_interval - elapsed
+                remaining_time = estimator.timeout - elapsed
                 if remaining_time <= 0:
                     raise TimeoutError
                 port.settimeout(remaining_time)
-                ack_packet, _ = port.recvfrom(4)
-
-                if len(ack_packet) != 4:
-                    print("ACK packet size error!")
-                    continue
-
-                ack_seq = ack_packet[:2]
-                received_checksum = struct.unpack("!H", ack_packet[2:])[0]
-                computed_checksum = checksums.compute_checksum(ack_seq)
+                ack_packet, _ = port.recvfrom(self.ack_size)
 
                 if update_ui_callback is not None:
                     progress = base / total_packets
                     self.update_progress(progress, retransmissions, duplicate_acks)
 
-                if received_checksum != computed_checksum:
-                    print("ACK checksum error! Discarding ACK.")
+                ack = self.parse_ack(ack_packet, base)
+                if ack is None:
+                    print("ACK size or checksum error! Discarding ACK.")
                     continue
 
-                ack_num = struct.unpack("!H", ack_seq)[0]
+                ack_num, _, rwnd = ack  # The GBN receiver keeps nothing out of order, so no SACK bitmap
                 total_acks_received += 1
                 if ack_num not in unique_acks_received:
                     unique_acks_received.add(ack_num)
                 else:
                     duplicate_acks += 1
-                print(f"Received ACK {ack_num}")
+                print(f"Received ACK {ack_num} (rwnd {rwnd})")
                 print(f"Base before sliding: {base}")
                 print(f"Base updated to: {base}")
 
-                # Slide window if ACK is valid
-                if ack_num >= base:
+                # Slide window if ACK is valid (serial number comparison, safe across wraparound),
+                # but never past what was sent: a stray or corrupted ACK must not acknowledge the future
+                if not pf.seq_lt(ack_num, base) and ack_num < next_seq_num:
+                    if ack_num in send_times:
+                        estimator.sample(time.time() - send_times[ack_num])
+                    estimator.on_new_ack()
+                    for seq in range(base, ack_num + 1):
+                        send_times.pop(seq, None)
+                    send_buffer.on_bytes((ack_num + 1 - base) * source.packet_size, estimator.srtt)
+                    if controller is not None:
+                        controller.on_ack(ack_num + 1 - base)
                     base = ack_num + 1
+                    dup_count = 0
                     # Restart timer if there are outstanding packets
                     if base < next_seq_num:
                         timer_start = time.time()
@@ -304,32 +549,53 @@ class send:
                     if update_ui_callback is not None:
                         progress = base / total_packets
                         update_ui_callback(progress, retransmissions, duplicate_acks)
+                elif ack_num == base - 1 and base < next_seq_num:
+                    # The receiver got a later packet while still waiting for base
+                    dup_count += 1
+                    if dup_count == self.DUP_THRESHOLD and not pf.seq_lt(base, recovery_seq):
+                        # Fast retransmit: the receiver discarded everything after the loss, so go back now
+                        print(f"{dup_count} duplicate ACKs for {ack_num}. "
+                              f"Fast retransmit of packets {base} to {next_seq_num - 1}.")
+                        with self.burst(port):
+                            for seq in range(base, next_seq_num):
+                                self.transmit_from(port, dest, source, seq, error_type, error_rate)
+                        retransmissions += (next_seq_num - base)
+                        fast_retransmits += 1
+                        recovery_seq = next_seq_num
+                        timer_start = time.time()
+                        send_times.clear()
+                        # Fast recovery: a loss while ACKs still flow halves the window instead of resetting it
+                        if controller is not None:
+                            controller.on_loss()
                 # Continue sending in window
             except (timeout, TimeoutError):
                 print(f"Timeout occurred. Retransmitting packets from {base} to {next_seq_num - 1}.")
-                for seq in range(base, next_seq_num):
-                    pkt = packets[seq]
-                    if error_type == 5 and random.random() < error_rate:
-                        print(f">>> Simulating data packet loss for packet {seq} on retransmission.")
-                    else:
-                        pkt_to_send = pkt
-                        if error_type == 3:
-                            pkt_to_send = eg.packet_error(pkt, error_rate)
-                        port.sendto(pkt_to_send, dest)
-                        print(f"Retransmitted packet {seq}")
+                with self.burst(port):
+                    for seq in range(base, next_seq_num):
+                        if self.transmit_from(port, dest, source, seq, error_type, error_rate):
+                            print(f"Retransmitted packet {seq}")
+                        else:
+                            print(f">>> Simulating data packet loss for packet {seq} on retransmission.")
                 retransmissions += (next_seq_num - base)
                 timer_start = time.time()  # Restart timer
+                send_times.clear()  # Every outstanding packet was retransmitted, none can be sampled
+                estimator.on_timeout()
+                if controller is not None:
+                    controller.on_timeout()
 
         # Send termination signal to indicate end of transmission
-        port.sendto(b'END', dest)
+        self.finish(port, dest)
+        source.close()
         print("Image data sent successfully using GBN!")
+        self.record_metrics(controller, estimator, source, sizer)
+        self.metrics.update({"fast_retransmits": fast_retransmits, "rwnd": rwnd, "send_buffer": send_buffer.size})
 
         ack_efficiency, retransmissions_overhead = self.compute_metrics(total_packets, retransmissions, total_acks_received, unique_acks_received)
 
         print("\n===== Performance Metrics =====")
         print(f"Total ACKs Received: {total_acks_received}")
         print(f"Unique ACKs Received: {len(unique_acks_received)}")
-        print(f"Retransmissions: {retransmissions}")
+        print(f"Retransmissions: {retransmissions} ({fast_retransmits} fast retransmits)")
         print(f"ACK Efficiency: {ack_efficiency:.2f}%")
         print("================================\n")
 
@@ -337,113 +603,172 @@ class send:
 
     def udp_send_sr(self, port: socket, dest, error_type: int, error_rate: float,
                     image: str = 'image/OIP.bmp', window_size: int = 10, timeout_interval: float = 0.05,
-                    update_ui_callback=None):
+                    update_ui_callback=None, congestion_control: str = None, pacing=None, fec_method: str = None):
         """
-        Sends an image file over UDP using the Selective Repeat protocol.
+        Sends a file (the image by default) over UDP using the Selective Repeat protocol.
+        window_size is the receiver's window, and the cap on the congestion window when congestion_control
+        ("reno" or "cubic") is given. pacing is as for udp_send_gbn.
+        fec_method adds forward error correction: "xor" (one parity packet per block) or "rs" (Reed-Solomon,
+        several repair packets per block), with the redundancy following the loss rate (see fec).
         """
-        # Load image
-        data_bytes = self.load_image_bytes(image)
-
-        packet_size = 4096
-        total_packets = self.calculate_total_packets(data_bytes,packet_size)
-
-        # Create packets with sequence numbers and checksums.
-        packets = []
-        for seq in range(total_packets):
-            packet = self.make_packet(data_bytes, packet_size, seq)
-            packets.append(packet)
+        # Map the file; payloads are zero-copy views materialized as they enter the window.
+        source = self.open_source(image, window_size=window_size)
+        sizer = self.packet_sizer(source)
+        total_packets = source.total_packets
 
         print(f"Sending {total_packets} packets using Selective Repeat with window size {window_size}...")
 
         base = 0
         next_seq = 0
-        window = {}  # {seq: {"packet": packet, "acked": False, "timer": timestamp}}
+        window = ring_window(window_size)  # ACKed flags, send times and retransmit counts, indexed by seq
+        controller = congestion.make_controller(congestion_control, window_size)
+        self.pacer = pacer.make_pacer(pacing)
+        encoder = fec.make_encoder(fec_method, window_size)
+        recovery_seq = 0  # Losses of packets sent before the last decrease belong to the same loss event
+        estimator = rtt_estimator(timeout_interval)  # timeout_interval is only the initial RTO
+        timers = timer_heap()  # Retransmission deadlines of the unacknowledged packets
+        highest_acked = -1  # Highest packet acknowledged so far, for SACK loss detection
+        rwnd = window_size  # Receiver's advertised window, known from the first ACK
+        send_buffer = self.send_buffer(port)
 
         retransmissions = 0
         duplicate_acks = 0
         total_acks_received = 0
         unique_acks_received = set()
-        eg = error_gen.error_gen()
 
         # Initialize ui_update values
         if update_ui_callback is not None:
             [self.progress_bar, self.retrans_label, self.dup_ack_label, self.ack_eff_label,
              self.retrans_overhead_label] = update_ui_callback
 
-        # Send initial packet with total_packets (2 bytes)
-        init_packet = struct.pack("!H", total_packets)
-        port.sendto(init_packet, dest)
-        print(f"Sent total_packets info: {total_packets}")
+        # Send initial packet with total_packets and the file size
+        self.announce(port, dest, source)
+        total_packets = source.total_packets  # Fewer if the receiver resumes
 
         while base < total_packets:
             # Fill the window: send packets not yet sent.
-            while next_seq < total_packets and next_seq < base + window_size:
-                if next_seq not in window:
-                    window[next_seq] = {"packet": packets[next_seq], "acked": False, "timer": time.time()}
-                    packet = window[next_seq]["packet"]
-                    pkt_to_send = self.simulate_packet_error(packet, error_type, error_rate)
-
-                    if pkt_to_send:
-                        port.sendto(pkt_to_send, dest)
+            limit = min(controller.window if controller is not None else window_size, rwnd)
+            if self.pacer is not None:
+                self.pacer.update(limit, source.packet_size, estimator.srtt, congestion.in_slow_start(controller))
+            with self.burst(port):  # The window's new packets leave together
+                while next_seq < total_packets and next_seq < base + limit:
+                    sent_at = time.time()
+                    window.open(next_seq, sent_at)
+                    timers.schedule(next_seq, sent_at + estimator.timeout)
+                    if self.transmit_from(port, dest, source, next_seq, error_type, error_rate):
                         print(f"Sent packet {next_seq} (Selective Repeat)")
-                next_seq += 1
+                    next_seq += 1
+                    if sizer is not None and sizer.on_sent(next_seq, retransmissions, estimator.srtt):
+                        total_packets = source.total_packets
+                    if encoder is not None and encoder.block_ready(next_seq, total_packets, source):
+                        self.transmit_repairs(port, dest, encoder, source, next_seq, error_type, error_rate)
 
-            # Listen for ACKs using a short timeout.
+            # Wait for an ACK, but no longer than until the earliest retransmission deadline.
             try:
-                port.settimeout(0.01)
-                ack_packet, _ = port.recvfrom(4)
-                if len(ack_packet) != 4:
-                    continue
-                ack_seq = struct.unpack("!H", ack_packet[:2])[0]
-                received_checksum = struct.unpack("!H", ack_packet[2:])[0]
-                computed_checksum = checksums.compute_checksum(ack_packet[:2])
-                if received_checksum != computed_checksum:
-                    print("ACK checksum error! Discarding ACK.")
+                next_deadline = timers.next_deadline()
+                wait = next_deadline - time.time() if next_deadline is not None else estimator.timeout
+                if wait <= 0:
+                    raise TimeoutError
+                port.settimeout(wait)
+                ack_packet, _ = port.recvfrom(self.ack_size)
+                ack = self.parse_ack(ack_packet, base)
+                if ack is None:
+                    print("ACK size or checksum error! Discarding ACK.")
                     continue
+                cumulative, sack_bitmap, rwnd = ack
                 total_acks_received += 1
                 if update_ui_callback is not None:
-                    progress = ack_seq / total_packets
+                    progress = (cumulative + 1) / total_packets
                     self.update_progress(progress, retransmissions, duplicate_acks)
-                if ack_seq not in unique_acks_received:
-                    unique_acks_received.add(ack_seq)
+                if cumulative not in unique_acks_received:
+                    unique_acks_received.add(cumulative)
                 else:
                     duplicate_acks += 1
-                print(f"Received ACK {ack_seq} (Selective Repeat)")
-                if ack_seq in window:
-                    window[ack_seq]["acked"] = True
-            except timeout:
+                print(f"Received ACK {cumulative} with SACK bitmap {sack_bitmap:#x}, rwnd {rwnd} (Selective Repeat)")
+
+                # Everything up to the cumulative ACK plus the selectively acknowledged packets
+                acked = list(range(base, min(cumulative + 1, next_seq)))
+                acked.extend(seq for seq in pf.sack_sequences(cumulative, sack_bitmap) if seq in window and seq < next_seq)
+                newest = None
+                for seq in acked:
+                    if window.mark(seq):
+                        timers.cancel(seq)
+                        newest = seq
+                        send_buffer.on_bytes(source.packet_size, estimator.srtt)
+                        if controller is not None:
+                            controller.on_ack()
+                if newest is not None:
+                    # One RTT sample per ACK, from the packet that triggered it (Karn: never a retransmission)
+                    if window.retransmit_count(newest) == 0:
+                        estimator.sample(time.time() - window.sent_at(newest))
+                    estimator.on_new_ack()
+                    highest_acked = max(highest_acked, newest)
+
+                # Repair holes right away once DUP_THRESHOLD later packets are known to have arrived
+                if sack_bitmap:
+                    current_time = time.time()
+                    with self.burst(port):
+                        for seq in range(cumulative + 1, highest_acked - self.DUP_THRESHOLD + 1):
+                            if seq in window and not window.is_marked(seq) and window.retransmit_count(seq) == 0:
+                                if encoder is not None and encoder.awaiting_repair(seq, highest_acked,
+                                                                                    self.DUP_THRESHOLD):
+                                    continue  # The block's repair packets may still rebuild it
+                                window.retransmit(seq, current_time)
+                                timers.schedule(seq, current_time + estimator.timeout)
+                                self.transmit_from(port, dest, source, seq, error_type, error_rate)
+                                print(f"SACK shows packet {seq} missing. Retransmitted it.")
+                                retransmissions += 1
+                                if encoder is not None:
+                                    encoder.on_loss(seq)  # FEC did not cover this loss
+                                if controller is not None and seq >= recovery_seq:
+                                    controller.on_loss()
+                                    recovery_seq = next_seq
+            except (timeout, TimeoutError):
                 pass
 
-            # Check for packets in the window whose timers have expired.
+            # Retransmit only the packets whose deadline has passed (the heap hands them out in order).
             current_time = time.time()
-            for seq in list(window.keys()):
-                if not window[seq]["acked"] and (current_time - window[seq]["timer"]) > timeout_interval:
-                    pkt = window[seq]["packet"]
-                    if error_type == 5 and random.random() < error_rate:
-                        print(f">>> Simulating data packet loss for retransmitted packet {seq}.")
-                    else:
-                        pkt_to_send = pkt
-                        if error_type == 3:
-                            pkt_to_send = eg.packet_error(pkt, error_rate)
-                        port.sendto(pkt_to_send, dest)
+            expired = timers.pop_expired(current_time)
+            if expired:
+                estimator.on_timeout()
+            with self.burst(port):
+                for seq in expired:
+                    window.retransmit(seq, current_time)
+                    if self.transmit_from(port, dest, source, seq, error_type, error_rate):
                         print(f"Retransmitted packet {seq} (Selective Repeat)")
+                    else:
+                        print(f">>> Simulating data packet loss for retransmitted packet {seq}.")
                     retransmissions += 1
-                    window[seq]["timer"] = current_time
+                    timers.schedule(seq, current_time + estimator.timeout)
+                    if encoder is not None:
+                        encoder.on_loss(seq)
+                    if controller is not None and seq >= recovery_seq:
+                        controller.on_loss()
+                        recovery_seq = next_seq
 
             # Slide the window by removing consecutively acknowledged packets.
-            while base in window and window[base]["acked"]:
-                del window[base]
-                base += 1
+            window.slide()
+            base = window.base
+            if encoder is not None:
+                encoder.forget(base)
 
         # Send termination signal.
-        port.sendto(b'END', dest)
+        self.finish(port, dest)
+        source.close()
         print("Image data sent successfully using Selective Repeat!")
+        self.record_metrics(controller, estimator, source, sizer)
+        self.metrics.update({"rwnd": rwnd, "send_buffer": send_buffer.size})
+        if encoder is not None:
+            self.metrics.update({"fec": encoder.method, "fec_block": encoder.block,
+                                 "fec_repair_packets": encoder.repair_packets, "fec_history": encoder.history})
         ack_efficiency, retransmissions_overhead = self.compute_metrics(total_packets, retransmissions, total_acks_received, unique_acks_received)
 
         print("\n===== Performance Metrics (Selective Repeat) =====")
         print(f"Total ACKs Received: {total_acks_received}")
         print(f"Unique ACKs Received: {len(unique_acks_received)}")
         print(f"Retransmissions: {retransmissions}")
+        if encoder is not None:
+            print(f"FEC repair packets ({encoder.method}): {encoder.repair_packets}")
         print(f"ACK Efficiency: {ack_efficiency:.2f}%")
         print("==================================================\n")
 
@@ -452,16 +777,23 @@ class send:
     def udp_send_protocol(self, port: socket, dest, error_type: int, error_rate: float,
                           protocol: str = "sw", image: str = 'image/OIP.bmp',
                           window_size: int = 10, timeout_interval: float = 0.05,
-                          update_ui_callback=None):
+                          update_ui_callback=None, congestion_control: str = None, pacing=None,
+                          fec_method: str = None):
         """
         Unified function to send data using a selectable protocol.
         protocol: "sw" for Stop-and-Wait, "gbn" for Go-Back-N, "sr" for Selective Repeat.
+        congestion_control: None (fixed window), "reno" or "cubic"; GBN and SR only.
+        pacing: None, "auto" (cwnd/SRTT) or a rate in Mbit/s; GBN and SR only.
+        fec_method: None, "xor" or "rs" forward error correction; SR only (GBN discards the packets after a
+        loss anyway, so rebuilding the lost one would not save the go-back).
         """
         protocol = protocol.lower()
         if protocol == "gbn":
-            return self.udp_send_gbn(port, dest, error_type, error_rate, image, window_size, timeout_interval, update_ui_callback)
+            return self.udp_send_gbn(port, dest, error_type, error_rate, image, window_size, timeout_interval, update_ui_callback,
+                                     congestion_control, pacing)
         elif protocol == "sr":
-            return self.udp_send_sr(port, dest, error_type, error_rate, image, window_size, timeout_interval, update_ui_callback)
+            return self.udp_send_sr(port, dest, error_type, error_rate, image, window_size, timeout_interval, update_ui_callback,
+                                    congestion_control, pacing, fec_method)
         else:
             return self.udp_send(port, dest, error_type, error_rate, image, update_ui_callback)
 
@@ -0,0 +1,184 @@
+from socket import *
+import threading
+import time
+import packet_format as pf
+import send
+from timers import timer_heap
+
+
+class window_state:
+    """Sender window shared by the transmit thread and the ACK listener thread."""
+
+    def __init__(self, total_packets, window_size):
+        self.total_packets = total_packets
+        self.window_size = window_size
+        self.rwnd = window_size  # Receiver's advertised window, known from the first ACK
+        self.base = 0
+        self.next_seq = 0
+        self.acked = set()  # Selective Repeat: sequence numbers acknowledged above base
+        self.timers = timer_heap()  # Selective Repeat: retransmission deadline of each unacknowledged packet
+        self.timer_start = None  # Go-Back-N: single timer for the oldest unacknowledged packet
+        self.dup_count = 0  # Go-Back-N: duplicate ACKs of base - 1 in a row
+        self.recovery_seq = 0  # Go-Back-N: duplicates are ignored after a fast retransmit until base passes this
+        self.go_back = False  # Go-Back-N: set by the listener, the transmit thread resends the window
+        self.done = False
+        # One lock protects the state; the condition wakes the transmit thread when the window opens
+        self.condition = threading.Condition()
+
+        self.retransmissions = 0
+        self.fast_retransmits = 0
+        self.duplicate_acks = 0
+        self.total_acks_received = 0
+        self.unique_acks_received = set()
+
+
+class send_threaded(send.send):
+    """
+    Go-Back-N and Selective Repeat with a dedicated transmit thread and a dedicated ACK listener thread.
+    The listener drains ACKs as soon as they arrive and notifies the transmit thread, so the window is
+    refilled while the sender would otherwise be blocked in recvfrom.
+    """
+
+    def ack_listener(self, port, state, selective):
+        """Runs on its own thread: receives ACKs and slides the shared window."""
+        port.settimeout(0.1)  # Only so the thread notices when the transfer is over
+        while not state.done:
+            try:
+                ack_packet, _ = port.recvfrom(self.ack_size)
+            except timeout:
+                continue
+            except OSError:
+                break
+
+            with state.condition:
+                ack = self.parse_ack(ack_packet, state.base)
+                if ack is None:
+                    print("ACK checksum error! Discarding ACK.")
+                    continue
+                ack_num, sack_bitmap, state.rwnd = ack
+                state.total_acks_received += 1
+                if ack_num in state.unique_acks_received:
+                    state.duplicate_acks += 1
+                else:
+                    state.unique_acks_received.add(ack_num)
+
+                if selective:
+                    # Everything up to the cumulative ACK plus the selectively acknowledged packets
+                    acked = list(range(state.base, min(ack_num + 1, state.next_seq)))
+                    acked.extend(pf.sack_sequences(ack_num, sack_bitmap))
+                    for seq in acked:
+                        if state.base <= seq < state.next_seq:
+                            state.acked.add(seq)
+                            state.timers.cancel(seq)
+                    while state.base in state.acked:
+                        state.acked.discard(state.base)
+                        state.base += 1
+                elif not pf.seq_lt(ack_num, state.base) and ack_num < state.next_seq:
+                    state.base = ack_num + 1
+                    state.dup_count = 0
+                    state.timer_start = time.time() if state.base < state.next_seq else None
+                elif ack_num == state.base - 1 and state.base < state.next_seq:
+                    state.dup_count += 1
+                    if state.dup_count == self.DUP_THRESHOLD and not pf.seq_lt(state.base, state.recovery_seq):
+                        state.go_back = True  # Fast retransmit, without waiting for the timer
+                        state.recovery_seq = state.next_seq
+
+                if state.base >= state.total_packets:
+                    state.done = True
+                state.condition.notify()
+
+    def transmit_loop(self, port, dest, source, state, selective, timeout_interval, error_type, error_rate,
+                      sizer=None):
+        """Runs on the calling thread: fills the window and retransmits on timeout."""
+        while True:
+            # Decide what to send while holding the lock, then send without it so ACKs keep flowing
+            with state.condition:
+                if state.done:
+                    break
+                now = time.time()
+                to_send = []
+                window = min(state.window_size, state.rwnd)
+                while state.next_seq < state.total_packets and state.next_seq < state.base + window:
+                    to_send.append(state.next_seq)
+                    if selective:
+                        state.timers.schedule(state.next_seq, now + timeout_interval)
+                    elif state.timer_start is None:
+                        state.timer_start = now
+                    state.next_seq += 1
+                    if sizer is not None and sizer.on_sent(state.next_seq, state.retransmissions, None):
+                        state.total_packets = source.total_packets  # The listener ends the transfer on this
+
+                if selective:
+                    expired = state.timers.pop_expired(now)
+                    for seq in expired:
+                        state.timers.schedule(seq, now + timeout_interval)
+                    state.retransmissions += len(expired)
+                    to_send.extend(expired)
+                    deadline = state.timers.next_deadline() or now + timeout_interval
+                else:
+                    timed_out = state.timer_start is not None and now - state.timer_start > timeout_interval
+                    if state.go_back or timed_out:
+                        if state.go_back:
+                            print(f"{self.DUP_THRESHOLD} duplicate ACKs for {state.base - 1}. "
+                                  f"Fast retransmit of packets {state.base} to {state.next_seq - 1}.")
+                            state.fast_retransmits += 1
+                        else:
+                            print(f"Timeout occurred. Retransmitting packets from {state.base} to "
+                                  f"{state.next_seq - 1}.")
+                        # The packets just added to to_send are new, the rest of the window goes again
+                        state.retransmissions += state.next_seq - len(to_send) - state.base
+                        to_send = list(range(state.base, state.next_seq))
+                        state.timer_start = now
+                        state.go_back = False
+                    deadline = (state.timer_start or now) + timeout_interval
+
+                if not to_send:
+                    # Sleep until an ACK opens the window or the next timer is due
+                    state.condition.wait(max(0.001, deadline - now))
+                    continue
+
+            with self.burst(port):
+                for seq in to_send:
+                    self.transmit_from(port, dest, source, seq, error_type, error_rate)
+
+    def udp_send_threaded(self, port: socket, dest, error_type: int, error_rate: float, protocol: str = "gbn",
+                          image: str = 'image/OIP.bmp', window_size: int = 10, timeout_interval: float = 0.05):
+        """
+        Sends a file using Go-Back-N ("gbn") or Selective Repeat ("sr") with separate transmit and ACK threads.
+        Returns the same metrics as the single-threaded senders.
+        """
+        selective = protocol.lower() == "sr"
+        source = self.open_source(image, window_size=window_size)
+        sizer = self.packet_sizer(source)
+        total_packets = source.total_packets
+        print(f"Sending {total_packets} packets using {'Selective Repeat' if selective else 'GBN'} "
+              f"(multithreaded) with window size {window_size}...")
+
+        self.announce(port, dest, source)
+        total_packets = source.total_packets  # Fewer if the receiver resumes
+
+        state = window_state(total_packets, window_size)
+        state.done = total_packets == 0
+        listener = threading.Thread(target=self.ack_listener, args=(port, state, selective), daemon=True)
+        listener.start()
+        self.transmit_loop(port, dest, source, state, selective, timeout_interval, error_type, error_rate, sizer)
+        listener.join()
+
+        self.finish(port, dest)
+        source.close()
+        print("Image data sent successfully (multithreaded)!")
+        self.record_metrics(None, source=source, sizer=sizer)
+        self.metrics["fast_retransmits"] = state.fast_retransmits
+        total_packets = state.total_packets
+
+        ack_efficiency, retransmissions_overhead = self.compute_metrics(
+            max(total_packets, 1), state.retransmissions, state.total_acks_received, state.unique_acks_received)
+
+        print("\n===== Performance Metrics (Multithreaded) =====")
+        print(f"Total ACKs Received: {state.total_acks_received}")
+        print(f"Unique ACKs Received: {len(state.unique_acks_received)}")
+        print(f"Retransmissions: {state.retransmissions} ({state.fast_retransmits} fast retransmits)")
+        print(f"ACK Efficiency: {ack_efficiency:.2f}%")
+        print("===============================================\n")
+
+        return total_packets, state.retransmissions, state.duplicate_acks, ack_efficiency, retransmissions_overhead
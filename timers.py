@@ -0,0 +1,52 @@
+import heapq
+
+
+class timer_heap:
+    """
+    Retransmission timers kept in a min-heap ordered by deadline.
+    Cancelling only forgets the key (lazy deletion); its heap entry is skipped when it reaches the top.
+    Finding the next deadline is O(1) amortized and expiring timers costs O(expired log n), instead of
+    scanning every packet in the window.
+    """
+
+    def __init__(self):
+        self.heap = []  # (deadline, key), possibly stale
+        self.deadlines = {}  # {key: deadline} of the live timers
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def schedule(self, key, deadline):
+        """Starts (or restarts) the timer of key."""
+        self.deadlines[key] = deadline
+        heapq.heappush(self.heap, (deadline, key))
+        if len(self.heap) > 2 * len(self.deadlines) + 64:
+            # Mostly cancelled entries: rebuild so the heap does not grow with the length of the transfer
+            self.heap = [(deadline, key) for key, deadline in self.deadlines.items()]
+            heapq.heapify(self.heap)
+
+    def cancel(self, key):
+        self.deadlines.pop(key, None)
+
+    def discard_stale(self):
+        while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def next_deadline(self):
+        """Earliest live deadline, or None if no timer is running."""
+        self.discard_stale()
+        return self.heap[0][0] if self.heap else None
+
+    def pop_expired(self, now):
+        """Removes and returns the keys whose deadline is not after now, earliest first."""
+        expired = []
+        self.discard_stale()
+        while self.heap and self.heap[0][0] <= now:
+            _, key = heapq.heappop(self.heap)
+            del self.deadlines[key]
+            expired.append(key)
+            self.discard_stale()
+        return expired
@@ -0,0 +1,106 @@
+import csv
+import multiprocessing
+import time
+from socket import *
+import batch_io
+
+# Packets per second with one system call per datagram ("plain") vs. batched I/O (sendmmsg, UDP GSO,
+# recvmmsg). The peer runs in its own process so it never competes with the measured side for the GIL.
+PACKET_SIZES = [64, 512, 1400, 4100]
+PACKETS = 100000
+BURST = 64  # Packets per flush, about one send window
+DURATION = 1.0  # Seconds of receiving per receive measurement
+
+
+def drain(port_queue, mode, stop_after):
+    """Peer process: receives until stop_after seconds pass without a packet, then reports the count."""
+    receiver_socket = socket(AF_INET, SOCK_DGRAM)
+    receiver_socket.setsockopt(SOL_SOCKET, SO_RCVBUF, 8 << 20)
+    receiver_socket.bind(('127.0.0.1', 0))
+    port_queue.put(receiver_socket.getsockname())
+    receiver_socket.settimeout(stop_after)
+    incoming = batch_io.batch_receiver(receiver_socket, mode=mode)
+    received = 0
+    try:
+        while True:
+            incoming.recvfrom()
+            received += 1
+    except timeout:
+        pass
+    port_queue.put(received)
+
+
+def blast(dest, packet_size, stop):
+    """Peer process: sends GSO bursts as fast as possible until stop is set."""
+    sender_socket = socket(AF_INET, SOCK_DGRAM)
+    batch = batch_io.batch_sender(sender_socket, packet_size, BURST)
+    packet = bytes(packet_size)
+    while not stop.is_set():
+        for _ in range(BURST):
+            batch.add(dest, packet)
+        batch.flush()
+
+
+def measure_send(mode, packet_size):
+    """Returns (packets per second, system calls, packets delivered) for PACKETS sends in bursts."""
+    port_queue = multiprocessing.Queue()
+    peer = multiprocessing.Process(target=drain, args=(port_queue, "auto", 0.5))
+    peer.start()
+    dest = port_queue.get()
+    sender_socket = socket(AF_INET, SOCK_DGRAM)
+    batch = batch_io.batch_sender(sender_socket, packet_size, BURST, mode)
+    packet = bytes(packet_size)
+    start_time = time.perf_counter()
+    for _ in range(PACKETS // BURST):
+        for _ in range(BURST):
+            batch.add(dest, packet)
+        batch.flush()
+    elapsed = time.perf_counter() - start_time
+    delivered = port_queue.get()
+    peer.join()
+    sender_socket.close()
+    return batch.packets / elapsed, batch.syscalls, delivered
+
+
+def measure_receive(mode, packet_size):
+    """Returns (packets per second, system calls) while a peer process floods the socket."""
+    receiver_socket = socket(AF_INET, SOCK_DGRAM)
+    receiver_socket.setsockopt(SOL_SOCKET, SO_RCVBUF, 8 << 20)
+    receiver_socket.bind(('127.0.0.1', 0))
+    receiver_socket.settimeout(1.0)
+    stop = multiprocessing.Event()
+    peer = multiprocessing.Process(target=blast, args=(receiver_socket.getsockname(), packet_size, stop))
+    peer.start()
+    incoming = batch_io.batch_receiver(receiver_socket, mode=mode)
+    incoming.recvfrom()  # Wait for the flood to start
+    received = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < DURATION:
+        incoming.recvfrom()
+        received += 1
+    elapsed = time.perf_counter() - start_time
+    stop.set()
+    peer.join()
+    receiver_socket.close()
+    return received / elapsed, incoming.syscalls
+
+
+def main():
+    with open('chart6_batch_io.csv', mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Direction", "Mode", "Packet Size (bytes)", "Packets/s", "System Calls", "Delivered"])
+
+        for packet_size in PACKET_SIZES:
+            for mode in ["plain", "mmsg", "gso"]:
+                rate, syscalls, delivered = measure_send(mode, packet_size)
+                writer.writerow(["send", mode, packet_size, round(rate), syscalls, delivered])
+                print(f"[send {packet_size} B] {mode}: {rate:,.0f} packets/s, {syscalls} system calls, "
+                      f"{delivered} of {PACKETS} delivered")
+            for mode in ["plain", "mmsg"]:
+                rate, syscalls = measure_receive(mode, packet_size)
+                writer.writerow(["receive", mode, packet_size, round(rate), syscalls, ""])
+                print(f"[receive {packet_size} B] {mode}: {rate:,.0f} packets/s, {syscalls} system calls")
+
+
+if __name__ == '__main__':
+    main()
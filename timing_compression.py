@@ -0,0 +1,73 @@
+import contextlib
+import csv
+import io
+import os
+import tempfile
+import threading
+import time
+from socket import *
+import receive
+import send
+import impairment_proxy
+
+# Selective Repeat with and without payload compression, over a slow link and over plain loopback. On the
+# slow link the bytes saved are time saved; on loopback the sender should notice that compression only
+# costs CPU and switch it off. Runs a local receiver (and proxy), so no server needs to be started first.
+IMAGE = 'image/OIP.bmp'
+RUNS = 3
+WINDOW_SIZE = 16
+LINKS = {"20 Mbit/s": dict(bandwidth_mbps=20, delay=0.005, queue_bytes=262144), "loopback": None}
+COMPRESSION_METHODS = [None, "zlib", "lzma", "bz2"]
+
+
+def run_transfer(link, compression_method):
+    receiver_socket = socket(AF_INET, SOCK_DGRAM)
+    receiver_socket.bind(('127.0.0.1', 0))
+    proxy = None
+    destination = receiver_socket.getsockname()
+    if link is not None:
+        proxy = impairment_proxy.impairment_proxy(0, receiver_socket.getsockname(), **link).start()
+        destination = ('127.0.0.1', proxy.listen_port)
+    sender_socket = socket(AF_INET, SOCK_DGRAM)
+    output_path = os.path.join(tempfile.gettempdir(), 'timing_compression_output.bin')
+
+    def receive_file():
+        r = receive.receive()
+        r.udp_receive_protocol(receiver_socket, True, 1, 0, "sr", window_size=WINDOW_SIZE, output_path=output_path)
+
+    receiver = threading.Thread(target=receive_file)
+    receiver.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # The protocol prints per packet
+            s = send.send(compression_method=compression_method)
+            start_time = time.time()
+            s.udp_send_protocol(sender_socket, destination, 1, 0, "sr", IMAGE, window_size=WINDOW_SIZE)
+            time_taken = time.time() - start_time
+            receiver.join()
+            if proxy is not None:
+                proxy.stop()
+    finally:
+        sender_socket.close()
+        receiver_socket.close()
+    return time_taken, s.metrics.get("compression_ratio", 1.0)
+
+
+def main():
+    with open('chart9_compression.csv', mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Link", "Compression", "Completion Time (s)", "Compression Ratio"])
+
+        for link_name, link in LINKS.items():
+            for compression_method in COMPRESSION_METHODS:
+                totals = [0.0, 0.0]
+                for _ in range(RUNS):
+                    for i, value in enumerate(run_transfer(link, compression_method)):
+                        totals[i] += value
+                time_taken, ratio = (total / RUNS for total in totals)
+                writer.writerow([link_name, compression_method or "off", time_taken, ratio])
+                print(f"[{link_name} compression={compression_method or 'off'}] {time_taken:.3f}s, "
+                      f"ratio {ratio:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -38,7 +38,7 @@ def run_test(error_rate, use_gbn=True):
 
         end_time = time.time()
         time_taken = end_time - start_time
-        total_bytes = total_packets * 4096
+        total_bytes = s.metrics.get("file_bytes", 0)  # Packet size changes during the transfer
         throughput = total_bytes / time_taken if time_taken > 0 else 0
 
         client_socket.close()
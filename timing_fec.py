@@ -0,0 +1,71 @@
+import contextlib
+import csv
+import io
+import os
+import tempfile
+import threading
+import time
+from socket import *
+import receive
+import send
+import impairment_proxy
+
+# Selective Repeat with and without forward error correction over a lossy link. Every loss FEC repairs
+# saves a retransmission and its round trip; the repair packets cost bandwidth. Runs a local receiver and
+# an impairment proxy, so no server needs to be started first.
+IMAGE = 'image/OIP.bmp'
+RUNS = 3
+DELAY = 0.02
+LOSS_RATES = [0.01, 0.05, 0.1]
+WINDOW_SIZE = 16
+FEC_METHODS = [None, "xor", "rs"]
+
+
+def run_transfer(loss, fec_method):
+    receiver_socket = socket(AF_INET, SOCK_DGRAM)
+    receiver_socket.bind(('127.0.0.1', 0))
+    proxy = impairment_proxy.impairment_proxy(0, receiver_socket.getsockname(), delay=DELAY, loss=loss,
+                                              directions=("up",)).start()
+    sender_socket = socket(AF_INET, SOCK_DGRAM)
+    output_path = os.path.join(tempfile.gettempdir(), 'timing_fec_output.bin')
+
+    def receive_file():
+        r = receive.receive()
+        r.udp_receive_protocol(receiver_socket, True, 1, 0, "sr", window_size=WINDOW_SIZE, output_path=output_path)
+
+    receiver = threading.Thread(target=receive_file)
+    receiver.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # The protocol prints per packet
+            s = send.send()
+            start_time = time.time()
+            result = s.udp_send_protocol(sender_socket, ('127.0.0.1', proxy.listen_port), 1, 0, "sr", IMAGE,
+                                         window_size=WINDOW_SIZE, fec_method=fec_method)
+            time_taken = time.time() - start_time
+            receiver.join()
+            proxy.stop()
+    finally:
+        sender_socket.close()
+        receiver_socket.close()
+    return time_taken, result[1], s.metrics.get("fec_repair_packets", 0)
+
+
+def main():
+    with open('chart8_fec.csv', mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Loss Rate", "FEC", "Completion Time (s)", "Retransmissions", "Repair Packets"])
+
+        for loss in LOSS_RATES:
+            for fec_method in FEC_METHODS:
+                totals = [0.0, 0, 0]
+                for _ in range(RUNS):
+                    for i, value in enumerate(run_transfer(loss, fec_method)):
+                        totals[i] += value
+                time_taken, retransmissions, repairs = (total / RUNS for total in totals)
+                writer.writerow([loss, fec_method or "off", time_taken, retransmissions, repairs])
+                print(f"[loss {loss:.0%} fec={fec_method or 'off'}] {time_taken:.3f}s, "
+                      f"{retransmissions:.1f} retransmissions, {repairs:.1f} repair packets")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import contextlib
+import csv
+import io
+import os
+import tempfile
+import threading
+import time
+from socket import *
+import receive
+import send
+import send_threaded
+import impairment_proxy
+
+# Completion time of the single-threaded senders vs. the dual-thread (transmit + ACK listener) sender.
+# Runs a local receiver and an impairment proxy, so no server needs to be started first.
+IMAGE = 'image/OIP.bmp'
+RUNS = 3
+
+
+def run_transfer(protocol, window_size, threaded, delay, loss):
+    receiver_socket = socket(AF_INET, SOCK_DGRAM)
+    receiver_socket.bind(('127.0.0.1', 0))
+    proxy = impairment_proxy.impairment_proxy(0, receiver_socket.getsockname(), delay=delay, loss=loss).start()
+    sender_socket = socket(AF_INET, SOCK_DGRAM)
+    output_path = os.path.join(tempfile.gettempdir(), 'timing_threading_output.bin')
+
+    def receive_file():
+        r = receive.receive()
+        r.udp_receive_protocol(receiver_socket, True, 1, 0, protocol, window_size=window_size,
+                               output_path=output_path)
+
+    receiver = threading.Thread(target=receive_file)
+    receiver.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # The protocol prints per packet
+            start_time = time.time()
+            if threaded:
+                s = send_threaded.send_threaded()
+                result = s.udp_send_threaded(sender_socket, ('127.0.0.1', proxy.listen_port), 1, 0, protocol,
+                                             IMAGE, window_size=window_size, timeout_interval=0.05)
+            else:
+                s = send.send()
+                result = s.udp_send_protocol(sender_socket, ('127.0.0.1', proxy.listen_port), 1, 0, protocol,
+                                             IMAGE, window_size=window_size, timeout_interval=0.05)
+            time_taken = time.time() - start_time
+            receiver.join()
+            proxy.stop()
+    finally:
+        sender_socket.close()
+        receiver_socket.close()
+    return time_taken, result[1]
+
+
+def main():
+    with open('chart5_threading.csv', mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([
+            "Protocol", "Window Size", "Delay (s)", "Loss Rate", "Mode",
+            "Completion Time (s)", "Retransmissions"
+        ])
+
+        for protocol in ["gbn", "sr"]:
+            for window_size in [10, 50]:
+                for delay, loss in [(0.002, 0.0), (0.002, 0.02)]:
+                    for threaded in [False, True]:
+                        mode = "Multithreaded" if threaded else "Single-threaded"
+                        times = []
+                        retransmissions = 0
+                        for _ in range(RUNS):
+                            time_taken, retrans = run_transfer(protocol, window_size, threaded, delay, loss)
+                            times.append(time_taken)
+                            retransmissions += retrans
+                        average = sum(times) / len(times)
+                        writer.writerow([protocol, window_size, delay, loss, mode, average, retransmissions / RUNS])
+                        print(f"[{protocol.upper()} w={window_size} delay={delay} loss={loss}] {mode}: "
+                              f"{average:.3f}s, {retransmissions / RUNS:.1f} retransmissions")
+
+
+if __name__ == '__main__':
+    main()
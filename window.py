@@ -0,0 +1,73 @@
+from array import array
+
+
+class ring_window:
+    """
+    Per-packet bookkeeping for a sliding window, in preallocated arrays indexed by seq % capacity:
+    a marked byte (ACKed at the sender, received at the receiver), the time of the last transmission and
+    the number of retransmissions. Nothing is allocated per packet, and sliding only clears the slots it
+    passes. capacity must be at least the largest window that will be used.
+    """
+
+    __slots__ = ("capacity", "base", "marked", "send_times", "retransmits")
+
+    def __init__(self, capacity: int, base: int = 0):
+        self.capacity = capacity
+        self.base = base  # Oldest sequence number not yet marked
+        self.marked = bytearray(capacity)
+        self.send_times = array("d", bytes(8 * capacity))
+        self.retransmits = array("I", bytes(4 * capacity))
+
+    def __contains__(self, seq):
+        return self.base <= seq < self.base + self.capacity
+
+    def open(self, seq, now: float = 0.0):
+        """Sender: seq is transmitted for the first time."""
+        slot = seq % self.capacity
+        self.marked[slot] = 0
+        self.send_times[slot] = now
+        self.retransmits[slot] = 0
+
+    def retransmit(self, seq, now: float):
+        slot = seq % self.capacity
+        self.send_times[slot] = now
+        self.retransmits[slot] += 1
+
+    def sent_at(self, seq):
+        return self.send_times[seq % self.capacity]
+
+    def retransmit_count(self, seq):
+        return self.retransmits[seq % self.capacity]
+
+    def mark(self, seq):
+        """Marks seq (which must be in the window). Returns False if it was already marked."""
+        slot = seq % self.capacity
+        if self.marked[slot]:
+            return False
+        self.marked[slot] = 1
+        return True
+
+    def is_marked(self, seq):
+        """True for everything below base and for marked sequence numbers in the window."""
+        if seq < self.base:
+            return True
+        return seq in self and self.marked[seq % self.capacity] == 1
+
+    def slide(self):
+        """Moves base past the marked sequence numbers at the start of the window. Returns how far it moved."""
+        moved = 0
+        slot = self.base % self.capacity
+        while self.marked[slot]:
+            self.marked[slot] = 0
+            self.base += 1
+            moved += 1
+            slot = self.base % self.capacity
+        return moved
+
+    def sack_bitmap(self, bits: int = 64):
+        """Receiver: bit i is set if base + i has been received (bit 0, the base itself, is always clear)."""
+        bitmap = 0
+        for i in range(1, min(bits, self.capacity)):
+            if self.marked[(self.base + i) % self.capacity]:
+                bitmap |= 1 << i
+        return bitmap